@@ -1,19 +1,89 @@
 import streamlit as st
-import difflib
-from groq import Groq
-import re
-
-# Initialize session state
-if "original_code" not in st.session_state:
-    st.session_state.original_code = ""
-if "modified_code" not in st.session_state:
-    st.session_state.modified_code = ""
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+from groq import RateLimitError
+from code_iterator import (
+    ERROR_FIX_MAX_TOKENS, EXPLANATION_MAX_TOKENS, MODIFICATION_MAX_TOKENS, build_error_fix_request, build_explanation_request,
+    build_modification_request, compute_diff, first_changed_step, first_valid_result, parse_error_fix_response,
+    parse_explanation_response, parse_modification_response, parse_patch_response, request_completion, select_code_view,
+    select_error_view, validate_code
+)
+from hedging import cancel_on_chunk, hedged_call, model_stats
+from metrics import MetricsRecorder
+from resources import LANGUAGES, MODELS, TEMPLATES, client_pool
+from response_cache import ResponseCache
+from snapshot_store import SnapshotStore
+from stream_parser import StreamingResponseParser
+
+# Start timing this rerun (shown in the sidebar at the end of the script)
+rerun_started = time.perf_counter()
+
+# Shared store of code versions: sessions keep only the hashes of their code (see snapshot_store.py),
+# and their state is saved there so it survives restarts (the session id is kept in the URL)
+@st.cache_resource
+def get_snapshot_store():
+    return SnapshotStore(os.path.join(".cache", "sessions.sqlite3"))
+
+snapshot_store = get_snapshot_store()
+
+# Session state saved in the snapshot store at the end of every run
+PERSISTED_STATE = [
+    "original_hash", "modified_hash", "integrated_hash", "error_updated_hash", "diff_hashes", "snapshot_hashes", "snapshot_prompts",
+    "prompt_history", "explanation", "explanation_request", "error_message", "error_fix_suggestion", "language_selection",
+]
+
+# Shown when a request still gets rate limit errors after the scheduler's retries
+RATE_LIMIT_MESSAGE = "The Groq rate limit for {model} is still exceeded after several retries. Wait a minute and try again, or choose another model."
+
+# The session id in the URL is all that is needed to open a saved session: anyone with the URL
+# can see and change its code, prompts and error messages
+if "session_id" not in st.session_state:
+    session_id = st.query_params.get("session")
+    saved_state = snapshot_store.load_session(session_id) if session_id else None
+    if saved_state:
+        st.session_state.update(saved_state)
+    else:
+        session_id = uuid.uuid4().hex
+    st.session_state.session_id = session_id
+    st.query_params["session"] = session_id
+
+# Function to start a new, empty session (when code the current one refers to is no longer stored)
+def reset_session():
+    for key in PERSISTED_STATE + ["explanation_future"]:
+        if key in st.session_state:
+            del st.session_state[key]
+    st.session_state.session_id = uuid.uuid4().hex
+    st.query_params["session"] = st.session_state.session_id
+    st.session_state.session_expired = True
+    st.experimental_rerun()
+
+# Functions to read this session's code and diffs from the snapshot store, starting a new session if
+# a version has been evicted (e.g. a tab left open longer than the store keeps idle sessions)
+def load_code(key):
+    try:
+        return snapshot_store.get(key)
+    except KeyError:
+        reset_session()
+
+def load_diff(from_key, to_key):
+    try:
+        return snapshot_store.diff(from_key, to_key, differ=timed_compute_diff)
+    except KeyError:
+        reset_session()
+
+# Initialize session state (code is held as snapshot store hashes; None for no code)
+if "original_hash" not in st.session_state:
+    st.session_state.original_hash = None
+if "modified_hash" not in st.session_state:
+    st.session_state.modified_hash = None
 if "explanation" not in st.session_state:
     st.session_state.explanation = ""
-if "integrated_code" not in st.session_state:
-    st.session_state.integrated_code = ""
-if "diff_output" not in st.session_state:
-    st.session_state.diff_output = ""
+if "integrated_hash" not in st.session_state:
+    st.session_state.integrated_hash = None
+if "diff_hashes" not in st.session_state:
+    st.session_state.diff_hashes = None
 if "api_key" not in st.session_state:
     st.session_state.api_key = ""
 if "prompt_history" not in st.session_state:
@@ -24,12 +94,46 @@ if "error_fix_suggestion" not in st.session_state:
     st.session_state.error_fix_suggestion = ""
 if "language_selection" not in st.session_state:
     st.session_state.language_selection = "C++"
-if "error_updated_code" not in st.session_state:
-    st.session_state.error_updated_code = ""
+if "error_updated_hash" not in st.session_state:
+    st.session_state.error_updated_hash = None
+if "snapshot_hashes" not in st.session_state:
+    st.session_state.snapshot_hashes = []
+if "snapshot_prompts" not in st.session_state:
+    st.session_state.snapshot_prompts = []
+if "incremental_mode" not in st.session_state:
+    st.session_state.incremental_mode = True
+if "stream_responses" not in st.session_state:
+    st.session_state.stream_responses = True
+if "patch_mode" not in st.session_state:
+    st.session_state.patch_mode = False
+if "focus_relevant_code" not in st.session_state:
+    st.session_state.focus_relevant_code = True
+if "hedge_requests" not in st.session_state:
+    st.session_state.hedge_requests = False
+if "hedge_delay" not in st.session_state:
+    st.session_state.hedge_delay = 2.0
+if "explanation_mode" not in st.session_state:
+    st.session_state.explanation_mode = "In the background"
+if "explanation_request" not in st.session_state:
+    st.session_state.explanation_request = None
+if "explanation_future" not in st.session_state:
+    st.session_state.explanation_future = None
+if "show_raw_responses" not in st.session_state:
+    st.session_state.show_raw_responses = False
+if "rerun_timings" not in st.session_state:
+    st.session_state.rerun_timings = []
+if "metrics" not in st.session_state:
+    st.session_state.metrics = MetricsRecorder(max_records=1000)
+
+# Performance metrics of this session's requests, parsing, validation, diffs and reruns (see metrics.py)
+session_metrics = st.session_state.metrics
 
 # Streamlit app layout
 st.title("Game Code Iterator Assistant")
 st.markdown("A tool to modify game code based on user prompts, with iterative changes saved in memory.")
+st.caption("Your work is saved under the session id in this page's URL. Anyone you share the URL with can open this session, including its code and error messages.")
+if st.session_state.pop("session_expired", False):
+    st.warning("The code saved in this session is no longer available (sessions are removed after a week without use), so a new session was started.")
 
 # API key input
 st.subheader("Enter Groq API Key")
@@ -41,41 +145,98 @@ if api_key_input:
         st.error("Invalid API key format. It should start with 'gsk_'. Please check and try again.")
         st.session_state.api_key = ""
 
-# Initialize Groq client only if API key is provided
+# Get the pooled Groq client for this API key (reused across reruns and sessions)
 client = None
 if st.session_state.api_key:
     try:
-        client = Groq(api_key=st.session_state.api_key)
+        client = client_pool.get(st.session_state.api_key)
     except Exception as e:
         st.error(f"Failed to initialize Groq client. Please verify your API key: {str(e)}")
         client = None
 
-# Available LLM models on Groq API
-models = [
-    "llama-3.3-70b-versatile",
-    "llama-3-70b-8192",
-    "llama-3-8b-8192",
-    "llama-3.1-70b-instruct",
-    "llama-3.1-8b-instruct",
-    "llama-4-scout",
-    "llama-4-maverick",
-    "mixtral-8x7b-32768",
-    "gemma-7b-it",
-    "qwen-2.5-32b",
-    "deepseek-r1-distill-qwen-32b"
-]
+# Shared LLM response cache, kept across reruns and sessions
+@st.cache_resource
+def get_response_cache():
+    return ResponseCache(os.path.join(".cache", "llm_responses.sqlite3"))
+
+response_cache = get_response_cache()
+
+# Worker threads that write explanations in the background, shared across reruns and sessions
+@st.cache_resource
+def get_explanation_executor():
+    return ThreadPoolExecutor(max_workers=4)
 
 # Sidebar for language selection, LLM selection, prompt history, and instructions
 if client:
     with st.sidebar:
         # Language selection dropdown (above LLM model selection)
         st.subheader("Select Game Development Language")
-        languages = ["C++", "C# (Outside Unity)", "GDScript", "JavaScript", "Python", "Lua", "Haxe", "Rust"]
-        selected_language = st.selectbox("Choose a language", languages, index=languages.index(st.session_state.language_selection))
+        selected_language = st.selectbox("Choose a language", LANGUAGES, index=LANGUAGES.index(st.session_state.language_selection))
         st.session_state.language_selection = selected_language
 
         # LLM model selection
-        selected_model = st.selectbox("Select LLM Model", models, index=0)
+        selected_model = st.selectbox("Select LLM Model", MODELS, index=0)
+
+        # Incremental mode applies only new prompts to the latest code snapshot
+        st.session_state.incremental_mode = st.checkbox(
+            "Incremental generation",
+            value=st.session_state.incremental_mode,
+            help="Apply only new or edited prompts to the code saved after the previous step, instead of replaying the full history."
+        )
+
+        # Streaming renders the code as it is generated instead of waiting for the full response
+        st.session_state.stream_responses = st.checkbox(
+            "Stream responses",
+            value=st.session_state.stream_responses,
+            help="Show the generated code live while the model is still writing the response."
+        )
+
+        # Patch mode asks the model for only the changed lines and applies them locally
+        st.session_state.patch_mode = st.checkbox(
+            "Patch mode",
+            value=st.session_state.patch_mode,
+            help="Ask the model for search/replace edits instead of the whole file. Falls back to full-file generation if the edits don't apply."
+        )
+
+        # Large files are sent as the chunks relevant to the prompt plus an outline of the rest
+        st.session_state.focus_relevant_code = st.checkbox(
+            "Send only relevant code for large files",
+            value=st.session_state.focus_relevant_code,
+            help="For long files, send only the classes and functions related to the prompt or error, plus an outline of the rest."
+        )
+
+        # Explanations can be requested separately from the code, so the code is shown as soon as it is ready
+        explanation_modes = ["In the background", "On demand", "With the code"]
+        st.session_state.explanation_mode = st.radio(
+            "Explanations",
+            explanation_modes,
+            index=explanation_modes.index(st.session_state.explanation_mode),
+            help="'In the background' requests the code first and writes the explanation while you review it. 'On demand' writes it only when you ask for it. 'With the code' requests both in one response (in incremental mode, the whole chain is explained right after the code, before it is shown)."
+        )
+
+        # Hedged requests also send each request to backup models if the selected one is slow or fails
+        st.session_state.hedge_requests = st.checkbox(
+            "Hedge across models",
+            value=st.session_state.hedge_requests,
+            help="If the selected model hasn't returned valid code after the delay below (or fails), also send the request to the backup models and keep the first valid response. Uses more API quota; responses are not streamed."
+        )
+        hedge_models = []
+        if st.session_state.hedge_requests:
+            hedge_models = st.multiselect("Backup models", [m for m in MODELS if m != selected_model], default=[m for m in MODELS if m != selected_model][:1])
+            st.session_state.hedge_delay = st.slider("Start backups after (seconds)", 0.0, 10.0, st.session_state.hedge_delay, 0.5)
+
+        # Raw model responses are only written to the page when debugging
+        st.session_state.show_raw_responses = st.checkbox(
+            "Show raw LLM responses",
+            value=st.session_state.show_raw_responses,
+            help="Write each raw model response to the page (for debugging prompts and parsing)."
+        )
+
+        # Response cache statistics, rerun timing, model statistics and performance metrics (filled in at the end of the run)
+        cache_stats_placeholder = st.empty()
+        rerun_timing_placeholder = st.empty()
+        model_stats_placeholder = st.empty()
+        metrics_placeholder = st.empty()
         
         # Prompt History with edit and delete options
         st.subheader("Prompt History")
@@ -106,13 +267,8 @@ if client:
         9. Test the final integrated code in the appropriate environment. If you encounter an error, use the troubleshooting section or error reporting feature below.
         """)
 
-# Prompt templates
-templates = {
-    "Select a task": "",
-    "Add jump mechanic": f"Modify this {st.session_state.language_selection} code to add a jump mechanic with height 2 units, triggered by the spacebar (or equivalent input for the chosen language).",
-    "Add health system": f"Modify this {st.session_state.language_selection} code to add a health system with max health 100 and a damage function.",
-    "Optimize performance": f"Modify this {st.session_state.language_selection} code to improve frame rate, focusing on efficient movement or rendering."
-}
+# Prompt templates for the selected language
+templates = TEMPLATES[st.session_state.language_selection]
 
 # Input section (only shown if API key is valid)
 if client:
@@ -121,224 +277,344 @@ if client:
     template = st.selectbox("Select a common game task (optional)", list(templates.keys()))
     prompt_input = st.text_input("Describe the changes you want", value=templates[template] if template != "Select a task" else "")
     context_input = st.text_input("Additional context (optional)", placeholder=f"e.g., engine version, components, or {st.session_state.language_selection} specifics")
+    bypass_cache = st.checkbox("Bypass response cache", help="Always request a fresh response from the model instead of reusing a cached one for an identical request.")
     generate_button = st.button("Generate Suggestions")
 else:
     st.warning("Please enter a valid Groq API key to proceed.")
 
-# Function to validate code based on selected language
-def validate_code(code, language):
-    if not code.strip():
-        return False, "Error: Code input is empty."
-    if language == "C++":
-        if "std::" not in code and "using namespace std;" not in code and "cout" not in code:
-            return False, "Error: Code does not appear to be valid C++. Include standard library usage (e.g., 'using namespace std;' or 'std::cout')."
-    elif language == "C# (Outside Unity)":
-        if "class" not in code or "{" not in code:
-            return False, "Error: Code does not appear to be valid C#. Include a class definition with curly braces."
-    elif language == "GDScript":
-        if "extends" not in code and "func" not in code:
-            return False, "Error: Code does not appear to be valid GDScript. Include 'extends' and 'func' keywords."
-    elif language == "JavaScript":
-        if "function" not in code and "let" not in code and "const" not in code:
-            return False, "Error: Code does not appear to be valid JavaScript. Include function declarations or variable definitions."
-    elif language == "Python":
-        if "def" not in code and "import" not in code:
-            return False, "Error: Code does not appear to be valid Python. Include 'def' for functions or 'import' statements."
-    elif language == "Lua":
-        if "function" not in code and "local" not in code:
-            return False, "Error: Code does not appear to be valid Lua. Include 'function' or 'local' keywords."
-    elif language == "Haxe":
-        if "class" not in code and "function" not in code:
-            return False, "Error: Code does not appear to be valid Haxe. Include 'class' and 'function' keywords."
-    elif language == "Rust":
-        if "fn" not in code and "struct" not in code:
-            return False, "Error: Code does not appear to be valid Rust. Include 'fn' for functions or 'struct' definitions."
-    return True, ""
-
-# Function to generate a detailed fallback explanation if the API fails to provide one
-def generate_fallback_explanation(original_code, modified_code, prompt_history, language):
-    explanation = "### Key Changes Made:\n"
-    if "jump" in prompt_history[-1].lower() or "jumpForce" in modified_code.lower():
-        explanation += f"- Added a jump mechanic to the {language} code. This allows the player to jump when a specific key (like the spacebar) is pressed. The mechanic uses variables to track the player's vertical position, applies an initial upward velocity, and simulates gravity to bring the player back down.\n"
-    if "health" in prompt_history[-1].lower() or "maxHealth" in modified_code.lower():
-        explanation += f"- Added a health system to the {language} code. This tracks the player's health, starting at a maximum value (e.g., 100), and includes a function to reduce health when the player takes damage.\n"
-    if "optimize" in prompt_history[-1].lower() or "performance" in modified_code.lower():
-        explanation += f"- Optimized performance in the {language} code. This might involve reducing unnecessary calculations, improving loop efficiency, or using better data structures to make the game run smoother.\n"
-    
-    explanation += f"\n### Detailed Step-by-Step Breakdown of the {language} Code:\n"
-    # Split the modified code into lines for detailed analysis
-    lines = modified_code.split("\n")
-    for idx, line in enumerate(lines, 1):
-        line = line.strip()
-        if not line:
-            continue
-        if "jump" in prompt_history[-1].lower() and "jump" in line.lower():
-            explanation += f"- **Line {idx}: `{line}`** - This line is part of the jump mechanic. It likely checks for a key press (e.g., spacebar) to start the jump or updates the player's vertical position. The reasoning behind this is to allow the player to interact with the game world by jumping over obstacles or reaching higher platforms, which is a core feature in many 2D games.\n"
-        elif "health" in prompt_history[-1].lower() and "health" in line.lower():
-            explanation += f"- **Line {idx}: `{line}`** - This line relates to the health system. It might define the player's health or reduce it when damage is taken. The purpose is to track the player's survival status, adding challenge and strategy to the game by requiring the player to avoid damage.\n"
-        elif line.startswith(("def ", "function ", "void ", "fn ", "class ", "struct ")):
-            explanation += f"- **Line {idx}: `{line}`** - This line defines a function or method in {language}. Functions are used to organize code into reusable blocks, making it easier to manage game logic like updating the player's position or handling input.\n"
-        elif "=" in line and "if" not in line:
-            explanation += f"- **Line {idx}: `{line}`** - This line initializes a variable. Variables store important game data, such as the player's position or speed, which are used to control how the game behaves.\n"
-        elif "if " in line:
-            explanation += f"- **Line {idx}: `{line}`** - This line contains a conditional statement. It checks for a condition (e.g., a key press) and executes code if the condition is true, which is essential for handling player input and game events.\n"
-    
-    explanation += f"\n### Reasoning Behind the Changes:\n"
-    if "jump" in prompt_history[-1].lower():
-        explanation += f"- **Jump Mechanic**: The jump mechanic was added to enhance gameplay by allowing vertical movement. In {language}, this typically involves checking for a key press (e.g., spacebar) to start the jump, applying an upward velocity to the player's position, and using gravity to bring the player back down. This creates a smooth jumping effect, making the game more interactive and fun. The variables like `jump_velocity` and `gravity` are carefully chosen to balance the jump height and fall speed, ensuring the player can jump over obstacles without the jump feeling too floaty or too abrupt.\n"
-    elif "health" in prompt_history[-1].lower():
-        explanation += f"- **Health System**: The health system was added to introduce a survival element to the game. By tracking the player's health, the game can simulate damage from enemies or obstacles, making the player more cautious. The `max_health` variable sets the starting health, and a damage function allows the health to decrease, adding challenge and stakes to the gameplay.\n"
-    elif "optimize" in prompt_history[-1].lower():
-        explanation += f"- **Performance Optimization**: The optimization changes were made to improve the game's frame rate, ensuring it runs smoothly even on lower-end devices. In {language}, this might involve reducing the number of calculations in the game loop or using more efficient data structures, which helps maintain a consistent gaming experience.\n"
-    
-    explanation += f"\n### How the {language} Code Fits into Game Development:\n"
-    explanation += f"- The modified code follows {language} best practices, making it suitable for game development in its respective environment (e.g., using Pygame for Python). The changes enhance the player's experience by adding interactive features like jumping, while maintaining the core game loop that updates the game state each frame.\n"
-    return explanation
+# Functions to validate and diff code, recording how long each call takes in the session's metrics
+def timed_validate_code(code, language):
+    with session_metrics.timer("validate", language=language, lines=code.count("\n") + 1):
+        return validate_code(code, language)
+
+def timed_compute_diff(original, modified):
+    with session_metrics.timer("diff", lines=modified.count("\n") + 1):
+        return compute_diff(original, modified)
+
+# Function to start writing the explanation for an explanation request of
+# (original hash, modified hash, prompt history, model, language, bypass_cache)
+def start_explanation_request(request):
+    original_hash, modified_hash, *arguments = request
+    return start_explanation(load_code(original_hash), load_code(modified_hash), *arguments)
+
+# Function to save the session state in the snapshot store, with the code versions it refers to
+def save_session_state():
+    state = {key: st.session_state[key] for key in PERSISTED_STATE}
+    snapshots = [state["original_hash"], state["modified_hash"], state["integrated_hash"], state["error_updated_hash"], *state["snapshot_hashes"]]
+    snapshots += list(state["diff_hashes"] or []) + list(state["explanation_request"] or [])[:2]
+    snapshot_store.save_session(st.session_state.session_id, state, snapshots)
+
+# Function to build a streaming callback that feeds a parser and re-renders partial results
+# Rendering is throttled so fast token streams don't flood the page with updates; the chunk that
+# completes the code block is always rendered, so the finished code shows without waiting
+def make_stream_handler(parser, on_update, min_interval=0.1):
+    last_render = [0.0]
+    was_complete = [False]
+    def handle_chunk(chunk):
+        parser.feed(chunk)
+        now = time.perf_counter()
+        just_completed = parser.code_complete and not was_complete[0]
+        was_complete[0] = parser.code_complete
+        if now - last_render[0] >= min_interval or just_completed:
+            last_render[0] = now
+            on_update(parser)
+    return handle_chunk
+
+# Function to render a partially streamed response into a placeholder
+def render_stream(placeholder, parser, language, section_marker, section_end_marker=None):
+    with placeholder.container():
+        if parser.code_started:
+            st.code(parser.code, language=language.lower())
+        section_text = parser.section(section_marker, section_end_marker)
+        if section_text:
+            st.markdown(section_text)
+
+# Function to write a raw model response to the page, if enabled in the sidebar
+def show_raw_response(title, output):
+    if st.session_state.show_raw_responses:
+        with st.expander(f"Raw LLM Response for {title}"):
+            st.text(output)
+
+# Function to request a completion from model and parse it, or race it against backup_models if any are given
+# build_request(model) returns (cache_key, messages), parse(output) parses the response and is_valid(parsed)
+# decides whether a hedged response can win. Returns (model, raw output, parsed result).
+# Hedged requests are not streamed to on_chunk; a losing request is abandoned at its next chunk.
+# The request and the parsing of its response are recorded in the session's metrics under label.
+def request_parsed(build_request, parse, is_valid, model, max_tokens, bypass_cache=False, on_chunk=None, backup_models=(), hedge_delay=2.0, label=""):
+    def timed_parse(output, parsed_model):
+        with session_metrics.timer("parse", label=label, model=parsed_model):
+            return parse(output)
+
+    if not backup_models:
+        cache_key, messages = build_request(model)
+        output = request_completion(
+            client, response_cache, cache_key, model, messages, max_tokens, bypass_cache=bypass_cache, on_chunk=on_chunk, recorder=session_metrics, label=label
+        )
+        return model, output, timed_parse(output, model)
+
+    def call(candidate_model, cancel_event):
+        cache_key, messages = build_request(candidate_model)
+        output = request_completion(
+            client, response_cache, cache_key, candidate_model, messages, max_tokens, bypass_cache=bypass_cache, on_chunk=cancel_on_chunk(cancel_event),
+            recorder=session_metrics, label=label
+        )
+        return output, timed_parse(output, candidate_model)
+
+    models = [model, *[m for m in backup_models if m != model]]
+    winning_model, (output, parsed) = hedged_call(call, models, lambda result: is_valid(result[1]), delay=hedge_delay)
+    return winning_model, output, parsed
 
 # Function to call Groq API with prompt history and language context
-def generate_code_modification(code, prompt_history, context, model, language):
-    system_prompt = f"""
-    You are an expert game developer proficient in {language}. Modify the provided code based on the sequence of user prompts, ensuring best practices for {language} in game development (e.g., memory management for C++, dynamic typing for Python, Rigidbody for C#). Apply each prompt in order, building on the previous modifications. Return the response in markdown format:
-    ```{language.lower()}
-    [modified code]
-    ```
-    **Explanation**: Provide a highly detailed, elaborative, and beginner-friendly explanation of the modified code. Ensure the explanation is easy to understand for someone new to {language} and game development. Avoid generic responses and focus on specifics of the code. Include the following sections:
-    - **Summary of Changes**: Summarize all changes made to the original code across all prompts in a clear list, explaining what was added or modified.
-    - **How the New Features Work**: Explain each new or modified feature in detail, specific to {language} and its game development context (e.g., how a jump mechanic works with physics or input handling in {language}).
-    - **Step-by-Step Code Breakdown**: Break down the entire modified code line by line, explaining the purpose of each variable, function, and language-specific feature (e.g., what a loop does, why a variable is initialized, how the game loop interacts with the feature). Include reasoning for why each line is necessary for the game.
-    - **Game Logic Explained**: Describe how the changes fit into the broader game logic, such as how the feature affects gameplay (e.g., how a health system impacts player survival).
-    - **If a Prompt is a Duplicate**: Note that no additional changes were made for that step.
-    """
-    # Combine all prompts into a single user prompt, showing the history
-    user_prompt = f"""
-    Context: {context or f'No additional context provided for {language}.'}
-    Original code:
-    ```{language.lower()}
-    {code}
-    ```
-    Apply the following changes in sequence:
-    """
-    for idx, prompt in enumerate(prompt_history, 1):
-        user_prompt += f"\nStep {idx}: {prompt}"
-    
-    response = client.chat.completions.create(
-        model=model,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ],
-        temperature=0.7,
-        max_tokens=1500
+# step_offset is the number of steps already applied to the code (used for incremental mode)
+# on_update, if given, is called with a StreamingResponseParser as the response streams in
+# patch_mode requests search/replace hunks and falls back to the full file if they can't be applied
+# focus_code sends only the chunks of a large file that are relevant to the prompts
+# backup_models hedges the request: they are tried too if model is slow (hedge_delay seconds) or fails
+# code_only requests just the code; the explanation is then "" (see start_explanation)
+def generate_code_modification(code, prompt_history, context, model, language, step_offset=0, bypass_cache=False, on_update=None, patch_mode=False, focus_code=False,
+                               backup_models=(), hedge_delay=2.0, code_only=False):
+    view = select_code_view(code, language, " ".join(prompt_history + [context or ""])) if focus_code else None
+    is_valid_modification = lambda result: result[0] is not None and timed_validate_code(result[0], language)[0]
+    if patch_mode:
+        winning_model, output, (modified_code, explanation) = request_parsed(
+            lambda m: build_modification_request(code, prompt_history, context, m, language, step_offset, patch_mode=True, view=view, code_only=code_only),
+            lambda output: parse_patch_response(output, code, prompt_history, language, explain=not code_only),
+            is_valid_modification, model, MODIFICATION_MAX_TOKENS, bypass_cache=bypass_cache,
+            on_chunk=make_stream_handler(StreamingResponseParser(language, ["**Explanation**:"]), on_update) if on_update else None,
+            backup_models=backup_models, hedge_delay=hedge_delay, label="patch"
+        )
+        show_raw_response(f"Code Patch ({winning_model})", output)
+        if modified_code is not None:
+            return modified_code, explanation
+        st.info("The suggested edits could not be applied to the code, so the full modified file is being generated instead.")
+
+    winning_model, output, (modified_code, explanation) = request_parsed(
+        lambda m: build_modification_request(code, prompt_history, context, m, language, step_offset, view=view, code_only=code_only),
+        lambda output: parse_modification_response(output, code, prompt_history, language, view, explain=not code_only),
+        is_valid_modification, model, MODIFICATION_MAX_TOKENS, bypass_cache=bypass_cache,
+        on_chunk=make_stream_handler(StreamingResponseParser(language, ["**Explanation**:"]), on_update) if on_update else None,
+        backup_models=backup_models, hedge_delay=hedge_delay, label="modification"
     )
-    output = response.choices[0].message.content
-    st.write("Debug: Raw LLM Response for Code Modification:", output)  # Debug output
-    
-    # Parse response
-    code_match = re.search(rf"```{language.lower()}\n(.*?)```", output, re.DOTALL)
-    explanation_match = re.search(r"\*\*Explanation\*\*:(.*?)$", output, re.DOTALL)
-    modified_code = code_match.group(1).strip() if code_match else ""
-    explanation = explanation_match.group(1).strip() if explanation_match else ""
-    
-    # Fallback if explanation is empty or insufficient
-    if not explanation or explanation == "No explanation provided." or len(explanation.split("\n")) < 5:  # If explanation is too short
-        explanation = generate_fallback_explanation(code, modified_code, prompt_history, language)
-    
+    show_raw_response(f"Code Modification ({winning_model})", output)
+    if modified_code is None:
+        st.info("The returned code could not be matched to the relevant parts of the file, so the whole file is being sent instead.")
+        return generate_code_modification(code, prompt_history, context, model, language, step_offset, bypass_cache, on_update,
+                                          backup_models=backup_models, hedge_delay=hedge_delay, code_only=code_only)
     return modified_code, explanation
 
+# Function to start writing the explanation of the changes from original_code to modified_code in a worker thread
+# Returns a Future for the explanation text; the response is cached against the code, so it is only written once
+def start_explanation(original_code, modified_code, prompt_history, model, language, bypass_cache=False):
+    cache_key, messages = build_explanation_request(original_code, modified_code, prompt_history, model, language)
+    def write_explanation():
+        output = request_completion(
+            client, response_cache, cache_key, model, messages, EXPLANATION_MAX_TOKENS, bypass_cache=bypass_cache, recorder=session_metrics, label="explanation"
+        )
+        return parse_explanation_response(output, original_code, modified_code, prompt_history, language)
+    return get_explanation_executor().submit(write_explanation)
+
 # Function to suggest fixes for errors and provide updated code
-def suggest_error_fix(error_message, code, model, language):
-    system_prompt = f"""
-    You are an expert game developer proficient in {language}. The user has encountered an error while testing their {language} game code. Analyze the error message and the code, then provide:
-    1. A clear, beginner-friendly suggestion to fix the error, specific to {language} game development.
-    2. The fully updated code with the fix applied.
-    Return the response in markdown format:
-    **Suggested Fix**: [Detailed explanation of the fix, including why the error occurred, how the fix resolves it, and any code changes made.]
-    **Updated Code**:
-    ```{language.lower()}
-    [fully updated code with the fix applied]
-    ```
-    """
-    user_prompt = f"""
-    Error message from the game environment:
-    {error_message}
-
-    Code being tested:
-    ```{language.lower()}
-    {code}
-    ```
-    Suggest a fix for this error and provide the fully updated code.
-    """
-    
-    response = client.chat.completions.create(
-        model=model,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ],
-        temperature=0.7,
-        max_tokens=1000
+# focus_code sends only the lines of a large file around the error (or the chunks relevant to it)
+# candidates > 1 requests several fixes in parallel, cycling through model and extra_models, and keeps
+# the first one whose code passes validation (streaming is not used in that case)
+# backup_models hedges a single-candidate request the same way as generate_code_modification
+def suggest_error_fix(error_message, code, model, language, bypass_cache=False, on_update=None, focus_code=False, candidates=1, extra_models=(),
+                      backup_models=(), hedge_delay=2.0):
+    view = select_error_view(code, language, error_message) if focus_code else None
+    if candidates > 1:
+        return suggest_error_fix_candidates(error_message, code, model, language, view, bypass_cache, candidates, extra_models)
+    winning_model, output, (fix_suggestion, updated_code) = request_parsed(
+        lambda m: build_error_fix_request(error_message, code, m, language, view=view),
+        lambda output: parse_error_fix_response(output, code, language, view),
+        lambda result: result[1] is not None and timed_validate_code(result[1], language)[0],
+        model, ERROR_FIX_MAX_TOKENS, bypass_cache=bypass_cache,
+        on_chunk=make_stream_handler(StreamingResponseParser(language, ["**Suggested Fix**:", "**Updated Code**:"]), on_update) if on_update else None,
+        backup_models=backup_models, hedge_delay=hedge_delay, label="error_fix"
     )
-    output = response.choices[0].message.content
-    st.write("Debug: Raw LLM Response for Error Fix:", output)
-    
-    fix_suggestion_match = re.search(r"\*\*Suggested Fix\*\*:(.*?)\*\*Updated Code\*\*:", output, re.DOTALL)
-    updated_code_match = re.search(rf"```{language.lower()}\n(.*?)```", output, re.DOTALL)
-    
-    fix_suggestion = fix_suggestion_match.group(1).strip() if fix_suggestion_match else "Unable to suggest a fix. Please check the error message and code for typos or missing components."
-    updated_code = updated_code_match.group(1).strip() if updated_code_match else code
-    
+    show_raw_response(f"Error Fix ({winning_model})", output)
+    if updated_code is None:
+        st.info("The returned code could not be matched to the relevant parts of the file, so the whole file is being sent instead.")
+        return suggest_error_fix(error_message, code, model, language, bypass_cache, on_update, backup_models=backup_models, hedge_delay=hedge_delay)
+    return fix_suggestion, updated_code
+
+# Function to request several candidate fixes in parallel and keep the first valid one
+# The other candidates are streamed only so they can be abandoned at their next chunk once one wins
+def suggest_error_fix_candidates(error_message, code, model, language, view, bypass_cache, candidates, extra_models):
+    candidate_models = [model, *[m for m in extra_models if m != model]]
+
+    def make_request(candidate):
+        candidate_model = candidate_models[candidate % len(candidate_models)]
+        def request(cancel_event):
+            cache_key, messages = build_error_fix_request(error_message, code, candidate_model, language, view=view, candidate=candidate)
+            output = request_completion(
+                client, response_cache, cache_key, candidate_model, messages, ERROR_FIX_MAX_TOKENS, bypass_cache=bypass_cache,
+                on_chunk=cancel_on_chunk(cancel_event), recorder=session_metrics, label="error_fix"
+            )
+            with session_metrics.timer("parse", label="error_fix", model=candidate_model):
+                return candidate_model, output, parse_error_fix_response(output, code, language, view)
+        return request
+
+    def is_valid_fix(result):
+        updated_code = result[2][1]
+        return updated_code is not None and updated_code != code and timed_validate_code(updated_code, language)[0]
+
+    winning_model, output, (fix_suggestion, updated_code) = first_valid_result(
+        [make_request(candidate) for candidate in range(candidates)], is_valid_fix
+    )
+    show_raw_response(f"Error Fix ({winning_model})", output)
+    if updated_code is None:
+        st.info("The returned code could not be matched to the relevant parts of the file, so the whole file is being sent instead.")
+        return suggest_error_fix(error_message, code, model, language, bypass_cache, candidates=candidates, extra_models=extra_models)
     return fix_suggestion, updated_code
 
-# Function to compute diff (kept for potential future use, but not displayed)
-def compute_diff(original, modified):
-    diff = difflib.unified_diff(original.splitlines(), modified.splitlines(), lineterm="")
-    return "\n".join(diff)
+# Function to apply the prompt history incrementally, reusing snapshots of unchanged steps
+# Snapshots are snapshot store hashes, each stored as a delta against the previous step
+# Only the code of each step is requested: a step's own explanation would leave out the steps before it,
+# so the whole chain is explained separately (see build_explanation_request)
+def run_incremental_chain(original_hash, prompt_history, snapshot_hashes, snapshot_prompts, context, model, language, bypass_cache=False, on_update=None, patch_mode=False, focus_code=False,
+                          backup_models=(), hedge_delay=2.0):
+    start = first_changed_step(prompt_history, snapshot_prompts)
+    snapshot_hashes = snapshot_hashes[:start]
+    snapshot_prompts = snapshot_prompts[:start]
+    for step in range(start, len(prompt_history)):
+        base_hash = snapshot_hashes[-1] if snapshot_hashes else original_hash
+        modified_code, _ = generate_code_modification(
+            load_code(base_hash), prompt_history[step:step + 1], context, model, language, step_offset=step, bypass_cache=bypass_cache,
+            on_update=on_update, patch_mode=patch_mode, focus_code=focus_code, backup_models=backup_models, hedge_delay=hedge_delay,
+            code_only=True
+        )
+        is_valid, validation_error = timed_validate_code(modified_code, language)
+        if not is_valid:
+            return snapshot_hashes, snapshot_prompts, f"Step {step + 1}: {validation_error}"
+        snapshot_hashes.append(snapshot_store.put(modified_code, parent=base_hash))
+        snapshot_prompts.append(prompt_history[step])
+    return snapshot_hashes, snapshot_prompts, ""
 
 # Handle generation
 if client and generate_button and code_input and prompt_input:
     # If this is the first prompt, set the original code
-    if not st.session_state.prompt_history and not st.session_state.original_code:
-        st.session_state.original_code = code_input
+    if not st.session_state.prompt_history and not st.session_state.original_hash:
+        st.session_state.original_hash = snapshot_store.put(code_input)
     # Append the new prompt to history
     previous_length = len(st.session_state.prompt_history)
     st.session_state.prompt_history.append(prompt_input)
+    # Live preview of the streamed response, cleared once generation finishes
+    stream_placeholder = st.empty()
+    on_update = None
+    backup_models = hedge_models if st.session_state.hedge_requests else []
+    code_only = st.session_state.explanation_mode != "With the code"
+    if st.session_state.stream_responses and not backup_models:
+        on_update = lambda parser: render_stream(stream_placeholder, parser, st.session_state.language_selection, "**Explanation**:")
     try:
-        # Use the original code as the base, and apply all prompts in sequence
-        modified_code, explanation = generate_code_modification(
-            st.session_state.original_code, st.session_state.prompt_history, context_input, selected_model, st.session_state.language_selection
-        )
-        is_valid, validation_error = validate_code(modified_code, st.session_state.language_selection)
+        if st.session_state.incremental_mode:
+            # Re-run only from the first new, edited or deleted step, starting from its snapshot
+            snapshot_hashes, snapshot_prompts, validation_error = run_incremental_chain(
+                st.session_state.original_hash, st.session_state.prompt_history,
+                st.session_state.snapshot_hashes, st.session_state.snapshot_prompts,
+                context_input, selected_model, st.session_state.language_selection, bypass_cache=bypass_cache,
+                on_update=on_update, patch_mode=st.session_state.patch_mode, focus_code=st.session_state.focus_relevant_code,
+                backup_models=backup_models, hedge_delay=st.session_state.hedge_delay
+            )
+            explanation = ""
+            st.session_state.snapshot_hashes = snapshot_hashes
+            st.session_state.snapshot_prompts = snapshot_prompts
+            is_valid = not validation_error
+            modified_hash = snapshot_hashes[-1] if is_valid else None
+        else:
+            # Use the original code as the base, and apply all prompts in sequence
+            modified_code, explanation = generate_code_modification(
+                load_code(st.session_state.original_hash), st.session_state.prompt_history, context_input, selected_model, st.session_state.language_selection,
+                bypass_cache=bypass_cache, on_update=on_update, patch_mode=st.session_state.patch_mode,
+                focus_code=st.session_state.focus_relevant_code, backup_models=backup_models, hedge_delay=st.session_state.hedge_delay,
+                code_only=code_only
+            )
+            is_valid, validation_error = timed_validate_code(modified_code, st.session_state.language_selection)
+            modified_hash = snapshot_store.put(modified_code, parent=st.session_state.original_hash) if is_valid else None
+        stream_placeholder.empty()
         if not is_valid:
             st.error(validation_error)
         else:
-            st.session_state.modified_code = modified_code
+            st.session_state.modified_hash = modified_hash
             st.session_state.explanation = explanation
-            st.session_state.diff_output = compute_diff(st.session_state.original_code, modified_code)
+            # The diff is computed when it is shown (once per pair of versions)
+            st.session_state.diff_hashes = (st.session_state.original_hash, modified_hash)
+            # Explain the whole prompt chain separately, now or when the explanation is asked for
+            st.session_state.explanation_request = None
+            st.session_state.explanation_future = None
+            if not explanation:
+                st.session_state.explanation_request = (
+                    st.session_state.original_hash, modified_hash, list(st.session_state.prompt_history),
+                    selected_model, st.session_state.language_selection, bypass_cache
+                )
+                if st.session_state.explanation_mode == "In the background":
+                    st.session_state.explanation_future = start_explanation_request(st.session_state.explanation_request)
+                elif st.session_state.explanation_mode == "With the code":
+                    # Incremental runs explain the whole chain here, once the code of every step is ready
+                    with st.spinner("Writing the explanation..."):
+                        st.session_state.explanation = start_explanation_request(st.session_state.explanation_request).result()
+                    st.session_state.explanation_request = None
             # Force a rerun if this is the first prompt to ensure the sidebar updates
             if previous_length == 0:
                 st.experimental_rerun()
+    except RateLimitError:
+        st.error(RATE_LIMIT_MESSAGE.format(model=selected_model))
     except Exception as e:
         st.error(f"Error generating suggestions: {str(e)}")
 
 # Display suggestions
-if st.session_state.modified_code:
+if st.session_state.modified_hash:
     st.subheader("Suggested Changes")
     st.markdown("**Suggested Code**")
-    st.code(st.session_state.modified_code, language=st.session_state.language_selection.lower())
+    st.code(load_code(st.session_state.modified_hash), language=st.session_state.language_selection.lower())
     st.markdown("**Detailed Explanation of Changes**")
-    st.markdown(st.session_state.explanation)
+
+    # While an explanation is being written in the background, only this block reruns every second
+    # (not the whole script), so polling doesn't save the session or add to the rerun timings
+    @st.experimental_fragment(run_every=1 if st.session_state.explanation_future is not None else None)
+    def show_explanation():
+        if st.session_state.explanation:
+            st.markdown(st.session_state.explanation)
+        elif st.session_state.explanation_request:
+            explanation_future = st.session_state.explanation_future
+            if explanation_future is None or not explanation_future.done():
+                if explanation_future is not None:
+                    st.caption("The explanation is being written in the background and will appear here when it is ready.")
+                if st.button("Show explanation"):
+                    with st.spinner("Writing the explanation..."):
+                        if explanation_future is None:
+                            explanation_future = start_explanation_request(st.session_state.explanation_request)
+                            st.session_state.explanation_future = explanation_future
+                        wait([explanation_future])
+            if explanation_future is not None and explanation_future.done():
+                st.session_state.explanation_future = None
+                try:
+                    st.session_state.explanation = explanation_future.result()
+                    st.session_state.explanation_request = None
+                except Exception as e:
+                    st.error(f"Error writing the explanation: {str(e)}")
+                else:
+                    # Rerun the whole script so the explanation is saved with the session and polling stops
+                    st.experimental_rerun()
+
+    show_explanation()
+    diff_output = load_diff(*st.session_state.diff_hashes) if st.session_state.diff_hashes else ""
+    if diff_output:
+        with st.expander("Diff against original code"):
+            st.code(diff_output, language="diff")
     
     # Integrate button
     if st.button("Integrate Code"):
-        st.session_state.integrated_code = st.session_state.modified_code
-        st.session_state.diff_output = compute_diff(st.session_state.original_code, st.session_state.integrated_code)
-        # Clear prompt history after integration
+        st.session_state.integrated_hash = st.session_state.modified_hash
+        st.session_state.diff_hashes = (st.session_state.original_hash, st.session_state.integrated_hash)
+        # Clear prompt history and step snapshots after integration
         st.session_state.prompt_history = []
+        st.session_state.snapshot_hashes = []
+        st.session_state.snapshot_prompts = []
 
-# Display final output
-if st.session_state.integrated_code:
+# Display final output (with error reporting, which needs the client)
+if client and st.session_state.integrated_hash:
     st.subheader("Final Integrated Code")
-    st.code(st.session_state.integrated_code, language=st.session_state.language_selection.lower())
+    st.code(load_code(st.session_state.integrated_hash), language=st.session_state.language_selection.lower())
     st.markdown("Test the integrated code in the appropriate environment to see the changes in action.")
     
     # Troubleshooting section
@@ -348,20 +624,100 @@ if st.session_state.integrated_code:
     st.subheader("Report an Error")
     st.markdown("If you encountered an error, paste the error message below and click 'Suggest Fix' to get help.")
     error_message = st.text_area("Paste the error message here", value=st.session_state.error_message, height=100)
+    fix_candidates = st.number_input(
+        "Parallel fix candidates", min_value=1, max_value=4, value=1,
+        help="Request several fixes at once and keep the first one whose code passes validation. The others are stopped once one is accepted. "
+             "With more than one candidate the fix is not streamed (or hedged) and appears when it is complete."
+    )
+    if fix_candidates > 1 and (st.session_state.stream_responses or st.session_state.hedge_requests):
+        st.caption(f"With {fix_candidates} parallel candidates the fix is not streamed or hedged. Set this to 1 to see it as it is written.")
+    extra_fix_models = st.multiselect(
+        "Also try these models for fix candidates", [m for m in MODELS if m != selected_model],
+        help="Candidates alternate between the selected model and these models."
+    )
     if st.button("Suggest Fix") and error_message:
         st.session_state.error_message = error_message
+        fix_stream_placeholder = st.empty()
+        on_fix_update = None
+        fix_backup_models = hedge_models if st.session_state.hedge_requests and fix_candidates == 1 else []
+        if st.session_state.stream_responses and fix_candidates == 1 and not fix_backup_models:
+            on_fix_update = lambda parser: render_stream(fix_stream_placeholder, parser, st.session_state.language_selection, "**Suggested Fix**:", "**Updated Code**:")
         try:
-            fix_suggestion, updated_code = suggest_error_fix(error_message, st.session_state.integrated_code, selected_model, st.session_state.language_selection)
+            fix_suggestion, updated_code = suggest_error_fix(
+                error_message, load_code(st.session_state.integrated_hash), selected_model, st.session_state.language_selection,
+                bypass_cache=bypass_cache, on_update=on_fix_update, focus_code=st.session_state.focus_relevant_code,
+                candidates=fix_candidates, extra_models=extra_fix_models, backup_models=fix_backup_models, hedge_delay=st.session_state.hedge_delay
+            )
+            fix_stream_placeholder.empty()
             st.session_state.error_fix_suggestion = fix_suggestion
-            st.session_state.error_updated_code = updated_code
-            st.session_state.integrated_code = updated_code
+            st.session_state.error_updated_hash = snapshot_store.put(updated_code, parent=st.session_state.integrated_hash)
+            # Only replace the integrated code with a fix that passes validation
+            is_valid, validation_error = timed_validate_code(updated_code, st.session_state.language_selection)
+            if is_valid:
+                st.session_state.integrated_hash = st.session_state.error_updated_hash
+            else:
+                st.warning(f"The suggested code was not applied to the integrated code. {validation_error}")
+        except RateLimitError:
+            st.error(RATE_LIMIT_MESSAGE.format(model=selected_model))
+            st.session_state.error_fix_suggestion = "Unable to suggest a fix due to an error. Please check the error message and code manually."
+            st.session_state.error_updated_hash = st.session_state.integrated_hash
         except Exception as e:
             st.error(f"Error suggesting fix: {str(e)}")
             st.session_state.error_fix_suggestion = "Unable to suggest a fix due to an error. Please check the error message and code manually."
-            st.session_state.error_updated_code = st.session_state.integrated_code
+            st.session_state.error_updated_hash = st.session_state.integrated_hash
     
     if st.session_state.error_fix_suggestion:
         st.markdown("**Suggested Fix**")
         st.markdown(st.session_state.error_fix_suggestion)
         st.markdown("**Updated Code After Fix**")
-        st.code(st.session_state.error_updated_code, language=st.session_state.language_selection.lower())
\ No newline at end of file
+        st.code(load_code(st.session_state.error_updated_hash), language=st.session_state.language_selection.lower())
+
+# Show response cache statistics once all requests for this run have finished
+if client:
+    cache_stats = response_cache.stats()
+    store_stats = snapshot_store.stats()
+    cache_stats_placeholder.caption(
+        f"Response cache: {cache_stats['hits_memory'] + cache_stats['hits_disk']} hits, {cache_stats['misses']} misses, "
+        f"{cache_stats['disk_entries'] or cache_stats['memory_entries']} stored responses. "
+        f"Code store: {store_stats['snapshots']} versions in {store_stats['stored_bytes'] / 1024:.0f} KB across {store_stats['sessions']} sessions"
+    )
+
+# Show per-model latency and win rate of hedged requests
+if client:
+    model_rows = model_stats.rows()
+    if model_rows:
+        with model_stats_placeholder.expander("Model latency and win rate"):
+            table = ["| Model | Requests | Win rate | Errors | Cancelled | p50 | p95 |", "|---|---|---|---|---|---|---|"]
+            for row in model_rows:
+                latency = [f"{row[key]:.2f}s" if row[key] is not None else "-" for key in ("p50_s", "p95_s")]
+                table.append(f"| {row['model']} | {row['requests']} | {row['win_rate']:.0%} | {row['errors']} | {row['cancelled']} | {latency[0]} | {latency[1]} |")
+            st.markdown("\n".join(table))
+
+# Show how long this rerun took, compared with the previous one
+if client:
+    rerun_ms = (time.perf_counter() - rerun_started) * 1000
+    previous_timings = st.session_state.rerun_timings
+    timing_text = f"Rerun: {rerun_ms:.1f} ms"
+    if previous_timings:
+        timing_text += f" (previous: {previous_timings[-1]:.1f} ms, median of last {len(previous_timings)}: {sorted(previous_timings)[len(previous_timings) // 2]:.1f} ms)"
+    rerun_timing_placeholder.caption(timing_text)
+    st.session_state.rerun_timings = (previous_timings + [rerun_ms])[-20:]
+    session_metrics.record("rerun", seconds=round(rerun_ms / 1000, 4))
+
+# This session's performance metrics per kind of operation and model, with an export of the raw records
+if client:
+    metric_rows = session_metrics.summary()
+    with metrics_placeholder.expander("Performance metrics (this session)"):
+        format_seconds = lambda value: f"{value:.3f}s" if value is not None else "-"
+        table = ["| Operation | Model | Count | p50 | p95 | TTFT p50 | TTFT p95 | Tokens in/out | Cache hits |", "|---|---|---|---|---|---|---|---|---|"]
+        for row in metric_rows:
+            operation = f"{row['kind']} ({row['label']})" if row["label"] else row["kind"]
+            table.append(
+                f"| {operation} | {row['model'] or '-'} | {row['count']} | {format_seconds(row['p50_s'])} | {format_seconds(row['p95_s'])} | "
+                f"{format_seconds(row['ttft_p50_s'])} | {format_seconds(row['ttft_p95_s'])} | {row['prompt_tokens']}/{row['completion_tokens']} | {row['cache_hits']} |"
+            )
+        st.markdown("\n".join(table))
+        st.download_button("Download metrics (JSONL)", session_metrics.to_jsonl(), file_name="metrics.jsonl", mime="application/x-ndjson")
+
+# Save this session's state (code as hashes) so it can be restored after a restart
+save_session_state()
\ No newline at end of file
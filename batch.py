@@ -0,0 +1,193 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import httpx
+from groq import AsyncGroq
+
+from code_iterator import (
+    MODIFICATION_MAX_TOKENS, build_modification_request, compute_diff, parse_modification_response,
+    parse_patch_response, request_completion_async, select_code_view, validate_code
+)
+from metrics import MetricsRecorder
+from resources import LANGUAGE_EXTENSIONS, LANGUAGES, MODELS
+from response_cache import ResponseCache
+from scheduler import RequestScheduler
+
+# Headless batch mode: apply a prompt chain to every script of one language in a directory.
+# Requests run concurrently, bounded by a concurrency limit and by per-model requests-per-minute
+# and tokens-per-minute budgets (see scheduler.py); rate limit errors are retried with backoff.
+# Each file's modified code and unified diff are written to the output directory as soon as
+# that file finishes, followed by a summary.json report. Timings and token usage of every request,
+# validation and diff are written to metrics.jsonl.
+#
+# Example:
+#   python batch.py scripts/enemies --language Lua --prompt "Add health system" --output out
+
+# Function to match a language name from the command line against the supported languages
+def resolve_language(name):
+    lowered = name.strip().lower()
+    for language in LANGUAGES:
+        if lowered in (language.lower(), language.split(" (")[0].lower()):
+            return language
+    raise ValueError(f"Unsupported language '{name}'. Choose one of: {', '.join(LANGUAGES)}")
+
+# Function to list the source files for a language under a directory, as paths relative to it
+def find_source_files(directory, language):
+    extensions = LANGUAGE_EXTENSIONS[language]
+    found = []
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for name in sorted(files):
+            if name.endswith(extensions):
+                found.append(os.path.relpath(os.path.join(root, name), directory))
+    return found
+
+# Function to apply the prompt chain to one file and write its modified code and diff
+# In patch mode, search/replace hunks are requested first and the full file only if they don't apply
+# Unless full_context is set, large files are sent as the chunks relevant to the prompts plus an outline
+# Only the code is requested, since the explanations are not part of the output
+async def process_file(client, cache, scheduler, recorder, semaphore, directory, relative_path, output_dir, prompts, context, model, language,
+                       bypass_cache=False, patch_mode=False, full_context=False):
+    started = time.perf_counter()
+    result = {"file": relative_path, "status": "error", "error": "", "seconds": 0.0, "changed_lines": 0}
+    try:
+        with open(os.path.join(directory, relative_path), encoding="utf-8") as f:
+            code = f.read()
+        view = None if full_context else select_code_view(code, language, " ".join(prompts + [context]))
+        result["chunked"] = view is not None
+
+        async def complete(cache_key, messages, label):
+            async with semaphore:
+                return await request_completion_async(
+                    client, cache, cache_key, model, messages, MODIFICATION_MAX_TOKENS, bypass_cache=bypass_cache, scheduler=scheduler,
+                    recorder=recorder, label=label
+                )
+
+        modified_code = None
+        if patch_mode:
+            cache_key, messages = build_modification_request(code, prompts, context, model, language, patch_mode=True, view=view, code_only=True)
+            modified_code, _ = parse_patch_response(await complete(cache_key, messages, "patch"), code, prompts, language, explain=False)
+            result["patched"] = modified_code is not None
+        if modified_code is None:
+            cache_key, messages = build_modification_request(code, prompts, context, model, language, view=view, code_only=True)
+            modified_code, _ = parse_modification_response(await complete(cache_key, messages, "modification"), code, prompts, language, view, explain=False)
+        if modified_code is None:
+            # The returned chunks could not be spliced back, so send the whole file
+            cache_key, messages = build_modification_request(code, prompts, context, model, language, code_only=True)
+            modified_code, _ = parse_modification_response(await complete(cache_key, messages, "modification"), code, prompts, language, explain=False)
+        with recorder.timer("validate", language=language, file=relative_path):
+            is_valid, validation_error = validate_code(modified_code, language)
+        if not is_valid:
+            result["status"] = "invalid"
+            result["error"] = validation_error
+        else:
+            with recorder.timer("diff", file=relative_path):
+                diff = compute_diff(code, modified_code, fromfile=f"a/{relative_path}", tofile=f"b/{relative_path}")
+            target = os.path.join(output_dir, relative_path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, "w", encoding="utf-8") as f:
+                f.write(modified_code + "\n")
+            with open(target + ".diff", "w", encoding="utf-8") as f:
+                f.write(diff + "\n" if diff else "")
+            result["status"] = "modified" if diff else "unchanged"
+            result["changed_lines"] = sum(
+                1 for line in diff.splitlines()
+                if line[:1] in "+-" and not line.startswith(("+++", "---"))
+            )
+    except Exception as e:
+        result["error"] = str(e)
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+# Function to run the prompt chain over a directory and write the summary report
+async def run_batch(api_key, directory, language, prompts, output_dir, model=MODELS[0], context="",
+                    concurrency=4, requests_per_minute=30, bypass_cache=False, patch_mode=False, full_context=False, cache_path=os.path.join(".cache", "llm_responses.sqlite3")):
+    files = find_source_files(directory, language)
+    cache = ResponseCache(cache_path)
+    scheduler = RequestScheduler(requests_per_minute=requests_per_minute or None)
+    semaphore = asyncio.Semaphore(concurrency)
+    os.makedirs(output_dir, exist_ok=True)
+    metrics_path = os.path.join(output_dir, "metrics.jsonl")
+    if os.path.exists(metrics_path):
+        os.remove(metrics_path)
+    recorder = MetricsRecorder(path=metrics_path)
+    started = time.perf_counter()
+    results = []
+    http_client = httpx.AsyncClient(limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency))
+    # The SDK's own retries are disabled so that rate limit errors reach the request scheduler
+    async with AsyncGroq(api_key=api_key, max_retries=0, http_client=http_client) as client:
+        tasks = [
+            asyncio.create_task(process_file(
+                client, cache, scheduler, recorder, semaphore, directory, relative_path, output_dir,
+                prompts, context, model, language, bypass_cache, patch_mode, full_context
+            ))
+            for relative_path in files
+        ]
+        for done, task in enumerate(asyncio.as_completed(tasks), 1):
+            result = await task
+            results.append(result)
+            print(f"[{done}/{len(files)}] {result['status']:<9} {result['file']} ({result['seconds']:.1f}s)"
+                  + (f" - {result['error']}" if result["error"] else ""), flush=True)
+    elapsed = time.perf_counter() - started
+    summary = {
+        "directory": directory,
+        "language": language,
+        "model": model,
+        "prompts": prompts,
+        "files": len(files),
+        "counts": {status: sum(1 for r in results if r["status"] == status) for status in ("modified", "unchanged", "invalid", "error")},
+        "elapsed_seconds": round(elapsed, 3),
+        "files_per_minute": round(len(files) / elapsed * 60, 2) if elapsed else 0.0,
+        "results": sorted(results, key=lambda r: r["file"]),
+    }
+    with open(os.path.join(output_dir, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply a prompt chain to every game script of one language in a directory.")
+    parser.add_argument("directory", help="Directory containing the scripts to modify")
+    parser.add_argument("--language", required=True, help=f"One of: {', '.join(LANGUAGES)}")
+    parser.add_argument("--prompt", action="append", default=[], help="A change to apply (repeat for a chain of prompts)")
+    parser.add_argument("--prompts-file", help="File with one prompt per line, applied after any --prompt values")
+    parser.add_argument("--context", default="", help="Additional context sent with every request")
+    parser.add_argument("--model", default=MODELS[0], choices=MODELS)
+    parser.add_argument("--output", default="batch_output", help="Directory for modified files, diffs, summary.json and metrics.jsonl")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum number of requests in flight")
+    parser.add_argument("--rpm", type=int, default=30, help="Maximum requests started per minute for the model (0 to use its default rate limit)")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the response cache")
+    parser.add_argument("--patch", action="store_true", help="Request search/replace edits instead of whole files, falling back to whole files if they don't apply")
+    parser.add_argument("--full-context", action="store_true", help="Always send whole files, even large ones")
+    parser.add_argument("--api-key", default=os.environ.get("GROQ_API_KEY", ""), help="Groq API key (defaults to $GROQ_API_KEY)")
+    args = parser.parse_args(argv)
+
+    prompts = list(args.prompt)
+    if args.prompts_file:
+        with open(args.prompts_file, encoding="utf-8") as f:
+            prompts.extend(line.strip() for line in f if line.strip())
+    if not prompts:
+        parser.error("at least one --prompt or --prompts-file is required")
+    if not args.api_key.startswith("gsk_"):
+        parser.error("a Groq API key starting with 'gsk_' is required (--api-key or $GROQ_API_KEY)")
+    try:
+        language = resolve_language(args.language)
+    except ValueError as e:
+        parser.error(str(e))
+
+    summary = asyncio.run(run_batch(
+        args.api_key, args.directory, language, prompts, args.output, model=args.model, context=args.context,
+        concurrency=max(1, args.concurrency), requests_per_minute=args.rpm, bypass_cache=args.no_cache, patch_mode=args.patch,
+        full_context=args.full_context
+    ))
+    counts = summary["counts"]
+    print(f"\n{summary['files']} files in {summary['elapsed_seconds']:.1f}s: "
+          f"{counts['modified']} modified, {counts['unchanged']} unchanged, {counts['invalid']} invalid, {counts['error']} errors. "
+          f"Report: {os.path.join(args.output, 'summary.json')}")
+    return 1 if counts["error"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+import argparse
+import os
+
+from resources import LANGUAGE_EXTENSIONS, LANGUAGES
+
+# Corpus of game scripts of increasing size in every supported language, used by the benchmarks.
+# The scripts are generated deterministically (a player plus a number of enemy types, each with
+# its own state and update logic), so every run and every commit benchmarks the same code.
+#
+# Example (write the corpus to disk, e.g. to try batch mode on it):
+#   python -m benchmarks.corpus --output benchmarks/corpus
+
+# Number of enemy types in each corpus size (roughly 20 lines each)
+CORPUS_SIZES = {"small": 2, "medium": 10, "large": 40, "xlarge": 150}
+
+PROMPTS = [
+    "Add a jump mechanic with gravity",
+    "Add a health system with a take_damage function",
+    "Add a double jump power-up",
+    "Make enemies flee when their health is low",
+    "Add a score counter that increases when an enemy is defeated",
+    "Add a dash ability with a cooldown",
+    "Add invincibility frames after taking damage",
+    "Make the player respawn at a checkpoint",
+    "Add a pause state to the game loop",
+    "Add footstep sounds when the player moves",
+    "Add a stamina bar that limits sprinting",
+    "Spawn enemies in waves",
+    "Add knockback when the player is hit",
+    "Add a simple inventory for collected items",
+    "Save and load the player's position",
+    "Add difficulty levels that scale enemy speed",
+]
+
+CPP = (
+    "#include <iostream>\n#include <vector>\n\nstruct Vec2 {{ float x; float y; }};\n\n"
+    "class Player {{\npublic:\n    Vec2 position{{0.0f, 0.0f}};\n    float speed = 5.0f;\n\n"
+    "    void update(float dt) {{\n        position.x += speed * dt;\n        std::cout << \"Player at \" << position.x << std::endl;\n    }}\n}};\n",
+    "\nclass Enemy{i} {{\npublic:\n    Vec2 position{{{i}.0f, 0.0f}};\n    float speed = {speed}f;\n    int health = {health};\n\n"
+    "    void update(float dt, const Player& player) {{\n        if (position.x > player.position.x) {{\n            position.x -= speed * dt;\n"
+    "        }} else {{\n            position.x += speed * dt;\n        }}\n    }}\n\n"
+    "    void takeDamage(int amount) {{\n        health -= amount;\n        if (health <= 0) {{\n"
+    "            std::cout << \"Enemy{i} defeated\" << std::endl;\n        }}\n    }}\n}};\n",
+    "\nint main() {{\n    Player player;\n    for (int frame = 0; frame < 60; ++frame) {{\n        player.update(1.0f / 60.0f);\n    }}\n    return 0;\n}}\n",
+)
+
+CSHARP = (
+    "using System;\n\npublic class Player\n{{\n    public float X;\n    public float Speed = 5f;\n\n"
+    "    public void Update(float dt)\n    {{\n        X += Speed * dt;\n        Console.WriteLine($\"Player at {{X}}\");\n    }}\n}}\n",
+    "\npublic class Enemy{i}\n{{\n    public float X = {i}f;\n    public float Speed = {speed}f;\n    public int Health = {health};\n\n"
+    "    public void Update(float dt, Player player)\n    {{\n        if (X > player.X)\n        {{\n            X -= Speed * dt;\n        }}\n"
+    "        else\n        {{\n            X += Speed * dt;\n        }}\n    }}\n\n"
+    "    public void TakeDamage(int amount)\n    {{\n        Health -= amount;\n        if (Health <= 0) Console.WriteLine(\"Enemy{i} defeated\");\n    }}\n}}\n",
+    "\npublic static class Game\n{{\n    public static void Main()\n    {{\n        var player = new Player();\n"
+    "        for (int frame = 0; frame < 60; frame++) player.Update(1f / 60f);\n    }}\n}}\n",
+)
+
+GDSCRIPT = (
+    "extends Node2D\n\nvar player_position = Vector2.ZERO\nvar player_speed = 200.0\n\n"
+    "func _process(delta):\n\tupdate_player(delta)\n\nfunc update_player(delta):\n\tplayer_position.x += player_speed * delta\n",
+    "\nclass Enemy{i}:\n\tvar position = Vector2({i}, 0)\n\tvar speed = {speed}\n\tvar health = {health}\n\n"
+    "\tfunc update(delta, target):\n\t\tif position.x > target.x:\n\t\t\tposition.x -= speed * delta\n\t\telse:\n\t\t\tposition.x += speed * delta\n\n"
+    "\tfunc take_damage(amount):\n\t\thealth -= amount\n\t\tif health <= 0:\n\t\t\tprint(\"Enemy{i} defeated\")\n",
+    "\nfunc _ready():\n\tprint(\"Game ready\")\n",
+)
+
+JAVASCRIPT = (
+    "const canvas = document.getElementById(\"game\");\nconst ctx = canvas.getContext(\"2d\");\n\n"
+    "let player = {{ x: 0, y: 0, speed: 5 }};\n\nfunction updatePlayer(dt) {{\n    player.x += player.speed * dt;\n}}\n",
+    "\nclass Enemy{i} {{\n    constructor() {{\n        this.x = {i};\n        this.speed = {speed};\n        this.health = {health};\n    }}\n\n"
+    "    update(dt, target) {{\n        if (this.x > target.x) {{\n            this.x -= this.speed * dt;\n        }} else {{\n"
+    "            this.x += this.speed * dt;\n        }}\n    }}\n\n"
+    "    takeDamage(amount) {{\n        this.health -= amount;\n        if (this.health <= 0) {{\n            console.log(\"Enemy{i} defeated\");\n        }}\n    }}\n}}\n",
+    "\nfunction gameLoop() {{\n    updatePlayer(1 / 60);\n    ctx.clearRect(0, 0, canvas.width, canvas.height);\n    requestAnimationFrame(gameLoop);\n}}\n\ngameLoop();\n",
+)
+
+PYTHON = (
+    "import pygame\n\npygame.init()\nscreen = pygame.display.set_mode((800, 600))\n\n\nclass Player:\n"
+    "    def __init__(self):\n        self.x = 0\n        self.speed = 5\n\n    def update(self, dt):\n        self.x += self.speed * dt\n",
+    "\n\nclass Enemy{i}:\n    def __init__(self):\n        self.x = {i}\n        self.speed = {speed}\n        self.health = {health}\n\n"
+    "    def update(self, dt, target):\n        if self.x > target.x:\n            self.x -= self.speed * dt\n        else:\n"
+    "            self.x += self.speed * dt\n\n    def take_damage(self, amount):\n        self.health -= amount\n"
+    "        if self.health <= 0:\n            print(\"Enemy{i} defeated\")\n",
+    "\n\ndef main():\n    player = Player()\n    clock = pygame.time.Clock()\n    running = True\n    while running:\n"
+    "        for event in pygame.event.get():\n            if event.type == pygame.QUIT:\n                running = False\n"
+    "        player.update(clock.tick(60) / 1000)\n\n\nif __name__ == \"__main__\":\n    main()\n",
+)
+
+LUA = (
+    "local Player = {{ x = 0, speed = 5 }}\n\nfunction Player.update(dt)\n    Player.x = Player.x + Player.speed * dt\nend\n",
+    "\nlocal Enemy{i} = {{ x = {i}, speed = {speed}, health = {health} }}\n\n"
+    "function Enemy{i}.update(dt, target)\n    if Enemy{i}.x > target.x then\n        Enemy{i}.x = Enemy{i}.x - Enemy{i}.speed * dt\n"
+    "    else\n        Enemy{i}.x = Enemy{i}.x + Enemy{i}.speed * dt\n    end\nend\n\n"
+    "function Enemy{i}.take_damage(amount)\n    Enemy{i}.health = Enemy{i}.health - amount\n    if Enemy{i}.health <= 0 then\n"
+    "        print(\"Enemy{i} defeated\")\n    end\nend\n",
+    "\nfunction love.update(dt)\n    Player.update(dt)\nend\n",
+)
+
+HAXE = (
+    "class Player {{\n    public var x:Float = 0;\n    public var speed:Float = 5;\n\n    public function new() {{}}\n\n"
+    "    public function update(dt:Float):Void {{\n        x += speed * dt;\n    }}\n}}\n",
+    "\nclass Enemy{i} {{\n    public var x:Float = {i};\n    public var speed:Float = {speed};\n    public var health:Int = {health};\n\n"
+    "    public function new() {{}}\n\n    public function update(dt:Float, target:Player):Void {{\n        if (x > target.x) {{\n"
+    "            x -= speed * dt;\n        }} else {{\n            x += speed * dt;\n        }}\n    }}\n\n"
+    "    public function takeDamage(amount:Int):Void {{\n        health -= amount;\n        if (health <= 0) trace(\"Enemy{i} defeated\");\n    }}\n}}\n",
+    "\nclass Main {{\n    static function main() {{\n        var player = new Player();\n        player.update(1 / 60);\n    }}\n}}\n",
+)
+
+RUST = (
+    "struct Player {{\n    x: f32,\n    speed: f32,\n}}\n\nimpl Player {{\n    fn update(&mut self, dt: f32) {{\n        self.x += self.speed * dt;\n    }}\n}}\n",
+    "\nstruct Enemy{i} {{\n    x: f32,\n    speed: f32,\n    health: i32,\n}}\n\nimpl Enemy{i} {{\n"
+    "    fn update(&mut self, dt: f32, target: &Player) {{\n        if self.x > target.x {{\n            self.x -= self.speed * dt;\n"
+    "        }} else {{\n            self.x += self.speed * dt;\n        }}\n    }}\n\n"
+    "    fn take_damage(&mut self, amount: i32) {{\n        self.health -= amount;\n        if self.health <= 0 {{\n"
+    "            println!(\"Enemy{i} defeated\");\n        }}\n    }}\n}}\n",
+    "\nfn main() {{\n    let mut player = Player {{ x: 0.0, speed: 5.0 }};\n    player.update(1.0 / 60.0);\n}}\n",
+)
+
+# (header, enemy template, footer) for each language
+TEMPLATES = {
+    "C++": CPP,
+    "C# (Outside Unity)": CSHARP,
+    "GDScript": GDSCRIPT,
+    "JavaScript": JAVASCRIPT,
+    "Python": PYTHON,
+    "Lua": LUA,
+    "Haxe": HAXE,
+    "Rust": RUST,
+}
+
+# Function to generate a game script with the given number of enemy types
+def generate_script(language, enemies):
+    header, enemy, footer = TEMPLATES[language]
+    parts = [header.format()]
+    for i in range(enemies):
+        parts.append(enemy.format(i=i, speed=1 + i % 7, health=50 + 10 * (i % 5)))
+    parts.append(footer.format())
+    return "".join(parts)
+
+# Function to build the whole corpus as {(language, size name): code}
+def build_corpus(languages=LANGUAGES, sizes=CORPUS_SIZES):
+    return {(language, size): generate_script(language, enemies) for language in languages for size, enemies in sizes.items()}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write the benchmark corpus of game scripts to a directory.")
+    parser.add_argument("--output", default=os.path.join("benchmarks", "corpus"))
+    args = parser.parse_args(argv)
+    for (language, size), code in build_corpus().items():
+        directory = os.path.join(args.output, language.split(" (")[0].lower().replace("#", "sharp").replace("+", "p"))
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"{size}{LANGUAGE_EXTENSIONS[language][0]}"), "w", encoding="utf-8") as f:
+            f.write(code)
+    print(f"Wrote {len(CORPUS_SIZES) * len(LANGUAGES)} scripts to {args.output}")
+
+if __name__ == "__main__":
+    main()
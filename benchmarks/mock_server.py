@@ -0,0 +1,217 @@
+import argparse
+import itertools
+import json
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-in for the Groq (OpenAI-compatible) chat completions API, for benchmarks without
+# an API key or network. Responses come from hand-written canned completions when one matches
+# the request (see fixtures/canned_completions.jsonl), and are otherwise synthesized from the
+# request so they parse like real ones: the code sent is returned with a small change, as a full
+# file, relevant chunks, search/replace hunks or an error fix, depending on what the prompt asks for.
+#
+# Latency is simulated as a delay before the first token plus a delay per streamed chunk, max_tokens
+# is honoured (finish_reason "length"), and every Nth request can be answered with a 429.
+#
+# Example (point the app or batch mode at it through the Groq client's base URL):
+#   python -m benchmarks.mock_server --port 8765 --latency 0.3 --chunk-delay 0.01
+#   GROQ_BASE_URL=http://127.0.0.1:8765 streamlit run app.py
+
+FIXTURES_PATH = os.path.join(os.path.dirname(__file__), "fixtures", "canned_completions.jsonl")
+
+CODE_PATTERN = re.compile(r"```([^`\n]*)\n(.*?)```", re.DOTALL)
+MARKER_LINE_PATTERN = re.compile(r"^\s*(?:#|//|--)\s*@@chunk \w+@@.*$", re.MULTILINE)
+COMMENT_PREFIX = {"python": "#", "gdscript": "#", "lua": "--"}
+
+class MockSettings:
+    def __init__(self, latency=0.2, chunk_delay=0.005, chunk_size=16, rate_limit_every=0, retry_after=1.0, fixtures_path=FIXTURES_PATH):
+        self.latency = latency                    # seconds before the first token
+        self.chunk_delay = chunk_delay            # seconds between streamed chunks
+        self.chunk_size = chunk_size              # characters per streamed chunk
+        self.rate_limit_every = rate_limit_every  # answer every Nth request with a 429 (0 for never)
+        self.retry_after = retry_after            # retry-after header sent with a 429
+        self.fixtures = load_fixtures(fixtures_path) if fixtures_path else []
+
+# Function to load canned completions: one JSON object per line with "match" (text that must
+# appear in the request's messages) and "content" (the completion to return)
+def load_fixtures(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+# Function to build the completion text for a request
+def build_completion(messages, fixtures):
+    # A continuation request asks for the rest of the response it was given so far
+    if len(messages) >= 3 and messages[-2]["role"] == "assistant":
+        full = build_completion(messages[:-2], fixtures)
+        return full[len(messages[-2]["content"]):]
+    system = messages[0]["content"] if messages else ""
+    user = messages[-1]["content"] if messages else ""
+    for fixture in fixtures:
+        if fixture["match"] in system or fixture["match"] in user:
+            return fixture["content"]
+    code_match = CODE_PATTERN.search(user)
+    language, code = (code_match.group(1).lower(), code_match.group(2).strip()) if code_match else ("", "")
+    change = f"{COMMENT_PREFIX.get(language, '//')} mock change for step {user.count('Step ')}"
+    explanation = "**Explanation**:\n" + "\n".join(f"- Line {n}: explanation of the change." for n in range(1, 8))
+    code_only = "Return only the code" in system
+    if "<<<<<<< SEARCH" in system:
+        body = f"<<<<<<< SEARCH\n=======\n{change}\n>>>>>>> REPLACE\n"
+        return body if code_only else body + explanation
+    if "**Updated Code**" in system:
+        return f"**Suggested Fix**: Mock fix for the reported error.\n**Updated Code**:\n```{language}\n{code}\n{change}\n```"
+    if "(relevant parts only)" in user:
+        # Return the first shown chunk with the change appended
+        markers = list(MARKER_LINE_PATTERN.finditer(code))
+        if markers:
+            end = markers[1].start() if len(markers) > 1 else len(code)
+            code = code[markers[0].start():end].rstrip()
+    body = f"```{language}\n{code}\n{change}\n```\n"
+    return body if code_only else body + explanation
+
+class MockGroqHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self.send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+        server = self.server
+        number = next(server.request_counter)
+        settings = server.settings
+        if settings.rate_limit_every and number % settings.rate_limit_every == 0:
+            server.count("rate_limited")
+            return self.send_json(
+                429, {"error": {"message": "Rate limit reached (mock)", "type": "tokens", "code": "rate_limit_exceeded"}},
+                {"retry-after": str(settings.retry_after)}
+            )
+        server.count("completions")
+        messages = request.get("messages", [])
+        content = build_completion(messages, settings.fixtures)
+        finish_reason = "stop"
+        max_tokens = request.get("max_tokens")
+        if max_tokens and estimate_tokens(content) > max_tokens:
+            content, finish_reason = content[:max_tokens * 4], "length"
+        usage = {
+            "prompt_tokens": sum(estimate_tokens(message.get("content", "")) for message in messages),
+            "completion_tokens": estimate_tokens(content),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        base = {"id": f"chatcmpl-mock-{number}", "created": int(time.time()), "model": request.get("model", "")}
+        time.sleep(settings.latency)
+        if request.get("stream"):
+            self.send_stream(base, content, finish_reason, usage, settings)
+        else:
+            time.sleep(settings.chunk_delay * (len(content) // max(1, settings.chunk_size)))
+            self.send_json(200, {
+                **base,
+                "object": "chat.completion",
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": finish_reason, "logprobs": None}],
+                "usage": usage,
+                "x_groq": {"id": f"req_mock_{number}"},
+            })
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_stream(self, base, content, finish_reason, usage, settings):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send_event(payload):
+            data = f"data: {payload}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        try:
+            for start in range(0, len(content), settings.chunk_size):
+                if start:
+                    time.sleep(settings.chunk_delay)
+                delta = {"content": content[start:start + settings.chunk_size]}
+                send_event(json.dumps({**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": delta, "finish_reason": None, "logprobs": None}]}))
+            send_event(json.dumps({
+                **base,
+                "object": "chat.completion.chunk",
+                "choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason, "logprobs": None}],
+                "x_groq": {"id": base["id"], "usage": usage},
+            }))
+            send_event("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client abandoned the stream (e.g. a cancelled hedged request)
+            self.close_connection = True
+
+# Threaded HTTP server running the mock API, with counters of the requests it answered
+class MockGroqServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, settings=None, host="127.0.0.1", port=0):
+        super().__init__((host, port), MockGroqHandler)
+        self.settings = settings or MockSettings()
+        self.request_counter = itertools.count(1)
+        self.counts = {"completions": 0, "rate_limited": 0}
+        self._counts_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, name):
+        with self._counts_lock:
+            self.counts[name] += 1
+
+    # Serve in a background thread (for use inside the benchmark process)
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the Groq chat completions API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds before the first token")
+    parser.add_argument("--chunk-delay", type=float, default=0.005, help="Seconds between streamed chunks")
+    parser.add_argument("--chunk-size", type=int, default=16, help="Characters per streamed chunk")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="Answer every Nth request with a 429 (0 for never)")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="retry-after header sent with a 429")
+    parser.add_argument("--fixtures", default=FIXTURES_PATH, help="JSONL file of canned completions")
+    args = parser.parse_args(argv)
+    settings = MockSettings(args.latency, args.chunk_delay, args.chunk_size, args.rate_limit_every, args.retry_after, args.fixtures)
+    server = MockGroqServer(settings, args.host, args.port)
+    print(f"Mock Groq API listening on {server.base_url} ({len(settings.fixtures)} canned completions)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from groq import Groq
+
+from benchmarks.corpus import CORPUS_SIZES, PROMPTS, build_corpus, generate_script
+from benchmarks.mock_server import MockGroqServer, MockSettings, build_completion
+from code_iterator import (
+    MODIFICATION_MAX_TOKENS, build_modification_request, compute_diff, parse_modification_response, parse_patch_response,
+    request_completion, select_code_view, validate_code
+)
+from metrics import MetricsRecorder, percentile
+from resources import LANGUAGES
+from scheduler import RequestScheduler
+from stream_parser import StreamingResponseParser
+
+# Offline benchmarks of the code iterator against the local mock Groq server (benchmarks/mock_server.py):
+#   throughput   - parse/validate/diff/chunk selection/patch application per language and corpus size
+#   step_latency - end-to-end latency of one generation step as the prompt history grows, in full and
+#                  incremental mode (request, streaming, parsing, validation and diff)
+#   concurrency  - many simulated sessions running steps at once, with 429s injected by the server
+# Results are saved as JSON (with the commit they were run on) and can be compared with an earlier run.
+#
+# Example:
+#   python -m benchmarks.run --quick
+#   python -m benchmarks.run --compare benchmarks/results/20250101-120000-abc1234.json
+
+RESULTS_DIR = os.path.join("benchmarks", "results")
+MODEL = "llama-3.3-70b-versatile"
+# Relative slowdown reported as a regression when comparing runs
+REGRESSION_THRESHOLD = 0.10
+
+# Function to measure the mean time of a call, repeating it for at least min_time seconds
+def time_call(func, min_time=0.2, max_iterations=10000):
+    iterations, started = 0, time.perf_counter()
+    while True:
+        func()
+        iterations += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time or iterations >= max_iterations:
+            return elapsed / iterations
+
+# Function to benchmark the local processing of responses for every script in the corpus
+def bench_throughput(languages, sizes, min_time):
+    rows = []
+    for (language, size), code in build_corpus(languages, sizes).items():
+        prompts = PROMPTS[:1]
+        _, messages = build_modification_request(code, prompts, "", MODEL, language)
+        output = build_completion(messages, [])
+        modified_code, _ = parse_modification_response(output, code, prompts, language)
+        _, patch_messages = build_modification_request(code, prompts, "", MODEL, language, patch_mode=True)
+        patch_output = build_completion(patch_messages, [])
+        timings = {
+            "parse": lambda: parse_modification_response(output, code, prompts, language, explain=False),
+            "parse_patch": lambda: parse_patch_response(patch_output, code, prompts, language, explain=False),
+            "validate": lambda: validate_code(modified_code, language),
+            "diff": lambda: compute_diff(code, modified_code),
+            "select_view": lambda: select_code_view(code, language, " ".join(PROMPTS[:4])),
+            "stream_parse": lambda: stream_parse(output, language),
+        }
+        for operation, func in timings.items():
+            seconds = time_call(func, min_time)
+            rows.append({
+                "language": language, "size": size, "lines": code.count("\n") + 1, "operation": operation,
+                "mean_ms": round(seconds * 1000, 4), "ops_per_s": round(1 / seconds, 1) if seconds else None,
+            })
+        print(f"  throughput {language:<20} {size:<7} {code.count(chr(10)) + 1:>5} lines", flush=True)
+    return rows
+
+# Function to feed a response to the streaming parser in 16-character chunks, as the app does while streaming
+def stream_parse(output, language):
+    parser = StreamingResponseParser(language, ["**Explanation**:"])
+    for start in range(0, len(output), 16):
+        parser.feed(output[start:start + 16])
+        parser.code
+    return parser
+
+# Function to run one generation step as the app does: request (streamed), parse, validate and diff
+def run_step(client, scheduler, recorder, original_code, code, prompts, language, step_offset=0):
+    started = time.perf_counter()
+    cache_key, messages = build_modification_request(code, prompts, "", MODEL, language, step_offset, code_only=True)
+    parser = StreamingResponseParser(language, ["**Explanation**:"])
+    output = request_completion(
+        client, None, cache_key, MODEL, messages, MODIFICATION_MAX_TOKENS, on_chunk=parser.feed, scheduler=scheduler, recorder=recorder, label="step"
+    )
+    modified_code, _ = parse_modification_response(output, code, prompts, language, explain=False)
+    is_valid, validation_error = validate_code(modified_code, language)
+    if not is_valid:
+        raise ValueError(validation_error)
+    compute_diff(original_code, modified_code)
+    return modified_code, time.perf_counter() - started
+
+# Function to benchmark the latency of adding step n to a prompt history of n - 1 steps
+# Full mode resends the whole history against the original code; incremental mode sends only the new
+# prompt against the code after the previous steps
+def bench_step_latency(client, scheduler, languages, size, history_lengths, repeats):
+    rows = []
+    for language in languages:
+        original_code = generate_script(language, CORPUS_SIZES[size])
+        for length in history_lengths:
+            prompts = [PROMPTS[i % len(PROMPTS)] for i in range(length)]
+            # Code after the previous steps (the starting point of an incremental step)
+            snapshot, warmup = original_code, MetricsRecorder(max_records=1)
+            for step in range(length - 1):
+                snapshot, _ = run_step(client, scheduler, warmup, original_code, snapshot, prompts[step:step + 1], language, step)
+            for mode in ("full", "incremental"):
+                recorder = MetricsRecorder()
+                latencies = []
+                for _ in range(repeats):
+                    if mode == "full":
+                        _, seconds = run_step(client, scheduler, recorder, original_code, original_code, prompts, language)
+                    else:
+                        _, seconds = run_step(client, scheduler, recorder, original_code, snapshot, prompts[-1:], language, length - 1)
+                    latencies.append(seconds)
+                calls = recorder.records("llm_call")
+                latencies.sort()
+                rows.append({
+                    "language": language, "size": size, "history": length, "mode": mode,
+                    "p50_s": round(percentile(latencies, 50), 4), "p95_s": round(percentile(latencies, 95), 4),
+                    "ttft_p50_s": percentile(sorted(call["ttft_s"] for call in calls if call["ttft_s"] is not None), 50),
+                    "prompt_tokens": round(sum(call["prompt_tokens"] for call in calls) / len(calls)),
+                })
+            print(f"  step latency {language:<20} history {length:>2}", flush=True)
+    return rows
+
+# Function to benchmark many sessions generating steps at the same time
+def bench_concurrency(client, scheduler, server, session_counts, steps, size):
+    rows = []
+    for sessions in session_counts:
+        recorder = MetricsRecorder()
+        rate_limited_before = server.counts["rate_limited"]
+
+        def run_session(index):
+            language = LANGUAGES[index % len(LANGUAGES)]
+            original_code = code = generate_script(language, CORPUS_SIZES[size])
+            latencies = []
+            for step in range(steps):
+                code, seconds = run_step(client, scheduler, recorder, original_code, code, [PROMPTS[(index + step) % len(PROMPTS)]], language, step)
+                latencies.append(seconds)
+            return latencies
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=sessions) as executor:
+            latencies = sorted(latency for session in executor.map(run_session, range(sessions)) for latency in session)
+        elapsed = time.perf_counter() - started
+        calls = recorder.records("llm_call")
+        rows.append({
+            "sessions": sessions, "steps_per_session": steps, "size": size,
+            "elapsed_s": round(elapsed, 3), "steps_per_s": round(len(latencies) / elapsed, 2),
+            "p50_s": round(percentile(latencies, 50), 4), "p95_s": round(percentile(latencies, 95), 4),
+            "queued_p95_s": percentile(sorted(call["queued_s"] for call in calls), 95),
+            "retries": sum(call["retries"] for call in calls),
+            "rate_limited": server.counts["rate_limited"] - rate_limited_before,
+        })
+        print(f"  concurrency {sessions:>3} sessions: {rows[-1]['steps_per_s']} steps/s", flush=True)
+    return rows
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# Function to compare two result files and print the changes of the latency and throughput metrics
+def compare_results(previous, current, threshold=REGRESSION_THRESHOLD):
+    regressions = 0
+    sections = {
+        "throughput": (("language", "size", "operation"), "mean_ms"),
+        "step_latency": (("language", "size", "history", "mode"), "p50_s"),
+        "concurrency": (("sessions", "steps_per_session", "size"), "p50_s"),
+    }
+    print(f"\nComparison with {previous['meta'].get('commit')} ({previous['meta'].get('timestamp')}):")
+    for section, (key_fields, metric) in sections.items():
+        before = {tuple(row[field] for field in key_fields): row[metric] for row in previous.get(section, [])}
+        for row in current.get(section, []):
+            key = tuple(row[field] for field in key_fields)
+            if before.get(key) in (None, 0) or row[metric] is None:
+                continue
+            change = (row[metric] - before[key]) / before[key]
+            flag = ""
+            if change > threshold:
+                flag = "  REGRESSION"
+                regressions += 1
+            if flag or abs(change) > threshold:
+                print(f"  {section:<13} {' / '.join(str(part) for part in key):<45} {metric} {before[key]} -> {row[metric]} ({change:+.0%}){flag}")
+    print(f"  {regressions} regression(s) above {threshold:.0%}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the offline benchmarks against a local mock Groq server.")
+    parser.add_argument("--quick", action="store_true", help="Fewer languages, sizes and repetitions (for a fast check)")
+    parser.add_argument("--only", choices=["throughput", "step_latency", "concurrency"], action="append", help="Run only these benchmarks (repeatable)")
+    parser.add_argument("--latency", type=float, default=0.2, help="Mock server seconds before the first token")
+    parser.add_argument("--chunk-delay", type=float, default=0.002, help="Mock server seconds between streamed chunks")
+    parser.add_argument("--chunk-size", type=int, default=32, help="Mock server characters per streamed chunk")
+    parser.add_argument("--rate-limit-every", type=int, default=15, help="Mock server answers every Nth request with a 429 (0 for never)")
+    parser.add_argument("--output", default=RESULTS_DIR, help="Directory for the results file")
+    parser.add_argument("--compare", help="Earlier results file to compare with")
+    args = parser.parse_args(argv)
+
+    quick = args.quick
+    languages = ["Python", "C++", "Lua"] if quick else LANGUAGES
+    sizes = {size: CORPUS_SIZES[size] for size in (("small", "large") if quick else CORPUS_SIZES)}
+    history_lengths = [1, 4, 8] if quick else [1, 2, 4, 8, 16]
+    session_counts = [1, 8] if quick else [1, 4, 16, 32]
+    benchmarks = args.only or ["throughput", "step_latency", "concurrency"]
+
+    settings = MockSettings(args.latency, args.chunk_delay, args.chunk_size, args.rate_limit_every, retry_after=0.2)
+    server = MockGroqServer(settings).start()
+    # The SDK's own retries are disabled so that 429s are handled (and measured) by the scheduler
+    client = Groq(
+        api_key="gsk_benchmark", base_url=server.base_url, max_retries=0,
+        http_client=httpx.Client(limits=httpx.Limits(max_connections=64, max_keepalive_connections=64))
+    )
+    # The mock server has no real rate limits, so the scheduler only reacts to the injected 429s
+    scheduler = RequestScheduler(rate_limits={}, default_limits=(10 ** 6, 10 ** 9))
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "quick": quick,
+            "mock": {"latency": args.latency, "chunk_delay": args.chunk_delay, "chunk_size": args.chunk_size, "rate_limit_every": args.rate_limit_every},
+        }
+    }
+    try:
+        if "throughput" in benchmarks:
+            print("Throughput (parse/validate/diff)", flush=True)
+            results["throughput"] = bench_throughput(languages, sizes, 0.05 if quick else 0.2)
+        if "step_latency" in benchmarks:
+            print("Step latency vs. prompt history length", flush=True)
+            results["step_latency"] = bench_step_latency(client, scheduler, languages[:2] if quick else languages, "medium", history_lengths, 2 if quick else 5)
+        if "concurrency" in benchmarks:
+            print("Concurrent sessions", flush=True)
+            results["concurrency"] = bench_concurrency(client, scheduler, server, session_counts, 3 if quick else 5, "medium")
+    finally:
+        client.close()
+        server.stop()
+
+    os.makedirs(args.output, exist_ok=True)
+    path = os.path.join(args.output, f"{time.strftime('%Y%m%d-%H%M%S')}-{results['meta']['commit'] or 'nocommit'}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults: {path}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            return 1 if compare_results(json.load(f), results) else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
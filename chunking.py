@@ -0,0 +1,369 @@
+import math
+import re
+from collections import Counter, namedtuple
+from itertools import takewhile
+
+# Symbol-level chunking for large source files.
+# Code is split into contiguous chunks (classes, functions and top-level blocks; large
+# classes/namespaces are split further into their members) that together cover every line.
+# A keyword/identifier index then picks the chunks relevant to a prompt or error message,
+# so only those are sent to the model together with a one-line-per-chunk outline of the rest.
+# The chunks the model returns are spliced back into place by their marker lines.
+
+# A chunk covers lines [start, end) of the file (0-based)
+Chunk = namedtuple("Chunk", "id kind name start end")
+
+BRACE_LANGUAGES = ("C++", "C# (Outside Unity)", "JavaScript", "Haxe", "Rust")
+INDENT_LANGUAGES = ("Python", "GDScript")
+
+COMMENT_PREFIX = {"Python": "#", "GDScript": "#", "Lua": "--"}
+
+# Container chunks (classes, namespaces, impl blocks...) longer than this are split into their members
+MAX_CHUNK_LINES = 60
+CONTAINER_KINDS = {"class", "struct", "interface", "impl", "trait", "namespace", "mod", "union"}
+
+MARKER_PATTERN = re.compile(r"^\s*(?:#|//|--)\s*@@chunk (\w+)@@.*$", re.MULTILINE)
+
+DECLARATION_PATTERN = re.compile(
+    r"^\s*(?:(?:public|private|protected|internal|static|export|default|async|abstract|sealed|partial|virtual|override|"
+    r"inline|extern|unsafe|final|pub(?:\([^)]*\))?)\s+)*"
+    r"(?:class|struct|interface|enum|impl|trait|fn|function|namespace|mod|typedef|template|macro|let|const|var|union)\b"
+)
+NAME_PATTERNS = [
+    re.compile(r"\b(class|struct|interface|enum|impl|trait|fn|function|func|def|namespace|mod|union|macro)\s+(?:<[^>]*>\s*)?([A-Za-z_][\w:.]*)"),
+    re.compile(r"^\s*(?:local\s+|let\s+|const\s+|var\s+|static\s+)*([A-Za-z_][\w.:]*)\s*=\s*(function)\b"),
+    re.compile(r"^\s*(?:local\s+|let\s+|const\s+|var\s+|export\s+)*([A-Za-z_][\w.:]*)\s*[:=]"),
+]
+C_FUNCTION_PATTERN = re.compile(r"([A-Za-z_~][\w:~]*)\s*\(")
+NOT_FUNCTION_NAMES = {"if", "for", "while", "switch", "return", "catch", "sizeof", "foreach", "using", "lock", "match"}
+
+PREFIX_LINE_PATTERN = re.compile(r"^\s*(?://|/\*|\*|#\[|\[|@|--|#(?!include|define|if|endif|else|pragma|import))")
+
+STRING_PATTERN = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|`(?:\\.|[^`\\])*`')
+LUA_OPENERS = re.compile(r"\b(function|if|do|repeat)\b")
+LUA_CLOSERS = re.compile(r"\b(end|until)\b")
+
+# Function to split code into chunks for the given language
+def split_into_chunks(code, language, max_chunk_lines=MAX_CHUNK_LINES):
+    lines = code.split("\n")
+    if language in INDENT_LANGUAGES:
+        depths = _indent_depths(lines)
+    elif language == "Lua":
+        depths = _lua_depths(lines)
+    else:
+        depths = _brace_depths(lines)
+    ranges = _split_region(lines, depths, 0, len(lines), depths[0][0] if lines else 0, language, max_chunk_lines)
+    chunks = []
+    for start, end, opened in ranges:
+        kind, name = _describe(lines[start:end], opened)
+        chunks.append(Chunk(len(chunks), kind, name, start, end))
+    return chunks
+
+# Per-line (depth before, depth after) for brace languages, ignoring strings and comments
+def _brace_depths(lines):
+    depths, depth, in_block_comment = [], 0, False
+    for line in lines:
+        text, in_block_comment = _strip_c_comments(STRING_PATTERN.sub('""', line), in_block_comment)
+        before = depth
+        depth = max(0, depth + text.count("{") - text.count("}"))
+        depths.append((before, depth, "{" in text))
+    return depths
+
+def _strip_c_comments(text, in_block_comment):
+    result = ""
+    while text:
+        if in_block_comment:
+            end = text.find("*/")
+            if end == -1:
+                return result, True
+            text, in_block_comment = text[end + 2:], False
+            continue
+        line_comment, block_comment = text.find("//"), text.find("/*")
+        if line_comment != -1 and (block_comment == -1 or line_comment < block_comment):
+            return result + text[:line_comment], False
+        if block_comment == -1:
+            return result + text, False
+        result += text[:block_comment]
+        text, in_block_comment = text[block_comment + 2:], True
+    return result, in_block_comment
+
+# Per-line depths for Lua, counting block keywords and table braces
+def _lua_depths(lines):
+    depths, depth, in_block_comment = [], 0, False
+    for line in lines:
+        text = STRING_PATTERN.sub('""', line)
+        if in_block_comment:
+            end = text.find("]]")
+            text, in_block_comment = ("", True) if end == -1 else (text[end + 2:], False)
+        start = text.find("--[[")
+        if start != -1:
+            in_block_comment = text.find("]]", start) == -1
+            text = text[:start]
+        comment = text.find("--")
+        if comment != -1:
+            text = text[:comment]
+        before = depth
+        opened = len(LUA_OPENERS.findall(text)) + text.count("{")
+        depth = max(0, depth + opened - len(LUA_CLOSERS.findall(text)) - text.count("}"))
+        depths.append((before, depth, depth > before))
+    return depths
+
+# Per-line depths for indentation-based languages (blank lines take the depth of the next line)
+def _indent_depths(lines):
+    indents = [len(line) - len(line.lstrip()) if line.strip() else None for line in lines]
+    following = 0
+    for i in range(len(indents) - 1, -1, -1):
+        if indents[i] is None:
+            indents[i] = following
+        else:
+            following = indents[i]
+    depths = []
+    for i, indent in enumerate(indents):
+        after = indents[i + 1] if i + 1 < len(indents) else 0
+        depths.append((indent, after, after > indent))
+    return depths
+
+# Function to split lines [start, end) at depth base into (start, end, opened) ranges covering the region
+def _split_region(lines, depths, start, end, base, language, max_chunk_lines):
+    units = []
+    i = start
+    while i < end:
+        j, opened = i, False
+        while j < end:
+            before, after, has_open = depths[j]
+            opened = opened or has_open or after > base
+            if after <= base and (opened or _ends_statement(lines[j], language)):
+                break
+            if j + 1 < end and not opened and depths[j + 1][0] <= base and DECLARATION_PATTERN.match(lines[j + 1]) \
+                    and language in BRACE_LANGUAGES:
+                break
+            j += 1
+        if language in INDENT_LANGUAGES and opened:
+            # Keep trailing blank lines out of an indented block
+            while j > i and not lines[j].strip():
+                j -= 1
+        units.append((i, min(j, end - 1) + 1, opened))
+        i = min(j, end - 1) + 1
+
+    # Attach comments/attributes directly above a block to it, and merge runs of loose lines
+    ranges = []
+    for unit_start, unit_end, opened in units:
+        if opened and ranges and not ranges[-1][2]:
+            prefix_start = unit_start
+            while prefix_start > ranges[-1][0] and lines[prefix_start - 1].strip() and PREFIX_LINE_PATTERN.match(lines[prefix_start - 1]):
+                prefix_start -= 1
+            if prefix_start < unit_start:
+                if prefix_start == ranges[-1][0]:
+                    ranges.pop()
+                else:
+                    ranges[-1] = (ranges[-1][0], prefix_start, False)
+                unit_start = prefix_start
+        if ranges and not opened and (not ranges[-1][2] or not any(line.strip() for line in lines[unit_start:unit_end])):
+            # Loose lines merge into the previous block; blank lines also trail the previous definition
+            ranges[-1] = (ranges[-1][0], unit_end, ranges[-1][2])
+        else:
+            ranges.append((unit_start, unit_end, opened))
+
+    # Split large containers into a header, their members and a footer
+    result = []
+    for range_start, range_end, opened in ranges:
+        if not opened or range_end - range_start <= max_chunk_lines:
+            result.append((range_start, range_end, opened))
+            continue
+        inner = _inner_region(lines, depths, range_start, range_end, base, language)
+        if inner is None or _describe(lines[range_start:inner[0]], True)[0] not in CONTAINER_KINDS:
+            result.append((range_start, range_end, opened))
+            continue
+        inner_start, inner_end, inner_base = inner
+        result.append((range_start, inner_start, True))
+        result.extend(_split_region(lines, depths, inner_start, inner_end, inner_base, language, max_chunk_lines))
+        if inner_end < range_end:
+            result.append((inner_end, range_end, False))
+    return result
+
+# Function to find the body of a block: the lines between its opening line and its closing line
+def _inner_region(lines, depths, start, end, base, language):
+    open_line = next((k for k in range(start, end) if depths[k][1] > base), None)
+    if open_line is None or open_line + 1 >= end:
+        return None
+    inner_base = depths[open_line][1]
+    inner_end = end
+    if language not in INDENT_LANGUAGES:
+        # The body ends at the line that closes the block (trailing blank lines stay in the footer)
+        inner_end = next((k for k in range(end - 1, open_line, -1) if depths[k][0] > base >= depths[k][1]), end - 1)
+    if inner_end <= open_line + 1:
+        return None
+    return open_line + 1, inner_end, inner_base
+
+def _ends_statement(line, language):
+    stripped = line.strip()
+    if not stripped:
+        return True
+    if language in INDENT_LANGUAGES:
+        return not stripped.startswith("@") and not stripped.endswith(("\\", ",", "(", "[", "{"))
+    if language == "Lua":
+        return not stripped.endswith((",", "(", "=", "..", "{"))
+    if stripped.startswith(("//", "/*", "*")) or (stripped.startswith("#") and not stripped.startswith("#[")):
+        return True
+    return stripped.endswith((";", "}"))
+
+# Function to get a kind and a name for a chunk from its first meaningful line
+def _describe(chunk_lines, opened):
+    for line in chunk_lines:
+        stripped = line.strip()
+        if not stripped or PREFIX_LINE_PATTERN.match(line):
+            continue
+        if not opened:
+            return "block", stripped[:60]
+        match = NAME_PATTERNS[0].search(stripped)
+        if match:
+            # Names may contain :: and . (C++, Haxe), but not the colon ending a Python/GDScript header
+            return match.group(1), match.group(2).rstrip(":.")
+        match = NAME_PATTERNS[1].search(stripped)
+        if match:
+            return "function", match.group(1)
+        for match in C_FUNCTION_PATTERN.finditer(stripped):
+            if match.group(1) not in NOT_FUNCTION_NAMES:
+                return "function", match.group(1)
+        match = NAME_PATTERNS[2].search(stripped)
+        if match:
+            return "block", match.group(1)
+        return "block", stripped[:60]
+    return "block", ""
+
+
+STOPWORDS = {
+    "the", "and", "for", "with", "this", "that", "add", "code", "make", "use", "using", "into", "from", "when",
+    "should", "modify", "change", "function", "class", "return", "local", "var", "let", "const", "def", "func",
+    "self", "void", "int", "float", "bool", "string", "public", "private", "static", "new", "end", "then", "true",
+    "false", "null", "nil", "none", "not", "else", "elif", "while", "struct", "impl", "pub", "mut", "extends",
+}
+
+# Function to turn text into lowercase index terms, splitting identifiers on case and underscores
+def tokenize(text):
+    terms = []
+    for identifier in re.findall(r"[A-Za-z_][A-Za-z0-9_]*", text):
+        parts = re.findall(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+", identifier)
+        for term in {identifier.lower(), *(part.lower() for part in parts)}:
+            if len(term) >= 3 and term not in STOPWORDS:
+                terms.append(term[:-1] if len(term) > 4 and term.endswith("s") else term)
+    return terms
+
+
+# Keyword/identifier index over the chunks of one file, ranked with BM25
+class ChunkIndex:
+    def __init__(self, code, chunks):
+        lines = code.split("\n")
+        self.chunks = chunks
+        self.term_counts = [Counter(tokenize("\n".join(lines[c.start:c.end]))) for c in chunks]
+        self.name_terms = [set(tokenize(c.name)) if c.kind != "block" else set() for c in chunks]
+        self.lengths = [sum(counts.values()) or 1 for counts in self.term_counts]
+        self.average_length = sum(self.lengths) / len(self.lengths) if self.lengths else 1
+        self.document_frequency = Counter(term for counts in self.term_counts for term in counts)
+
+    def score(self, query, k1=1.2, b=0.75):
+        query_terms = set(tokenize(query))
+        total = len(self.chunks)
+        scores = []
+        for idx, counts in enumerate(self.term_counts):
+            score = 0.0
+            for term in query_terms:
+                frequency = counts.get(term)
+                if not frequency:
+                    continue
+                idf = math.log(1 + (total - self.document_frequency[term] + 0.5) / (self.document_frequency[term] + 0.5))
+                score += idf * frequency * (k1 + 1) / (frequency + k1 * (1 - b + b * self.lengths[idx] / self.average_length))
+            # Chunks whose own name is mentioned are the most likely targets
+            score += 2.0 * len(query_terms & self.name_terms[idx])
+            scores.append(score)
+        return scores
+
+    # Function to pick the highest-scoring chunks that fit in max_lines (always at least one if any match)
+    def select(self, query, max_lines):
+        scores = self.score(query)
+        ranked = sorted((i for i, score in enumerate(scores) if score > 0), key=lambda i: -scores[i])
+        selected, used = [], 0
+        for idx in ranked:
+            size = self.chunks[idx].end - self.chunks[idx].start
+            if selected and used + size > max_lines:
+                continue
+            selected.append(idx)
+            used += size
+        return sorted(selected)
+
+
+# A reduced view of a large file: the relevant chunks in full, marked with their ids, plus an outline of the rest
+class CodeView:
+    def __init__(self, code, language, chunks, selected):
+        self.code = code
+        self.language = language
+        self.chunks = chunks
+        self.selected = selected
+        self.comment = COMMENT_PREFIX.get(language, "//")
+        self.lines = code.split("\n")
+
+    def marker(self, chunk_id):
+        return f"{self.comment} @@chunk {chunk_id}@@"
+
+    @property
+    def text(self):
+        parts = []
+        for idx in self.selected:
+            chunk = self.chunks[idx]
+            parts.append(f"{self.marker(chunk.id)} (lines {chunk.start + 1}-{chunk.end})")
+            parts.append("\n".join(self.lines[chunk.start:chunk.end]))
+        return "\n".join(parts)
+
+    @property
+    def outline(self):
+        shown = set(self.selected)
+        return "\n".join(
+            f"- lines {chunk.start + 1}-{chunk.end}: {chunk.kind} {chunk.name}".rstrip()
+            for chunk in self.chunks if chunk.id not in shown
+        )
+
+    @property
+    def line_count(self):
+        return sum(self.chunks[idx].end - self.chunks[idx].start for idx in self.selected)
+
+    # Function to splice returned chunks back into the full code
+    # Returns None (so the caller can request the whole file instead) if no markers were found, if there is
+    # code before the first marker, or if a marker names a chunk that was not shown to the model
+    def splice(self, returned_code):
+        markers = list(MARKER_PATTERN.finditer(returned_code))
+        if not markers or returned_code[:markers[0].start()].strip():
+            return None
+        shown = {str(idx) for idx in self.selected} | {"new"}
+        replacements = {}
+        for number, match in enumerate(markers):
+            if match.group(1) not in shown:
+                return None
+            body_end = markers[number + 1].start() if number + 1 < len(markers) else len(returned_code)
+            replacements[match.group(1)] = returned_code[match.end():body_end].strip("\n")
+        lines = []
+        for chunk in self.chunks:
+            if str(chunk.id) in replacements:
+                replacement = replacements[str(chunk.id)].rstrip()
+                lines.extend(replacement.split("\n") if replacement else [])
+                # Keep the blank lines that separated the chunk from the next one
+                original = self.lines[chunk.start:chunk.end]
+                lines.extend("" for _ in takewhile(lambda line: not line.strip(), reversed(original)))
+            else:
+                lines.extend(self.lines[chunk.start:chunk.end])
+        if replacements.get("new"):
+            lines.extend(["", *replacements["new"].split("\n")])
+        return "\n".join(lines)
+
+# Function to build a reduced view of code for a query; returns None if the whole file should be sent
+# (the file is short, or nothing in it matches the query)
+def build_code_view(code, language, query, min_lines=300, max_lines=250):
+    if code.count("\n") + 1 < min_lines:
+        return None
+    chunks = split_into_chunks(code, language)
+    selected = ChunkIndex(code, chunks).select(query, max_lines)
+    if not selected:
+        return None
+    # The first chunk usually holds imports and declarations, which help the model write valid code
+    if 0 not in selected and chunks[0].end - chunks[0].start <= 40:
+        selected = [0] + selected
+    return CodeView(code, language, chunks, selected)
@@ -0,0 +1,590 @@
+import difflib
+import hashlib
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from groq import RateLimitError
+
+from chunking import build_code_view
+from error_context import build_error_view
+from metrics import metrics
+from patching import PatchError, apply_hunks, parse_hunks
+from resources import EXPLANATION_PATTERN, SUGGESTED_FIX_PATTERN, fence_pattern
+from response_cache import make_cache_key
+from scheduler import account_id, completion_budget, estimate_tokens, request_scheduler
+
+# UI-independent core of the code iterator: prompt building, LLM calls, response parsing,
+# validation and diffing. Used by the Streamlit app (app.py) and the headless batch mode (batch.py).
+
+# Minimum token budgets for each kind of request (raised for large inputs, see scheduler.completion_budget)
+MODIFICATION_MAX_TOKENS = 1500
+ERROR_FIX_MAX_TOKENS = 1000
+EXPLANATION_MAX_TOKENS = 1500
+TEMPERATURE = 0.7
+
+# Responses cut off by the token limit inside a code block or hunk are continued with further calls
+MAX_CONTINUATIONS = 3
+CONTINUATION_PROMPT = "Your previous response was cut off. Continue it exactly where it stopped, without repeating anything or adding an introduction."
+HUNK_START_PATTERN = re.compile(r"^<{5,9} ?SEARCH", re.MULTILINE)
+HUNK_END_PATTERN = re.compile(r"^>{5,9} ?REPLACE", re.MULTILINE)
+REOPENED_FENCE_PATTERN = re.compile(r"\A\s*```[\w#+-]*[ \t]*\n")
+
+# Replaces the explanation instructions when only the code is requested
+CODE_ONLY_INSTRUCTION = "Return only the code, with no explanation before or after it.\n    "
+
+# Files with at least CHUNKING_THRESHOLD_LINES lines are sent as relevant chunks plus an outline (see chunking.py),
+# with about CHUNK_BUDGET_LINES lines of the relevant chunks shown in full
+CHUNKING_THRESHOLD_LINES = 300
+CHUNK_BUDGET_LINES = 250
+
+# Function to validate code based on selected language
+def validate_code(code, language):
+    if not code.strip():
+        return False, "Error: Code input is empty."
+    if language == "C++":
+        if "std::" not in code and "using namespace std;" not in code and "cout" not in code:
+            return False, "Error: Code does not appear to be valid C++. Include standard library usage (e.g., 'using namespace std;' or 'std::cout')."
+    elif language == "C# (Outside Unity)":
+        if "class" not in code or "{" not in code:
+            return False, "Error: Code does not appear to be valid C#. Include a class definition with curly braces."
+    elif language == "GDScript":
+        if "extends" not in code and "func" not in code:
+            return False, "Error: Code does not appear to be valid GDScript. Include 'extends' and 'func' keywords."
+    elif language == "JavaScript":
+        if "function" not in code and "let" not in code and "const" not in code:
+            return False, "Error: Code does not appear to be valid JavaScript. Include function declarations or variable definitions."
+    elif language == "Python":
+        if "def" not in code and "import" not in code:
+            return False, "Error: Code does not appear to be valid Python. Include 'def' for functions or 'import' statements."
+    elif language == "Lua":
+        if "function" not in code and "local" not in code:
+            return False, "Error: Code does not appear to be valid Lua. Include 'function' or 'local' keywords."
+    elif language == "Haxe":
+        if "class" not in code and "function" not in code:
+            return False, "Error: Code does not appear to be valid Haxe. Include 'class' and 'function' keywords."
+    elif language == "Rust":
+        if "fn" not in code and "struct" not in code:
+            return False, "Error: Code does not appear to be valid Rust. Include 'fn' for functions or 'struct' definitions."
+    return True, ""
+
+# Function to generate a detailed fallback explanation if the API fails to provide one
+def generate_fallback_explanation(original_code, modified_code, prompt_history, language):
+    explanation = "### Key Changes Made:\n"
+    if "jump" in prompt_history[-1].lower() or "jumpForce" in modified_code.lower():
+        explanation += f"- Added a jump mechanic to the {language} code. This allows the player to jump when a specific key (like the spacebar) is pressed. The mechanic uses variables to track the player's vertical position, applies an initial upward velocity, and simulates gravity to bring the player back down.\n"
+    if "health" in prompt_history[-1].lower() or "maxHealth" in modified_code.lower():
+        explanation += f"- Added a health system to the {language} code. This tracks the player's health, starting at a maximum value (e.g., 100), and includes a function to reduce health when the player takes damage.\n"
+    if "optimize" in prompt_history[-1].lower() or "performance" in modified_code.lower():
+        explanation += f"- Optimized performance in the {language} code. This might involve reducing unnecessary calculations, improving loop efficiency, or using better data structures to make the game run smoother.\n"
+    
+    explanation += f"\n### Detailed Step-by-Step Breakdown of the {language} Code:\n"
+    # Split the modified code into lines for detailed analysis
+    lines = modified_code.split("\n")
+    for idx, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        if "jump" in prompt_history[-1].lower() and "jump" in line.lower():
+            explanation += f"- **Line {idx}: `{line}`** - This line is part of the jump mechanic. It likely checks for a key press (e.g., spacebar) to start the jump or updates the player's vertical position. The reasoning behind this is to allow the player to interact with the game world by jumping over obstacles or reaching higher platforms, which is a core feature in many 2D games.\n"
+        elif "health" in prompt_history[-1].lower() and "health" in line.lower():
+            explanation += f"- **Line {idx}: `{line}`** - This line relates to the health system. It might define the player's health or reduce it when damage is taken. The purpose is to track the player's survival status, adding challenge and strategy to the game by requiring the player to avoid damage.\n"
+        elif line.startswith(("def ", "function ", "void ", "fn ", "class ", "struct ")):
+            explanation += f"- **Line {idx}: `{line}`** - This line defines a function or method in {language}. Functions are used to organize code into reusable blocks, making it easier to manage game logic like updating the player's position or handling input.\n"
+        elif "=" in line and "if" not in line:
+            explanation += f"- **Line {idx}: `{line}`** - This line initializes a variable. Variables store important game data, such as the player's position or speed, which are used to control how the game behaves.\n"
+        elif "if " in line:
+            explanation += f"- **Line {idx}: `{line}`** - This line contains a conditional statement. It checks for a condition (e.g., a key press) and executes code if the condition is true, which is essential for handling player input and game events.\n"
+    
+    explanation += f"\n### Reasoning Behind the Changes:\n"
+    if "jump" in prompt_history[-1].lower():
+        explanation += f"- **Jump Mechanic**: The jump mechanic was added to enhance gameplay by allowing vertical movement. In {language}, this typically involves checking for a key press (e.g., spacebar) to start the jump, applying an upward velocity to the player's position, and using gravity to bring the player back down. This creates a smooth jumping effect, making the game more interactive and fun. The variables like `jump_velocity` and `gravity` are carefully chosen to balance the jump height and fall speed, ensuring the player can jump over obstacles without the jump feeling too floaty or too abrupt.\n"
+    elif "health" in prompt_history[-1].lower():
+        explanation += f"- **Health System**: The health system was added to introduce a survival element to the game. By tracking the player's health, the game can simulate damage from enemies or obstacles, making the player more cautious. The `max_health` variable sets the starting health, and a damage function allows the health to decrease, adding challenge and stakes to the gameplay.\n"
+    elif "optimize" in prompt_history[-1].lower():
+        explanation += f"- **Performance Optimization**: The optimization changes were made to improve the game's frame rate, ensuring it runs smoothly even on lower-end devices. In {language}, this might involve reducing the number of calculations in the game loop or using more efficient data structures, which helps maintain a consistent gaming experience.\n"
+    
+    explanation += f"\n### How the {language} Code Fits into Game Development:\n"
+    explanation += f"- The modified code follows {language} best practices, making it suitable for game development in its respective environment (e.g., using Pygame for Python). The changes enhance the player's experience by adding interactive features like jumping, while maintaining the core game loop that updates the game state each frame.\n"
+    return explanation
+
+# Function to build the system prompt asking for the full modified file
+# With explain=False only the code is requested (the explanation is requested separately, see build_explanation_request)
+def build_full_file_system_prompt(language, explain=True):
+    prompt = f"""
+    You are an expert game developer proficient in {language}. Modify the provided code based on the sequence of user prompts, ensuring best practices for {language} in game development (e.g., memory management for C++, dynamic typing for Python, Rigidbody for C#). Apply each prompt in order, building on the previous modifications. Return the response in markdown format:
+    ```{language.lower()}
+    [modified code]
+    ```
+    """
+    if not explain:
+        return prompt + CODE_ONLY_INSTRUCTION
+    return prompt + f"""**Explanation**: Provide a highly detailed, elaborative, and beginner-friendly explanation of the modified code. Ensure the explanation is easy to understand for someone new to {language} and game development. Avoid generic responses and focus on specifics of the code. Include the following sections:
+    - **Summary of Changes**: Summarize all changes made to the original code across all prompts in a clear list, explaining what was added or modified.
+    - **How the New Features Work**: Explain each new or modified feature in detail, specific to {language} and its game development context (e.g., how a jump mechanic works with physics or input handling in {language}).
+    - **Step-by-Step Code Breakdown**: Break down the entire modified code line by line, explaining the purpose of each variable, function, and language-specific feature (e.g., what a loop does, why a variable is initialized, how the game loop interacts with the feature). Include reasoning for why each line is necessary for the game.
+    - **Game Logic Explained**: Describe how the changes fit into the broader game logic, such as how the feature affects gameplay (e.g., how a health system impacts player survival).
+    - **If a Prompt is a Duplicate**: Note that no additional changes were made for that step.
+    """
+
+# Function to build the system prompt asking for search/replace hunks (patch mode)
+def build_patch_system_prompt(language, explain=True):
+    prompt = f"""
+    You are an expert game developer proficient in {language}. Modify the provided code based on the sequence of user prompts, ensuring best practices for {language} in game development (e.g., memory management for C++, dynamic typing for Python, Rigidbody for C#). Apply each prompt in order, building on the previous modifications. Do not return the full file. Return only the changes, as one or more search/replace blocks in exactly this format:
+    <<<<<<< SEARCH
+    [exact lines copied from the current code, including indentation, with enough surrounding lines to be unique]
+    =======
+    [the lines that replace them]
+    >>>>>>> REPLACE
+    Keep each block as small as possible. Use an empty SEARCH section to append new code to the end of the file.
+    """
+    if not explain:
+        return prompt + CODE_ONLY_INSTRUCTION
+    return prompt + f"""After the blocks, add:
+    **Explanation**: Provide a detailed, beginner-friendly explanation of the changes. Avoid generic responses and focus on specifics of the code. Include the following sections:
+    - **Summary of Changes**: Summarize all changes made to the original code across all prompts in a clear list, explaining what was added or modified.
+    - **How the New Features Work**: Explain each new or modified feature in detail, specific to {language} and its game development context.
+    - **Code Breakdown**: Explain each added or changed line, including why it is necessary for the game.
+    - **Game Logic Explained**: Describe how the changes fit into the broader game logic.
+    - **If a Prompt is a Duplicate**: Note that no additional changes were made for that step.
+    """
+
+# Function to build the extra instructions used when only the relevant chunks of the code are sent
+def build_chunked_instructions(view, patch_mode=False):
+    if patch_mode:
+        return f"""
+    Only the parts of the code relevant to the request are shown, each starting with a marker line such as `{view.marker(view.selected[0])}`; the other parts are listed in an outline and must stay unchanged. Copy SEARCH lines only from the shown code and never include the marker lines.
+    """
+    return f"""
+    Only the parts of the code relevant to the request are shown, each starting with a marker line such as `{view.marker(view.selected[0])}`; the other parts are listed in an outline and must stay unchanged. Inside the code block, return only the parts you changed, each starting with its original marker line followed by its complete updated code. Put new code that belongs after the existing code under the marker line `{view.marker("new")}`. Do not return unchanged parts.
+    """
+
+# Function to pick the relevant chunks of a large file for a request (None means send the whole file)
+def select_code_view(code, language, query):
+    return build_code_view(code, language, query, min_lines=CHUNKING_THRESHOLD_LINES, max_lines=CHUNK_BUDGET_LINES)
+
+# Function to pick the code to send with an error: a window around the lines the error points at,
+# or else the chunks that match the error text (None means send the whole file)
+def select_error_view(code, language, error_message):
+    if code.count("\n") + 1 < CHUNKING_THRESHOLD_LINES:
+        return None
+    return build_error_view(code, language, error_message, max_lines=CHUNK_BUDGET_LINES) or select_code_view(code, language, error_message)
+
+# Function to build the chat messages and cache key for a code modification request
+# step_offset is the number of steps already applied to the code (used for incremental mode)
+# patch_mode asks for search/replace hunks instead of the full modified file
+# view, if given, is a chunking.CodeView: only its relevant chunks are sent, plus an outline of the rest
+# code_only leaves the explanation out of the response (see build_explanation_request)
+def build_modification_request(code, prompt_history, context, model, language, step_offset=0, patch_mode=False, view=None, code_only=False):
+    if patch_mode:
+        system_prompt = build_patch_system_prompt(language, explain=not code_only)
+    else:
+        system_prompt = build_full_file_system_prompt(language, explain=not code_only)
+    code_label = "Original code" if step_offset == 0 else f"Code after step {step_offset}"
+    code_text, outline = code, ""
+    if view is not None:
+        system_prompt += build_chunked_instructions(view, patch_mode)
+        code_label += " (relevant parts only)"
+        code_text = view.text
+        outline = f"Outline of the parts not shown (keep them unchanged):\n{view.outline}\n    "
+    # Combine all prompts into a single user prompt, showing the history
+    user_prompt = f"""
+    Context: {context or f'No additional context provided for {language}.'}
+    {code_label}:
+    ```{language.lower()}
+    {code_text}
+    ```
+    {outline}Apply the following changes in sequence:
+    """
+    for idx, prompt in enumerate(prompt_history, step_offset + 1):
+        user_prompt += f"\nStep {idx}: {prompt}"
+
+    cache_key = make_cache_key(
+        "code_patch" if patch_mode else "code_modification", model, language, system_prompt, code, context, prompt_history,
+        step_offset=step_offset, temperature=TEMPERATURE, max_tokens=MODIFICATION_MAX_TOKENS,
+        **({"chunks": view.selected} if view is not None else {}),
+        **({"code_only": True} if code_only else {})
+    )
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+    return cache_key, messages
+
+# Function to parse the modified code and explanation out of a code modification response
+# With a view, the returned chunks are spliced into the code; modified_code is None if that isn't possible
+# explain=False is used for code-only responses, which have no explanation to fall back from
+def parse_modification_response(output, code, prompt_history, language, view=None, explain=True):
+    code_match = fence_pattern(language).search(output)
+    explanation_match = EXPLANATION_PATTERN.search(output)
+    modified_code = code_match.group(1).strip() if code_match else ""
+    explanation = explanation_match.group(1).strip() if explanation_match else ""
+    if view is not None:
+        modified_code = view.splice(modified_code) if modified_code else None
+        if modified_code is None:
+            return None, explanation
+        modified_code = modified_code.strip()
+
+    # Fallback if explanation is empty or insufficient
+    if explain and (not explanation or explanation == "No explanation provided." or len(explanation.split("\n")) < 5):  # If explanation is too short
+        explanation = generate_fallback_explanation(code, modified_code, prompt_history, language)
+
+    return modified_code, explanation
+
+# Function to apply the hunks in a patch mode response to the code
+# Returns (None, explanation) if the response has no hunks or they don't apply, so the caller can fall back to full-file generation
+def parse_patch_response(output, code, prompt_history, language, explain=True):
+    hunks = parse_hunks(output)
+    try:
+        modified_code = apply_hunks(code, hunks).strip() if hunks else None
+    except PatchError:
+        modified_code = None
+    explanation_match = EXPLANATION_PATTERN.search(output)
+    explanation = explanation_match.group(1).strip() if explanation_match else ""
+    if explain and modified_code is not None and (not explanation or len(explanation.split("\n")) < 5):
+        explanation = generate_fallback_explanation(code, modified_code, prompt_history, language)
+    return modified_code, explanation
+
+# Function to build the chat messages and cache key for explaining the changes from original_code to modified_code
+# The request is keyed on the modified code and a hash of the original, so each version is explained once
+def build_explanation_request(original_code, modified_code, prompt_history, model, language):
+    system_prompt = f"""
+    You are an expert game developer proficient in {language}. The user's code was modified by applying a sequence of prompts. Provide a highly detailed, elaborative, and beginner-friendly explanation of the modified code in markdown. Ensure the explanation is easy to understand for someone new to {language} and game development. Avoid generic responses and focus on specifics of the code. Include the following sections:
+    - **Summary of Changes**: Summarize all changes made to the original code across all prompts in a clear list, explaining what was added or modified.
+    - **How the New Features Work**: Explain each new or modified feature in detail, specific to {language} and its game development context (e.g., how a jump mechanic works with physics or input handling in {language}).
+    - **Step-by-Step Code Breakdown**: Break down the added and changed code line by line, explaining the purpose of each variable, function, and language-specific feature. Include reasoning for why each line is necessary for the game.
+    - **Game Logic Explained**: Describe how the changes fit into the broader game logic, such as how the feature affects gameplay (e.g., how a health system impacts player survival).
+    - **If a Prompt is a Duplicate**: Note that no additional changes were made for that step.
+    Return only the explanation.
+    """
+    diff = compute_diff(original_code, modified_code)
+    # Large files are explained from the diff alone
+    code_text = ""
+    if modified_code.count("\n") + 1 < CHUNKING_THRESHOLD_LINES:
+        code_text = f"""Modified code:
+    ```{language.lower()}
+    {modified_code}
+    ```
+    """
+    steps = "\n".join(f"Step {idx}: {prompt}" for idx, prompt in enumerate(prompt_history, 1))
+    user_prompt = f"""
+    Requested changes:
+    {steps}
+    {code_text}Diff against the original code:
+    ```diff
+    {diff or "(no changes)"}
+    ```
+    """
+    cache_key = make_cache_key(
+        "explanation", model, language, system_prompt, modified_code, "", prompt_history,
+        original_sha256=hashlib.sha256(original_code.encode("utf-8")).hexdigest(), temperature=TEMPERATURE, max_tokens=EXPLANATION_MAX_TOKENS
+    )
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+    return cache_key, messages
+
+# Function to parse an explanation response, falling back to a generated explanation if it is too short
+def parse_explanation_response(output, original_code, modified_code, prompt_history, language):
+    explanation = output.strip()
+    if explanation.startswith("**Explanation**:"):
+        explanation = explanation[len("**Explanation**:"):].strip()
+    if len(explanation.split("\n")) < 5:
+        explanation = generate_fallback_explanation(original_code, modified_code, prompt_history, language)
+    return explanation
+
+# Function to build the chat messages and cache key for an error fix request
+# view, if given, is a chunking.CodeView: only its relevant chunks are sent, plus an outline of the rest
+# candidate numbers parallel requests for the same fix, so each gets its own cache entry
+def build_error_fix_request(error_message, code, model, language, view=None, candidate=0):
+    system_prompt = f"""
+    You are an expert game developer proficient in {language}. The user has encountered an error while testing their {language} game code. Analyze the error message and the code, then provide:
+    1. A clear, beginner-friendly suggestion to fix the error, specific to {language} game development.
+    2. The fully updated code with the fix applied.
+    Return the response in markdown format:
+    **Suggested Fix**: [Detailed explanation of the fix, including why the error occurred, how the fix resolves it, and any code changes made.]
+    **Updated Code**:
+    ```{language.lower()}
+    [fully updated code with the fix applied]
+    ```
+    """
+    code_label, code_text, outline = "Code being tested", code, ""
+    if view is not None:
+        system_prompt += build_chunked_instructions(view)
+        code_label += " (relevant parts only)"
+        code_text = view.text
+        outline = f"Outline of the parts not shown (keep them unchanged):\n{view.outline}\n    "
+    user_prompt = f"""
+    Error message from the game environment:
+    {error_message}
+
+    {code_label}:
+    ```{language.lower()}
+    {code_text}
+    ```
+    {outline}Suggest a fix for this error and provide the fully updated code.
+    """
+
+    cache_key = make_cache_key(
+        "error_fix", model, language, system_prompt, code, error_message, [],
+        temperature=TEMPERATURE, max_tokens=ERROR_FIX_MAX_TOKENS,
+        **({"chunks": view.selected} if view is not None else {}),
+        **({"candidate": candidate} if candidate else {})
+    )
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+    return cache_key, messages
+
+# Function to parse the fix suggestion and updated code out of an error fix response
+# With a view, the returned chunks are spliced into the code; updated_code is None if that isn't possible
+def parse_error_fix_response(output, code, language, view=None):
+    fix_suggestion_match = SUGGESTED_FIX_PATTERN.search(output)
+    updated_code_match = fence_pattern(language).search(output)
+
+    fix_suggestion = fix_suggestion_match.group(1).strip() if fix_suggestion_match else "Unable to suggest a fix. Please check the error message and code for typos or missing components."
+    updated_code = updated_code_match.group(1).strip() if updated_code_match else code
+    if view is not None and updated_code_match:
+        updated_code = view.splice(updated_code)
+        updated_code = updated_code.strip() if updated_code is not None else None
+
+    return fix_suggestion, updated_code
+
+# Function to check whether a response stopped inside a code block or a search/replace hunk
+def is_unfinished(output):
+    return output.count("```") % 2 == 1 or len(HUNK_START_PATTERN.findall(output)) > len(HUNK_END_PATTERN.findall(output))
+
+# Function to build the messages asking the model to continue a truncated response
+def build_continuation_messages(messages, output):
+    return messages + [
+        {"role": "assistant", "content": output},
+        {"role": "user", "content": CONTINUATION_PROMPT},
+    ]
+
+# Function to join a continuation to a truncated response, dropping a code fence the model re-opened
+def join_continuation(output, continuation):
+    if output.count("```") % 2 == 1:
+        continuation = REOPENED_FENCE_PATTERN.sub("", continuation, count=1)
+    return output + continuation
+
+# Function to read the token usage reported with a completion or the last streamed chunk (None if not reported)
+def response_usage(response):
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        usage = getattr(getattr(response, "x_groq", None), "usage", None)
+    return usage
+
+# Function to add one API call's queueing, token usage and first token time to a request's call_stats
+def update_call_stats(call_stats, queued, usage, first_token_at):
+    call_stats["calls"] += 1
+    call_stats["queued_s"] += queued
+    call_stats["prompt_tokens"] += getattr(usage, "prompt_tokens", None) or 0
+    call_stats["completion_tokens"] += getattr(usage, "completion_tokens", None) or 0
+    if call_stats["first_token_at"] is None:
+        call_stats["first_token_at"] = first_token_at
+
+def new_call_stats():
+    return {"calls": 0, "retries": 0, "queued_s": 0.0, "prompt_tokens": 0, "completion_tokens": 0, "first_token_at": None}
+
+# Function to make one chat completion call
+# Returns (text, finish_reason, usage or None, time.perf_counter() when the first text arrived)
+def create_completion(client, model, messages, max_tokens, on_chunk=None):
+    if not on_chunk:
+        response = client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=TEMPERATURE,
+            max_tokens=max_tokens
+        )
+        choice = response.choices[0]
+        return choice.message.content or "", choice.finish_reason, response_usage(response), time.perf_counter()
+    stream = client.chat.completions.create(
+        model=model,
+        messages=messages,
+        temperature=TEMPERATURE,
+        max_tokens=max_tokens,
+        stream=True
+    )
+    parts, finish_reason, usage, first_token_at = [], None, None, None
+    try:
+        for chunk in stream:
+            if chunk.choices:
+                delta = chunk.choices[0].delta.content
+                finish_reason = chunk.choices[0].finish_reason or finish_reason
+                if delta:
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    parts.append(delta)
+                    on_chunk(delta)
+            usage = response_usage(chunk) or usage
+    finally:
+        # Also reached when on_chunk raises to abandon the request, which drops the connection
+        stream.close()
+    return "".join(parts), finish_reason, usage, first_token_at
+
+# Function to make one completion call through the scheduler, retrying on rate limit errors
+# min_tokens is raised to fit the size of the prompt (see scheduler.completion_budget)
+# Time spent waiting for the rate limits, retries and token usage are added to call_stats
+def scheduled_completion(client, scheduler, model, messages, min_tokens, on_chunk=None, call_stats=None):
+    call_stats = new_call_stats() if call_stats is None else call_stats
+    max_tokens = completion_budget(messages, model, min_tokens)
+    account = account_id(getattr(client, "api_key", None))
+    for attempt in range(scheduler.max_retries + 1):
+        queue_started = time.perf_counter()
+        reservation = scheduler.acquire(model, estimate_tokens(messages) + max_tokens, account)
+        queued = time.perf_counter() - queue_started
+        try:
+            output, finish_reason, usage, first_token_at = create_completion(client, model, messages, max_tokens, on_chunk)
+        except RateLimitError as e:
+            call_stats["queued_s"] += queued
+            if attempt == scheduler.max_retries:
+                raise
+            call_stats["retries"] += 1
+            scheduler.back_off(model, e, attempt, account)
+            continue
+        scheduler.settle(reservation, getattr(usage, "total_tokens", None))
+        update_call_stats(call_stats, queued, usage, first_token_at)
+        return output, finish_reason
+
+# Function to record an LLM request in the metrics recorder
+def record_llm_call(recorder, label, model, cache_outcome, started, call_stats=None, finish_reason=None, error=None):
+    call_stats = call_stats or new_call_stats()
+    first_token_at = call_stats.pop("first_token_at")
+    if cache_outcome == "hit":
+        first_token_at = time.perf_counter()
+    recorder.record(
+        "llm_call", label=label, model=model, cache=cache_outcome,
+        seconds=round(time.perf_counter() - started, 4),
+        ttft_s=round(first_token_at - started, 4) if first_token_at is not None else None,
+        finish_reason=finish_reason, error=error,
+        **{key: round(value, 4) if isinstance(value, float) else value for key, value in call_stats.items()}
+    )
+
+# Function to request a chat completion, reusing a cached response for identical requests
+# If on_chunk is given, the response is streamed and on_chunk is called with each piece of text
+# max_tokens is the minimum completion budget; responses cut off inside the code are continued
+# (up to MAX_CONTINUATIONS more calls) and only complete responses are cached
+# Each request is recorded in recorder (see metrics.py) under the given label
+def request_completion(client, cache, cache_key, model, messages, max_tokens, bypass_cache=False, on_chunk=None, scheduler=request_scheduler,
+                       recorder=metrics, label=""):
+    started = time.perf_counter()
+    if cache is not None and not bypass_cache:
+        cached_output = cache.get(cache_key)
+        if cached_output is not None:
+            if on_chunk:
+                on_chunk(cached_output)
+            record_llm_call(recorder, label, model, "hit", started)
+            return cached_output
+    cache_outcome = "bypass" if bypass_cache else "miss"
+    call_stats = new_call_stats()
+    try:
+        output, finish_reason = scheduled_completion(client, scheduler, model, messages, max_tokens, on_chunk, call_stats)
+        for _ in range(MAX_CONTINUATIONS):
+            if finish_reason != "length" or not is_unfinished(output):
+                break
+            continuation, finish_reason = scheduled_completion(
+                client, scheduler, model, build_continuation_messages(messages, output), max_tokens, on_chunk, call_stats
+            )
+            output = join_continuation(output, continuation)
+    except Exception as e:
+        record_llm_call(recorder, label, model, cache_outcome, started, call_stats, error=type(e).__name__)
+        raise
+    record_llm_call(recorder, label, model, cache_outcome, started, call_stats, finish_reason)
+    if cache is not None and finish_reason != "length":
+        cache.put(cache_key, output)
+    return output
+
+# Async version of request_completion for use with groq.AsyncGroq (no streaming)
+async def request_completion_async(client, cache, cache_key, model, messages, max_tokens, bypass_cache=False, scheduler=request_scheduler,
+                                   recorder=metrics, label=""):
+    started = time.perf_counter()
+    if cache is not None and not bypass_cache:
+        cached_output = cache.get(cache_key)
+        if cached_output is not None:
+            record_llm_call(recorder, label, model, "hit", started)
+            return cached_output
+    cache_outcome = "bypass" if bypass_cache else "miss"
+    call_stats = new_call_stats()
+    account = account_id(getattr(client, "api_key", None))
+
+    async def complete(request_messages):
+        budget = completion_budget(request_messages, model, max_tokens)
+        for attempt in range(scheduler.max_retries + 1):
+            queue_started = time.perf_counter()
+            reservation = await scheduler.acquire_async(model, estimate_tokens(request_messages) + budget, account)
+            queued = time.perf_counter() - queue_started
+            try:
+                response = await client.chat.completions.create(
+                    model=model,
+                    messages=request_messages,
+                    temperature=TEMPERATURE,
+                    max_tokens=budget
+                )
+            except RateLimitError as e:
+                call_stats["queued_s"] += queued
+                if attempt == scheduler.max_retries:
+                    raise
+                call_stats["retries"] += 1
+                scheduler.back_off(model, e, attempt, account)
+                continue
+            usage = response_usage(response)
+            scheduler.settle(reservation, getattr(usage, "total_tokens", None))
+            update_call_stats(call_stats, queued, usage, time.perf_counter())
+            return response.choices[0].message.content or "", response.choices[0].finish_reason
+
+    try:
+        output, finish_reason = await complete(messages)
+        for _ in range(MAX_CONTINUATIONS):
+            if finish_reason != "length" or not is_unfinished(output):
+                break
+            continuation, finish_reason = await complete(build_continuation_messages(messages, output))
+            output = join_continuation(output, continuation)
+    except Exception as e:
+        record_llm_call(recorder, label, model, cache_outcome, started, call_stats, error=type(e).__name__)
+        raise
+    record_llm_call(recorder, label, model, cache_outcome, started, call_stats, finish_reason)
+    if cache is not None and finish_reason != "length":
+        cache.put(cache_key, output)
+    return output
+
+# Function to run calls in parallel threads and return the first result accepted by is_valid
+# Each call(cancel_event) should stop (e.g. raise hedging.Cancelled) once cancel_event is set, which
+# happens as soon as a result is accepted; if none is accepted, the first result that completed is
+# returned (or the first error is raised if every call failed)
+def first_valid_result(calls, is_valid):
+    cancel = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=len(calls))
+    futures = [executor.submit(call, cancel) for call in calls]
+    first_result, first_error = None, None
+    try:
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                first_error = first_error or e
+                continue
+            if is_valid(result):
+                return result
+            if first_result is None:
+                first_result = result
+    finally:
+        cancel.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+    if first_result is None:
+        raise first_error
+    return first_result
+
+# Function to find the first step whose saved snapshot no longer matches the prompt history
+def first_changed_step(prompt_history, snapshot_prompts):
+    for idx, prompt in enumerate(prompt_history):
+        if idx >= len(snapshot_prompts) or snapshot_prompts[idx] != prompt:
+            return idx
+    return len(prompt_history)
+
+# Function to compute a unified diff between two versions of the code
+def compute_diff(original, modified, fromfile="", tofile=""):
+    diff = difflib.unified_diff(original.splitlines(), modified.splitlines(), fromfile=fromfile, tofile=tofile, lineterm="")
+    return "\n".join(diff)
@@ -0,0 +1,87 @@
+import re
+
+from chunking import Chunk, CodeView, split_into_chunks
+
+# Extracting the failing lines from compiler and runtime error messages, so that "Suggest Fix"
+# can send a window around them (plus the enclosing function or class) instead of the whole file.
+
+# (pattern, path group, line group, innermost frame last) for the error formats of the supported languages
+LOCATION_PATTERNS = [
+    # Python tracebacks: File "game.py", line 12, in update
+    (re.compile(r'File "([^"]+)", line (\d+)'), 1, 2, True),
+    # C#/.NET stack traces: at Game.Update() in C:\src\Game.cs:line 42
+    (re.compile(r"\bin (\S+?):line (\d+)"), 1, 2, False),
+    # MSVC and C# compilers: Game.cs(12,5): error CS1002 / main.cpp(12): error C2065
+    (re.compile(r"([\w./\\:-]+\.\w+)\((\d+)(?:,\d+)?\)\s*:"), 1, 2, False),
+    # Rust: --> src/main.rs:12:5, panicked at src/main.rs:12:5
+    (re.compile(r"(?:-->|panicked at)\s+'?([^\s:']+):(\d+):\d+"), 1, 2, False),
+    # JavaScript stack frames: at update (game.js:12:5)
+    (re.compile(r"\(?((?:file|https?)://[^\s():]+(?::\d+)?[^\s():]*|[^\s():]+\.m?js):(\d+):\d+\)?"), 1, 2, False),
+    # GDScript: res://player.gd:12
+    (re.compile(r"(res://[^\s:]+):(\d+)"), 1, 2, False),
+    # Haxe: Main.hx:12: characters 5-10
+    (re.compile(r"([\w./\\-]+\.hx):(\d+):"), 1, 2, False),
+    # GCC/Clang, Lua and other file:line[:column] formats: main.cpp:12:5: error, main.lua:12: attempt to
+    (re.compile(r'([\w./\\-]+\.\w+|\[string "[^"]*"\]|stdin):(\d+)(?::\d+)?:'), 1, 2, False),
+    # Anything else that just mentions a line: "Parse Error at line 12", "line 12"
+    (re.compile(r"\bline (\d+)\b", re.IGNORECASE), None, 1, False),
+]
+
+# Frames in installed libraries and runtimes are never part of the user's script
+LIBRARY_PATH_PATTERN = re.compile(r"site-packages|dist-packages|node_modules|<frozen|/usr/(?:lib|include|local)|\.cargo|\\Windows\\|/rustc/")
+
+# Function to find (path, line) locations referenced by an error message, most specific first
+# (the first reported error, or the innermost frame of a stack trace)
+def parse_error_locations(error_message):
+    locations, seen = [], set()
+    for pattern, path_group, line_group, innermost_last in LOCATION_PATTERNS:
+        matches = [
+            (match.group(path_group) if path_group else "", int(match.group(line_group)))
+            for match in pattern.finditer(error_message)
+        ]
+        for path, line in (reversed(matches) if innermost_last else matches):
+            if LIBRARY_PATH_PATTERN.search(path) or line <= 0 or line in seen:
+                continue
+            seen.add(line)
+            locations.append((path, line))
+        if locations and path_group is not None:
+            # A specific format matched, so skip the looser patterns that would re-match the same text
+            break
+    return locations
+
+# Function to build a view of the code around the lines referenced by an error message
+# Returns None if the message has no usable line numbers (callers can fall back to keyword relevance)
+def build_error_view(code, language, error_message, window=15, max_lines=250):
+    lines = code.split("\n")
+    error_lines = [line - 1 for _, line in parse_error_locations(error_message) if line <= len(lines)]
+    if not error_lines:
+        return None
+    pieces = [(chunk.kind, chunk.name, chunk.start, chunk.end) for chunk in split_into_chunks(code, language)]
+    wanted = set()
+    for line in error_lines:
+        low, high = max(0, line - window), min(len(lines), line + window + 1)
+        idx = next(i for i, (_, _, start, end) in enumerate(pieces) if start <= line < end)
+        kind, name, start, end = pieces[idx]
+        if end - start > 2 * window + 1:
+            # Too large to send whole: split off the symbol's first line and the window around the error
+            bounds = sorted({start, start + 1, min(max(low, start + 1), end), min(max(high, start + 1), end), end})
+            carved = [(kind, name, a, b) if a == start else ("block", f"part of {name}", a, b) for a, b in zip(bounds, bounds[1:])]
+            pieces[idx:idx + 1] = carved
+            wanted.add((start, start + 1))
+        wanted.update((start, end) for _, _, start, end in pieces if start < high and end > low)
+
+    chunks = [Chunk(idx, kind, name, start, end) for idx, (kind, name, start, end) in enumerate(pieces)]
+    # Keep within the line budget, preferring the chunks closest to the first (most specific) error line
+    focus = error_lines[0]
+    candidates = sorted(
+        (chunk for chunk in chunks if (chunk.start, chunk.end) in wanted),
+        key=lambda chunk: 0 if chunk.start <= focus < chunk.end else min(abs(chunk.start - focus), abs(chunk.end - 1 - focus))
+    )
+    selected, used = [], 0
+    for chunk in candidates:
+        size = chunk.end - chunk.start
+        if selected and used + size > max_lines:
+            continue
+        selected.append(chunk.id)
+        used += size
+    return CodeView(code, language, chunks, sorted(selected))
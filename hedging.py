@@ -0,0 +1,106 @@
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from metrics import percentile
+
+# Hedged requests: send a request to a primary model and, after a delay or if it fails, to backup
+# models as well. The first response accepted by the caller's check wins and the others are cancelled.
+
+class Cancelled(Exception):
+    pass
+
+# Function to build an on_chunk callback for a streamed request that abandons it (at its next chunk)
+# once cancel_event is set
+def cancel_on_chunk(cancel_event):
+    def check_cancelled(chunk):
+        if cancel_event.is_set():
+            raise Cancelled()
+    return check_cancelled
+
+# Per-model latency and win-rate statistics, shared by all sessions in the process
+class ModelStats:
+    def __init__(self, max_samples=200):
+        self._lock = threading.Lock()
+        self._latencies = defaultdict(lambda: deque(maxlen=max_samples))
+        self._counts = defaultdict(lambda: {"requests": 0, "wins": 0, "errors": 0, "cancelled": 0})
+
+    def record(self, model, outcome, latency=None):
+        with self._lock:
+            self._counts[model]["requests"] += 1
+            if outcome in ("wins", "errors", "cancelled"):
+                self._counts[model][outcome] += 1
+            if latency is not None:
+                self._latencies[model].append(latency)
+
+    # One row per model: requests, wins, win rate, errors, cancelled, p50 and p95 latency in seconds
+    def rows(self):
+        with self._lock:
+            rows = []
+            for model, counts in sorted(self._counts.items()):
+                latencies = sorted(self._latencies[model])
+                rows.append({
+                    "model": model,
+                    **counts,
+                    "win_rate": counts["wins"] / counts["requests"] if counts["requests"] else 0.0,
+                    "p50_s": percentile(latencies, 50),
+                    "p95_s": percentile(latencies, 95),
+                })
+            return rows
+
+model_stats = ModelStats()
+
+# Function to race a request across models
+# call(model, cancel_event) performs the request and should raise Cancelled once cancel_event is set.
+# The next model is started every `delay` seconds while no accepted result has arrived, and
+# immediately when a running request fails or returns a result that is_valid rejects.
+# Returns (model, result) for the first accepted result, or for the first completed one if none
+# was accepted; raises the first error if every request failed.
+def hedged_call(call, models, is_valid, delay=2.0, stats=model_stats):
+    cancel = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=len(models))
+    pending = {}
+    queue = list(models)
+    fallback, first_error = None, None
+
+    def launch():
+        model = queue.pop(0)
+        started = time.perf_counter()
+        future = executor.submit(call, model, cancel)
+        pending[future] = (model, started)
+
+    try:
+        launch()
+        while pending:
+            done, _ = wait(list(pending), timeout=delay if queue else None, return_when=FIRST_COMPLETED)
+            if not done:
+                launch()
+                continue
+            for future in done:
+                model, started = pending.pop(future)
+                latency = time.perf_counter() - started
+                try:
+                    result = future.result()
+                except Exception as e:
+                    stats.record(model, "errors", latency)
+                    first_error = first_error or e
+                    if queue:
+                        launch()
+                    continue
+                if is_valid(result):
+                    stats.record(model, "wins", latency)
+                    return model, result
+                stats.record(model, "completed", latency)
+                if fallback is None:
+                    fallback = (model, result)
+                if queue:
+                    launch()
+        if fallback is not None:
+            return fallback
+        raise first_error
+    finally:
+        cancel.set()
+        for model, _ in pending.values():
+            stats.record(model, "cancelled")
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,83 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+# Performance instrumentation: timed records of LLM calls (wall time, time to first token, queueing,
+# token usage, cache outcome), response parsing, validation, diffing and Streamlit reruns.
+# Records are kept in memory (bounded) for the metrics panel and can be exported as JSONL,
+# or appended to a JSONL file as they are recorded.
+
+class MetricsRecorder:
+    def __init__(self, max_records=5000, path=None):
+        self._records = deque(maxlen=max_records)
+        self._lock = threading.Lock()
+        self.path = path
+        if path and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def record(self, kind, **fields):
+        entry = {"ts": round(time.time(), 3), "kind": kind, **fields}
+        with self._lock:
+            self._records.append(entry)
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry) + "\n")
+        return entry
+
+    # Context manager recording the wall time of its body; extra fields can be added to the yielded dict
+    @contextmanager
+    def timer(self, kind, **fields):
+        started = time.perf_counter()
+        try:
+            yield fields
+        finally:
+            self.record(kind, seconds=round(time.perf_counter() - started, 4), **fields)
+
+    def records(self, kind=None):
+        with self._lock:
+            return [entry for entry in self._records if kind is None or entry["kind"] == kind]
+
+    def to_jsonl(self):
+        return "".join(json.dumps(entry) + "\n" for entry in self.records())
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+    # One row per (kind, label, model): count, p50/p95 wall time and time to first token, token totals, cache hits
+    def summary(self):
+        groups = defaultdict(list)
+        for entry in self.records():
+            groups[(entry["kind"], entry.get("label", ""), entry.get("model", ""))].append(entry)
+        rows = []
+        for (kind, label, model), entries in sorted(groups.items()):
+            seconds = sorted(entry["seconds"] for entry in entries if entry.get("seconds") is not None)
+            ttft = sorted(entry["ttft_s"] for entry in entries if entry.get("ttft_s") is not None)
+            rows.append({
+                "kind": kind,
+                "label": label,
+                "model": model,
+                "count": len(entries),
+                "p50_s": percentile(seconds, 50),
+                "p95_s": percentile(seconds, 95),
+                "ttft_p50_s": percentile(ttft, 50),
+                "ttft_p95_s": percentile(ttft, 95),
+                "prompt_tokens": sum(entry.get("prompt_tokens") or 0 for entry in entries),
+                "completion_tokens": sum(entry.get("completion_tokens") or 0 for entry in entries),
+                "cache_hits": sum(1 for entry in entries if entry.get("cache") == "hit"),
+                "errors": sum(1 for entry in entries if entry.get("error")),
+            })
+        return rows
+
+# Function to compute a percentile (nearest rank) of sorted values; None if there are none
+def percentile(values, percent):
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))]
+
+# Process-wide default recorder for code_iterator calls made without one (the app keeps a recorder
+# per session, so users only see their own requests; batch mode writes its own metrics file)
+metrics = MetricsRecorder()
@@ -0,0 +1,95 @@
+import difflib
+import re
+
+# Search/replace hunks returned by the model in patch mode, and a local applier for them.
+# Each hunk looks like:
+#
+#   <<<<<<< SEARCH
+#   [exact lines from the current code]
+#   =======
+#   [lines to put in their place]
+#   >>>>>>> REPLACE
+#
+# Hunks are matched exactly first, then ignoring indentation and trailing whitespace,
+# then fuzzily (closest window of lines above a similarity threshold). A SEARCH block that
+# matches more than one place equally well is rejected rather than applied to the first one.
+
+HUNK_PATTERN = re.compile(
+    r"^<{5,9} ?SEARCH[^\n]*\n(.*?)^={5,9}[^\n]*\n(.*?)^>{5,9} ?REPLACE[^\n]*$",
+    re.DOTALL | re.MULTILINE
+)
+
+class PatchError(Exception):
+    pass
+
+# Function to extract (search, replace) hunks from a model response
+def parse_hunks(output):
+    return [(search.rstrip("\n"), replace.rstrip("\n")) for search, replace in HUNK_PATTERN.findall(output)]
+
+# Function to apply hunks to code in order; raises PatchError if a hunk cannot be placed
+def apply_hunks(code, hunks, min_similarity=0.85):
+    lines = code.split("\n")
+    for number, (search, replace) in enumerate(hunks, 1):
+        replace_lines = replace.split("\n") if replace else []
+        if not search.strip():
+            # An empty search block appends the replacement to the end of the file
+            lines = lines + replace_lines
+            continue
+        search_lines = search.split("\n")
+        starts = _find_block(lines, search_lines, min_similarity)
+        if not starts:
+            raise PatchError(f"Hunk {number} does not match the current code.")
+        if len(starts) > 1:
+            raise PatchError(f"Hunk {number} matches {len(starts)} places in the current code.")
+        start = starts[0]
+        matched = lines[start:start + len(search_lines)]
+        replace_lines = _reindent(replace_lines, search_lines, matched)
+        lines = lines[:start] + replace_lines + lines[start + len(search_lines):]
+    return "\n".join(lines)
+
+# Function to locate a block of lines: exact match, then whitespace-insensitive, then fuzzy
+# Returns the start of every equally good match (empty if there is none)
+def _find_block(lines, search_lines, min_similarity):
+    size = len(search_lines)
+    if size > len(lines):
+        return []
+    for normalize in (lambda line: line.rstrip(), lambda line: line.strip()):
+        target = [normalize(line) for line in search_lines]
+        normalized = [normalize(line) for line in lines]
+        starts = [start for start in range(len(lines) - size + 1) if normalized[start:start + size] == target]
+        if starts:
+            return starts
+    target = "\n".join(line.strip() for line in search_lines)
+    best_starts, best_ratio = [], min_similarity
+    matcher = difflib.SequenceMatcher(autojunk=False)
+    matcher.set_seq2(target)
+    for start in range(len(lines) - size + 1):
+        matcher.set_seq1("\n".join(line.strip() for line in lines[start:start + size]))
+        if matcher.real_quick_ratio() < best_ratio or matcher.quick_ratio() < best_ratio:
+            continue
+        ratio = matcher.ratio()
+        if ratio > best_ratio:
+            best_starts, best_ratio = [start], ratio
+        elif ratio == best_ratio and best_starts and start >= best_starts[-1] + size:
+            # A tie with a window that doesn't overlap the best one is a second, equally good place
+            best_starts.append(start)
+    return best_starts
+
+# Function to shift replacement lines to the indentation actually found in the code
+def _reindent(replace_lines, search_lines, matched_lines):
+    search_indent = _first_indent(search_lines)
+    matched_indent = _first_indent(matched_lines)
+    if search_indent is None or matched_indent is None or search_indent == matched_indent:
+        return replace_lines
+    adjusted = []
+    for line in replace_lines:
+        if line.startswith(search_indent):
+            line = matched_indent + line[len(search_indent):]
+        adjusted.append(line)
+    return adjusted
+
+def _first_indent(lines):
+    for line in lines:
+        if line.strip():
+            return line[:len(line) - len(line.lstrip())]
+    return None
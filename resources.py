@@ -0,0 +1,136 @@
+import hashlib
+import re
+import threading
+import time
+
+import httpx
+from groq import Groq
+
+# Static data and shared resources. Streamlit re-executes app.py on every interaction,
+# but imported modules are only loaded once per process, so anything defined here
+# is built once and reused across reruns and sessions.
+
+# Available LLM models on Groq API
+MODELS = [
+    "llama-3.3-70b-versatile",
+    "llama-3-70b-8192",
+    "llama-3-8b-8192",
+    "llama-3.1-70b-instruct",
+    "llama-3.1-8b-instruct",
+    "llama-4-scout",
+    "llama-4-maverick",
+    "mixtral-8x7b-32768",
+    "gemma-7b-it",
+    "qwen-2.5-32b",
+    "deepseek-r1-distill-qwen-32b"
+]
+
+# Context window (prompt + completion tokens) of each model; models not listed use DEFAULT_CONTEXT_WINDOW
+MODEL_CONTEXT_WINDOWS = {
+    "llama-3-70b-8192": 8192,
+    "llama-3-8b-8192": 8192,
+    "mixtral-8x7b-32768": 32768,
+    "gemma-7b-it": 8192,
+}
+DEFAULT_CONTEXT_WINDOW = 131072
+
+# Largest completion requested in one call (truncated completions are continued in further calls)
+MAX_COMPLETION_TOKENS = 8192
+
+# Requests per minute and tokens per minute allowed for each model (Groq free tier; raise for paid plans)
+# Models not listed use DEFAULT_RATE_LIMITS
+MODEL_RATE_LIMITS = {
+    "llama-3.3-70b-versatile": (30, 12000),
+    "llama-3-70b-8192": (30, 6000),
+    "llama-3-8b-8192": (30, 6000),
+    "mixtral-8x7b-32768": (30, 5000),
+    "gemma-7b-it": (30, 15000),
+}
+DEFAULT_RATE_LIMITS = (30, 6000)
+
+# Supported game development languages
+LANGUAGES = ["C++", "C# (Outside Unity)", "GDScript", "JavaScript", "Python", "Lua", "Haxe", "Rust"]
+
+# Source file extensions for each language (used by the batch mode to find scripts)
+LANGUAGE_EXTENSIONS = {
+    "C++": (".cpp", ".cc", ".cxx", ".hpp", ".hh", ".h"),
+    "C# (Outside Unity)": (".cs",),
+    "GDScript": (".gd",),
+    "JavaScript": (".js", ".mjs"),
+    "Python": (".py",),
+    "Lua": (".lua",),
+    "Haxe": (".hx",),
+    "Rust": (".rs",)
+}
+
+# Prompt templates, formatted per language
+TEMPLATE_TEXTS = {
+    "Select a task": "",
+    "Add jump mechanic": "Modify this {language} code to add a jump mechanic with height 2 units, triggered by the spacebar (or equivalent input for the chosen language).",
+    "Add health system": "Modify this {language} code to add a health system with max health 100 and a damage function.",
+    "Optimize performance": "Modify this {language} code to improve frame rate, focusing on efficient movement or rendering."
+}
+
+TEMPLATES = {
+    language: {name: text.format(language=language) for name, text in TEMPLATE_TEXTS.items()}
+    for language in LANGUAGES
+}
+
+# Response parsing patterns. Language names are escaped so fences such as ```c++ match literally.
+EXPLANATION_PATTERN = re.compile(r"\*\*Explanation\*\*:(.*?)$", re.DOTALL)
+SUGGESTED_FIX_PATTERN = re.compile(r"\*\*Suggested Fix\*\*:(.*?)\*\*Updated Code\*\*:", re.DOTALL)
+
+def _compile_fence_pattern(language):
+    return re.compile(rf"```{re.escape(language.lower())}\n(.*?)```", re.DOTALL)
+
+FENCE_PATTERNS = {language: _compile_fence_pattern(language) for language in LANGUAGES}
+
+# Function to get the code fence pattern for a language
+def fence_pattern(language):
+    pattern = FENCE_PATTERNS.get(language)
+    if pattern is None:
+        pattern = FENCE_PATTERNS[language] = _compile_fence_pattern(language)
+    return pattern
+
+
+# Keeps one Groq client, with its own keep-alive HTTP connection pool, per API key.
+# The number of clients is bounded, and clients unused for idle_timeout seconds are dropped.
+# Dropped clients are not closed: a session or worker thread may still be in the middle of a request
+# on one, so its connections are released when the last reference to it is garbage-collected.
+class ClientPool:
+    def __init__(self, max_clients=32, idle_timeout=900, max_connections=10, max_keepalive_connections=5, keepalive_expiry=60):
+        self.max_clients = max_clients
+        self.idle_timeout = idle_timeout
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def get(self, api_key):
+        key = hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._clients.get(key)
+            if entry is None:
+                if len(self._clients) >= self.max_clients:
+                    oldest = min(self._clients, key=lambda k: self._clients[k][1])
+                    del self._clients[oldest]
+                # The SDK's own retries are disabled so that rate limit errors reach the request scheduler
+                client = Groq(api_key=api_key, max_retries=0, http_client=httpx.Client(limits=self.limits))
+                entry = [client, now]
+                self._clients[key] = entry
+            entry[1] = now
+            return entry[0]
+
+    def __len__(self):
+        return len(self._clients)
+
+    def _evict_idle(self, now):
+        for key in [k for k, (_, last_used) in self._clients.items() if now - last_used > self.idle_timeout]:
+            del self._clients[key]
+
+client_pool = ClientPool()
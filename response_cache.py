@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Function to build a content-addressed key for an LLM request
+def make_cache_key(kind, model, language, system_prompt, code, context, prompt_chain, **options):
+    payload = {
+        "kind": kind,
+        "model": model,
+        "language": language,
+        "system_prompt": system_prompt,
+        "code": code,
+        "context": context or "",
+        "prompt_chain": list(prompt_chain),
+        "options": options,
+    }
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+# Two-tier cache for LLM responses: an in-memory LRU in front of an on-disk SQLite store.
+# Both tiers are bounded by total size in bytes and evict least recently used entries first.
+# Memory hits are also recorded as accesses in SQLite, in batches of touch_batch (and always
+# before the disk tier evicts), so entries served from memory are not evicted from disk as stale.
+class ResponseCache:
+    def __init__(self, path=None, max_memory_bytes=16 * 1024 * 1024, max_disk_bytes=256 * 1024 * 1024, touch_batch=32):
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.touch_batch = touch_batch
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._touched = {}  # key -> time of memory hits not yet written to SQLite
+        self._lock = threading.Lock()
+        self._db = None
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        if path:
+            try:
+                directory = os.path.dirname(path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._db = sqlite3.connect(path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+                )
+                self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+                self._db.commit()
+            except sqlite3.Error:
+                # Fall back to memory-only caching if the disk tier cannot be opened
+                self._db = None
+
+    def get(self, key):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits_memory += 1
+                if self._db is not None:
+                    self._touched[key] = time.time()
+                    if len(self._touched) >= self.touch_batch:
+                        self._flush_touched()
+                        self._db.commit()
+                return self._memory[key]
+            if self._db is not None:
+                row = self._db.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self._touched.pop(key, None)
+                    self._db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+                    self._db.commit()
+                    self._remember(key, row[0])
+                    self.hits_disk += 1
+                    return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        if value is None:
+            return
+        with self._lock:
+            self._remember(key, value)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                    (key, value, len(value.encode("utf-8")), time.time()),
+                )
+                self._touched.pop(key, None)
+                self._flush_touched()
+                self._evict_disk()
+                self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            self._touched.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            disk_entries, disk_bytes = 0, 0
+            if self._db is not None:
+                disk_entries, disk_bytes = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            return {
+                "hits_memory": self.hits_memory,
+                "hits_disk": self.hits_disk,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_entries": disk_entries,
+                "disk_bytes": disk_bytes,
+            }
+
+    # Store a value in the memory tier and evict least recently used entries over the size limit
+    def _remember(self, key, value):
+        size = len(value.encode("utf-8"))
+        if key in self._memory:
+            self._memory_bytes -= len(self._memory.pop(key).encode("utf-8"))
+        if size > self.max_memory_bytes:
+            return
+        self._memory[key] = value
+        self._memory_bytes += size
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted.encode("utf-8"))
+
+    # Write the access times of memory hits to SQLite (the caller commits)
+    def _flush_touched(self):
+        if self._touched:
+            self._db.executemany("UPDATE responses SET last_access = ? WHERE key = ?", [(at, key) for key, at in self._touched.items()])
+            self._touched.clear()
+
+    # Delete least recently used rows until the disk tier is back under its size limit
+    def _evict_disk(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_disk_bytes:
+            return
+        rows = self._db.execute("SELECT key, size FROM responses ORDER BY last_access ASC").fetchall()
+        stale = []
+        for key, size in rows:
+            if total <= self.max_disk_bytes:
+                break
+            stale.append((key,))
+            total -= size
+        self._db.executemany("DELETE FROM responses WHERE key = ?", stale)
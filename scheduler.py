@@ -0,0 +1,121 @@
+import asyncio
+import hashlib
+import random
+import threading
+import time
+from collections import defaultdict, deque
+
+from resources import (
+    DEFAULT_CONTEXT_WINDOW, DEFAULT_RATE_LIMITS, MAX_COMPLETION_TOKENS, MODEL_CONTEXT_WINDOWS, MODEL_RATE_LIMITS
+)
+
+# Rate-limit-aware scheduling of Groq requests. Groq applies rate limits per API key, so budgets are
+# kept per (account, model), where the account identifies the API key. Every request first reserves
+# room in its requests-per-minute and tokens-per-minute budgets (waiting if the last minute is already
+# full), and rate limit errors push that account's next slot for the model back by the server's
+# retry-after (or an exponential backoff with jitter), so concurrent sessions queue up instead of
+# failing, without holding up sessions that use other keys.
+
+# Function to identify the account of an API key for the scheduler budgets, without keeping the key itself
+def account_id(api_key):
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16] if api_key else ""
+
+# Function to estimate the number of tokens in chat messages (about 4 characters per token)
+def estimate_tokens(messages):
+    return sum(len(message["content"]) // 4 + 4 for message in messages) + 3
+
+# Function to choose max_tokens for a request: at least `minimum`, enough to echo back the code in
+# the prompt, and no more than fits in the model's context window
+def completion_budget(messages, model, minimum):
+    prompt_tokens = estimate_tokens(messages)
+    available = MODEL_CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW) - prompt_tokens
+    wanted = max(minimum, int(prompt_tokens * 1.2))
+    return max(256, min(wanted, available, MAX_COMPLETION_TOKENS))
+
+# Function to compute how long to wait before retrying after a rate limit error
+def retry_delay(error, attempt, max_delay=60.0):
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        delay = float(retry_after)
+    except (TypeError, ValueError):
+        delay = min(max_delay, 2 ** attempt)
+    return delay + random.uniform(0, 1)
+
+# Sliding one-minute request and token budgets per (account, model), shared by all threads (and event loops)
+# requests_per_minute, if given, overrides the per-model request limits; models missing from
+# rate_limits use default_limits
+class RequestScheduler:
+    def __init__(self, rate_limits=None, requests_per_minute=None, max_retries=5, window=60.0, default_limits=DEFAULT_RATE_LIMITS):
+        self.rate_limits = MODEL_RATE_LIMITS if rate_limits is None else rate_limits
+        self.default_limits = default_limits
+        self.requests_per_minute = requests_per_minute
+        self.max_retries = max_retries
+        self.window = window
+        self._lock = threading.Lock()
+        self._sent = defaultdict(deque)  # (account, model) -> [sent_at, tokens] of requests in the last window
+        self._blocked_until = defaultdict(float)
+
+    def limits(self, model):
+        requests, tokens = self.rate_limits.get(model, self.default_limits)
+        return self.requests_per_minute or requests, tokens
+
+    # Reserve room for a request if it fits now; returns (reservation, 0) or (None, seconds to wait)
+    # account is an account_id (requests made with different API keys don't share budgets)
+    def try_acquire(self, model, tokens, account=""):
+        requests_limit, tokens_limit = self.limits(model)
+        budget = (account, model)
+        with self._lock:
+            now = time.monotonic()
+            sent = self._sent[budget]
+            while sent and sent[0][0] <= now - self.window:
+                sent.popleft()
+            if now < self._blocked_until[budget]:
+                return None, self._blocked_until[budget] - now
+            used = sum(entry[1] for entry in sent)
+            # A request larger than the whole token budget is let through once the window is empty
+            if sent and (len(sent) >= requests_limit or used + tokens > tokens_limit):
+                if len(sent) >= requests_limit:
+                    wait_until = sent[0][0] + self.window
+                else:
+                    # Wait until enough of the oldest requests have left the window
+                    freed, wait_until = used + tokens - tokens_limit, sent[-1][0] + self.window
+                    for sent_at, entry_tokens in sent:
+                        freed -= entry_tokens
+                        if freed <= 0:
+                            wait_until = sent_at + self.window
+                            break
+                return None, max(0.01, wait_until - now)
+            reservation = [now, tokens]
+            sent.append(reservation)
+            return reservation, 0.0
+
+    def acquire(self, model, tokens, account=""):
+        while True:
+            reservation, delay = self.try_acquire(model, tokens, account)
+            if reservation is not None:
+                return reservation
+            time.sleep(delay)
+
+    async def acquire_async(self, model, tokens, account=""):
+        while True:
+            reservation, delay = self.try_acquire(model, tokens, account)
+            if reservation is not None:
+                return reservation
+            await asyncio.sleep(delay)
+
+    # Replace a reservation's estimated token count with the actual usage reported by the API
+    def settle(self, reservation, tokens):
+        if tokens:
+            with self._lock:
+                reservation[1] = tokens
+
+    # Hold back an account's requests to a model after it returned a rate limit error; returns the delay
+    def back_off(self, model, error, attempt, account=""):
+        delay = retry_delay(error, attempt)
+        budget = (account, model)
+        with self._lock:
+            self._blocked_until[budget] = max(self._blocked_until[budget], time.monotonic() + delay)
+        return delay
+
+request_scheduler = RequestScheduler()
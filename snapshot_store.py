@@ -0,0 +1,249 @@
+import difflib
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from code_iterator import compute_diff
+
+# Content-addressed store of code versions, shared by all sessions. Each version is stored once under
+# the SHA-256 of its text, zlib-compressed, either whole or as a line delta against its parent version
+# (whichever is smaller; every keyframe_interval-th version in a chain is stored whole so reads stay
+# cheap). Sessions keep only hashes: their state is saved here as JSON, and idle sessions are evicted
+# along with the versions no other session refers to. Diffs between two versions are memoized per pair.
+# With a path, versions and sessions are kept in SQLite so they survive restarts; otherwise in memory.
+
+# Function to hash a code version
+def snapshot_hash(code):
+    return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+# Function to encode new_text as a delta against base_text: a list of [start, end] line ranges copied
+# from the base and strings of inserted lines
+def encode_delta(base_text, new_text):
+    base_lines = base_text.splitlines(keepends=True)
+    new_lines = new_text.splitlines(keepends=True)
+    delta = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, base_lines, new_lines, autojunk=False).get_opcodes():
+        if tag == "equal":
+            delta.append([i1, i2])
+        elif j2 > j1:
+            delta.append("".join(new_lines[j1:j2]))
+    return delta
+
+def apply_delta(base_text, delta):
+    base_lines = base_text.splitlines(keepends=True)
+    return "".join("".join(base_lines[part[0]:part[1]]) if isinstance(part, list) else part for part in delta)
+
+class SnapshotStore:
+    def __init__(self, path=None, keyframe_interval=8, max_memory_bytes=32 * 1024 * 1024, max_diffs=256, max_idle_seconds=7 * 24 * 3600):
+        self.keyframe_interval = keyframe_interval
+        self.max_memory_bytes = max_memory_bytes
+        self.max_idle_seconds = max_idle_seconds
+        self._lock = threading.RLock()
+        self._texts = OrderedDict()  # decoded versions, least recently used first
+        self._texts_bytes = 0
+        self._diffs = OrderedDict()  # (from hash, to hash) -> diff
+        self.max_diffs = max_diffs
+        self._blobs = {}  # hash -> (parent, depth, data, stored at) when there is no database
+        self._sessions = {}  # session id -> (state JSON, referenced hashes JSON, last access); a write-through copy with a database
+        self._last_eviction = 0.0
+        self.diff_hits = 0
+        self.diff_misses = 0
+        self._db = None
+        if path:
+            try:
+                directory = os.path.dirname(path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._db = sqlite3.connect(path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS snapshots ("
+                    "hash TEXT PRIMARY KEY, parent TEXT, depth INTEGER NOT NULL, data BLOB NOT NULL, size INTEGER NOT NULL, stored_at REAL NOT NULL)"
+                )
+                self._db.execute("CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, state TEXT NOT NULL, snapshots TEXT NOT NULL, last_access REAL NOT NULL)")
+                self._db.commit()
+            except sqlite3.Error:
+                # Fall back to keeping everything in memory if the database cannot be opened
+                self._db = None
+
+    # Store a code version (delta-encoded against parent, the hash of the version it was derived from) and return its hash
+    def put(self, code, parent=None):
+        key = snapshot_hash(code)
+        with self._lock:
+            if self._has(key):
+                self._touch(key)
+                return key
+            data, stored_parent, depth = zlib.compress(code.encode("utf-8")), None, 0
+            parent_record = self._record(parent) if parent and parent != key else None
+            if parent_record is not None and parent_record[1] + 1 < self.keyframe_interval:
+                delta = zlib.compress(json.dumps(encode_delta(self.get(parent), code), ensure_ascii=False).encode("utf-8"))
+                if len(delta) < len(data):
+                    data, stored_parent, depth = delta, parent, parent_record[1] + 1
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR IGNORE INTO snapshots (hash, parent, depth, data, size, stored_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, stored_parent, depth, data, len(data), time.time()),
+                )
+                self._db.commit()
+            else:
+                self._blobs[key] = (stored_parent, depth, data, time.time())
+            self._remember(key, code)
+            return key
+
+    # Return the code stored under key ("" for None), decoding its delta chain if needed
+    def get(self, key):
+        if not key:
+            return ""
+        with self._lock:
+            if key in self._texts:
+                self._texts.move_to_end(key)
+                return self._texts[key]
+            record = self._record(key)
+            if record is None:
+                raise KeyError(key)
+            parent, _, data = record
+            decoded = zlib.decompress(data).decode("utf-8")
+            code = apply_delta(self.get(parent), json.loads(decoded)) if parent else decoded
+            self._remember(key, code)
+            return code
+
+    # Unified diff between two stored versions, computed once per pair (differ defaults to compute_diff)
+    def diff(self, from_key, to_key, differ=None):
+        pair = (from_key, to_key)
+        with self._lock:
+            if pair in self._diffs:
+                self._diffs.move_to_end(pair)
+                self.diff_hits += 1
+                return self._diffs[pair]
+            original, modified = self.get(from_key), self.get(to_key)
+        # Diff outside the lock so other sessions are not held up by a large file
+        diff = (differ or compute_diff)(original, modified)
+        with self._lock:
+            self.diff_misses += 1
+            self._diffs[pair] = diff
+            while len(self._diffs) > self.max_diffs:
+                self._diffs.popitem(last=False)
+        return diff
+
+    # Save a session's state (JSON-serializable, with code as snapshot hashes) and the hashes it refers to.
+    # Unchanged states only refresh the last access time once a minute; idle sessions are evicted at most
+    # every ten minutes.
+    def save_session(self, session_id, state, snapshots):
+        encoded = json.dumps(state, sort_keys=True, ensure_ascii=False)
+        references = json.dumps(sorted({key for key in snapshots if key}))
+        now = time.time()
+        with self._lock:
+            saved = self._sessions.get(session_id)
+            if saved is not None and saved[:2] == (encoded, references) and now - saved[2] < 60:
+                return
+            self._sessions[session_id] = (encoded, references, now)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO sessions (id, state, snapshots, last_access) VALUES (?, ?, ?, ?)", (session_id, encoded, references, now)
+                )
+                self._db.commit()
+            if now - self._last_eviction > 600:
+                self._last_eviction = now
+                self.evict_idle(now)
+
+    # Return a saved session state, or None if there is none (or its code versions have been evicted)
+    def load_session(self, session_id):
+        with self._lock:
+            saved = self._sessions.get(session_id)
+            if saved is None and self._db is not None:
+                saved = self._db.execute("SELECT state, snapshots, last_access FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            if saved is None or not all(self._has(key) for key in json.loads(saved[1])):
+                return None
+            return json.loads(saved[0])
+
+    # Remove sessions idle for longer than max_idle_seconds, then the versions only they referred to
+    def evict_idle(self, now=None):
+        cutoff = (now or time.time()) - self.max_idle_seconds
+        with self._lock:
+            for session_id in [session_id for session_id, saved in self._sessions.items() if saved[2] < cutoff]:
+                del self._sessions[session_id]
+            if self._db is not None:
+                self._db.execute("DELETE FROM sessions WHERE last_access < ?", (cutoff,))
+                references = [row[0] for row in self._db.execute("SELECT snapshots FROM sessions")]
+            else:
+                references = [saved[1] for saved in self._sessions.values()]
+            live = {key for encoded in references for key in json.loads(encoded)}
+            # Keep the versions that live versions are delta-encoded against
+            pending = list(live)
+            while pending:
+                record = self._record(pending.pop())
+                if record is not None and record[0] and record[0] not in live:
+                    live.add(record[0])
+                    pending.append(record[0])
+            # Recently stored versions may belong to a session that has not been saved yet
+            if self._db is not None:
+                stale = [row[0] for row in self._db.execute("SELECT hash FROM snapshots WHERE stored_at < ?", (cutoff,)) if row[0] not in live]
+                self._db.executemany("DELETE FROM snapshots WHERE hash = ?", [(key,) for key in stale])
+                self._db.commit()
+            else:
+                stale = [key for key, blob in self._blobs.items() if blob[3] < cutoff and key not in live]
+                for key in stale:
+                    del self._blobs[key]
+            stale_keys = set(stale)
+            for key in stale_keys:
+                self._forget(key)
+            self._diffs = OrderedDict((pair, diff) for pair, diff in self._diffs.items() if not stale_keys.intersection(pair))
+            return len(stale)
+
+    def stats(self):
+        with self._lock:
+            if self._db is not None:
+                snapshots, stored_bytes = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM snapshots").fetchone()
+                sessions = self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+            else:
+                snapshots, stored_bytes, sessions = len(self._blobs), sum(len(blob[2]) for blob in self._blobs.values()), len(self._sessions)
+            return {
+                "snapshots": snapshots,
+                "stored_bytes": stored_bytes,
+                "sessions": sessions,
+                "memory_entries": len(self._texts),
+                "memory_bytes": self._texts_bytes,
+                "diff_hits": self.diff_hits,
+                "diff_misses": self.diff_misses,
+            }
+
+    def _has(self, key):
+        if key in self._blobs:
+            return True
+        return self._db is not None and self._db.execute("SELECT 1 FROM snapshots WHERE hash = ?", (key,)).fetchone() is not None
+
+    # Mark a version as stored again now, so it is not evicted before the session storing it is saved
+    def _touch(self, key):
+        if self._db is not None:
+            self._db.execute("UPDATE snapshots SET stored_at = ? WHERE hash = ?", (time.time(), key))
+            self._db.commit()
+        else:
+            self._blobs[key] = (*self._blobs[key][:3], time.time())
+
+    # (parent, depth, data) of a stored version, or None
+    def _record(self, key):
+        if self._db is not None:
+            row = self._db.execute("SELECT parent, depth, data FROM snapshots WHERE hash = ?", (key,)).fetchone()
+            return tuple(row) if row is not None else None
+        blob = self._blobs.get(key)
+        return blob[:3] if blob is not None else None
+
+    # Keep a decoded version in memory and evict least recently used ones over the size limit
+    def _remember(self, key, code):
+        size = len(code.encode("utf-8"))
+        self._forget(key)
+        if size > self.max_memory_bytes:
+            return
+        self._texts[key] = code
+        self._texts_bytes += size
+        while self._texts_bytes > self.max_memory_bytes:
+            _, evicted = self._texts.popitem(last=False)
+            self._texts_bytes -= len(evicted.encode("utf-8"))
+
+    def _forget(self, key):
+        if key in self._texts:
+            self._texts_bytes -= len(self._texts.pop(key).encode("utf-8"))
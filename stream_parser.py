@@ -0,0 +1,62 @@
+# Incremental parser for streamed LLM responses.
+# Text is fed in as it arrives; the code fence and named sections (e.g. "**Explanation**:")
+# are located once, scanning only the newly added text, so partial code can be rendered live.
+class StreamingResponseParser:
+    def __init__(self, language, markers=()):
+        self.fence = f"```{language.lower()}\n"
+        self.buffer = ""
+        self.code_start = None
+        self.code_end = None
+        self._scan_from = 0
+        self._markers = {marker: None for marker in markers}
+
+    def feed(self, chunk):
+        if not chunk:
+            return
+        previous_length = len(self.buffer)
+        self.buffer += chunk
+        self._scan(previous_length)
+
+    @property
+    def code_started(self):
+        return self.code_start is not None
+
+    @property
+    def code_complete(self):
+        return self.code_end is not None
+
+    # Code received so far, without any partially received closing fence
+    @property
+    def code(self):
+        if self.code_start is None:
+            return ""
+        if self.code_end is not None:
+            return self.buffer[self.code_start:self.code_end].strip()
+        return self.buffer[self.code_start:].rstrip("`").rstrip()
+
+    # Text after a marker, up to an optional end marker (or the end of the text received so far)
+    def section(self, marker, end_marker=None):
+        start = self._markers.get(marker)
+        if start is None:
+            return ""
+        end = self._markers.get(end_marker) if end_marker else None
+        if end is not None and end >= start:
+            return self.buffer[start:end - len(end_marker)].strip()
+        return self.buffer[start:].strip()
+
+    def _scan(self, previous_length):
+        for marker, position in self._markers.items():
+            if position is None:
+                found = self.buffer.find(marker, max(0, previous_length - len(marker) + 1))
+                if found != -1:
+                    self._markers[marker] = found + len(marker)
+        if self.code_start is None:
+            found = self.buffer.find(self.fence, max(0, previous_length - len(self.fence) + 1))
+            if found == -1:
+                return
+            self.code_start = found + len(self.fence)
+            self._scan_from = self.code_start
+        if self.code_end is None:
+            found = self.buffer.find("```", max(self._scan_from, previous_length - 2))
+            if found != -1:
+                self.code_end = found
@@ -0,0 +1,53 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from batch import find_source_files, resolve_language, run_batch
+from benchmarks.mock_server import MockGroqServer, MockSettings
+
+SCRIPT = "local Enemy = {}\n\nfunction Enemy.new()\n    return { health = 100 }\nend\n"
+
+
+def test_resolve_language():
+    assert resolve_language("lua") == "Lua"
+    assert resolve_language("C#") == "C# (Outside Unity)"
+    with pytest.raises(ValueError):
+        resolve_language("Kotlin")
+
+
+def test_find_source_files(tmp_path):
+    for name in ("enemies/slime.lua", "enemies/bat.lua", "player.lua", "notes.txt", ".git/hook.lua"):
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(SCRIPT)
+    assert find_source_files(str(tmp_path), "Lua") == ["player.lua", os.path.join("enemies", "bat.lua"), os.path.join("enemies", "slime.lua")]
+
+
+@pytest.fixture
+def mock_server(monkeypatch):
+    server = MockGroqServer(MockSettings(latency=0.0, chunk_delay=0.0, fixtures_path=None)).start()
+    monkeypatch.setenv("GROQ_BASE_URL", server.base_url)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize("patch_mode", [False, True])
+def test_run_batch_writes_modified_files_diffs_and_summary(tmp_path, mock_server, patch_mode):
+    scripts = tmp_path / "scripts"
+    scripts.mkdir()
+    for name in ("slime.lua", "bat.lua"):
+        (scripts / name).write_text(SCRIPT)
+    output = tmp_path / "out"
+    summary = asyncio.run(run_batch(
+        "gsk_test", str(scripts), "Lua", ["Add a jump"], str(output), concurrency=2, patch_mode=patch_mode,
+        cache_path=str(tmp_path / "cache.sqlite3")
+    ))
+    assert summary["counts"]["modified"] == 2
+    assert (output / "slime.lua").read_text().startswith(SCRIPT.strip())
+    assert "+-- mock change" in (output / "slime.lua.diff").read_text()
+    assert json.loads((output / "summary.json").read_text())["files"] == 2
+    labels = [json.loads(line).get("label") for line in (output / "metrics.jsonl").read_text().splitlines()]
+    assert labels.count("patch" if patch_mode else "modification") == 2
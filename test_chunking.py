@@ -0,0 +1,185 @@
+import pytest
+
+from benchmarks.corpus import generate_script
+from chunking import ChunkIndex, CodeView, build_code_view, split_into_chunks, tokenize
+from resources import LANGUAGES
+
+PYTHON = """import pygame
+
+GRAVITY = 9.8
+
+class Player:
+    def __init__(self):
+        self.x = 0
+        self.health = 100
+
+    def take_damage(self, amount):
+        self.health -= amount
+
+def spawn_enemy(world):
+    world.enemies.append(Enemy())
+
+def render(screen):
+    screen.fill((0, 0, 0))"""
+
+CPP = """#include <iostream>
+
+// The player
+class Player {
+public:
+    int health = 100;
+    void takeDamage(int amount) {
+        health -= amount;
+    }
+};
+
+int main() {
+    Player player;
+    std::cout << player.health;
+    return 0;
+}"""
+
+LUA = """local Player = {}
+
+function Player.new()
+    local self = { health = 100 }
+    return self
+end
+
+function Player.jump(self)
+    if self.grounded then
+        self.vy = -10
+    end
+end"""
+
+
+def assert_covers(code, chunks):
+    assert chunks[0].start == 0
+    assert chunks[-1].end == code.count("\n") + 1
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert previous.end == chunk.start
+    assert [chunk.id for chunk in chunks] == list(range(len(chunks)))
+
+
+@pytest.mark.parametrize("language", LANGUAGES)
+@pytest.mark.parametrize("enemies", [2, 40])
+def test_chunks_cover_every_line(language, enemies):
+    code = generate_script(language, enemies)
+    assert_covers(code, split_into_chunks(code, language))
+
+
+@pytest.mark.parametrize("language", LANGUAGES)
+def test_large_containers_are_split_into_small_chunks(language):
+    code = generate_script(language, 40)
+    chunks = split_into_chunks(code, language, max_chunk_lines=60)
+    assert len(chunks) > 10
+    assert max(chunk.end - chunk.start for chunk in chunks) <= 60
+
+
+def test_python_chunks():
+    chunks = split_into_chunks(PYTHON, "Python")
+    assert_covers(PYTHON, chunks)
+    named = [(chunk.kind, chunk.name) for chunk in chunks if chunk.kind != "block"]
+    assert named == [("class", "Player"), ("def", "spawn_enemy"), ("def", "render")]
+
+
+def test_brace_chunks_keep_comments_with_their_block():
+    chunks = split_into_chunks(CPP, "C++")
+    assert_covers(CPP, chunks)
+    player = next(chunk for chunk in chunks if chunk.name == "Player")
+    assert CPP.split("\n")[player.start] == "// The player"
+    assert any(chunk.kind == "function" and chunk.name == "main" for chunk in chunks)
+
+
+def test_lua_chunks():
+    chunks = split_into_chunks(LUA, "Lua")
+    assert_covers(LUA, chunks)
+    assert [chunk.name for chunk in chunks if chunk.kind == "function"] == ["Player.new", "Player.jump"]
+
+
+def test_tokenize_splits_identifiers():
+    terms = tokenize("takeDamage(player_health) HTTPServer enemies")
+    assert {"takedamage", "damage", "take", "player_health", "player", "health", "http", "server", "enemie"} <= set(terms)
+    assert "the" not in tokenize("the code")
+
+
+def test_bm25_ranks_the_chunk_that_defines_the_mentioned_name_first():
+    chunks = split_into_chunks(PYTHON, "Python")
+    index = ChunkIndex(PYTHON, chunks)
+    scores = index.score("make render draw a background")
+    best = max(range(len(chunks)), key=lambda idx: scores[idx])
+    assert chunks[best].name == "render"
+
+
+def test_bm25_selection_respects_the_line_budget():
+    chunks = split_into_chunks(PYTHON, "Python")
+    index = ChunkIndex(PYTHON, chunks)
+    health = [chunk.id for chunk in chunks if chunk.name == "Player"]
+    assert index.select("damage and health", max_lines=1000) == health
+    # The best match is always selected, even if it is larger than the budget
+    assert index.select("health", max_lines=1) == health
+    assert index.select("unrelated words", max_lines=1000) == []
+
+
+def test_build_code_view_only_for_large_files():
+    assert build_code_view(PYTHON, "Python", "render", min_lines=300) is None
+    view = build_code_view(PYTHON, "Python", "render", min_lines=1, max_lines=10)
+    assert view is not None
+    assert 0 in view.selected
+
+
+def make_view(selected):
+    chunks = split_into_chunks(PYTHON, "Python")
+    return chunks, CodeView(PYTHON, "Python", chunks, selected)
+
+
+def test_code_view_text_and_outline():
+    chunks, view = make_view([2])
+    render = chunks[-1]
+    spawn = chunks[2]
+    assert view.text.startswith(f"# @@chunk 2@@ (lines {spawn.start + 1}-{spawn.end})\ndef spawn_enemy(world):")
+    assert f"- lines {render.start + 1}-{render.end}: def render" in view.outline
+    assert "spawn_enemy" not in view.outline
+    assert view.line_count == spawn.end - spawn.start
+
+
+def test_code_view_marker_uses_the_language_comment():
+    chunks = split_into_chunks(LUA, "Lua")
+    assert CodeView(LUA, "Lua", chunks, [0]).marker(3) == "-- @@chunk 3@@"
+    assert CodeView(CPP, "C++", split_into_chunks(CPP, "C++"), [0]).marker(0) == "// @@chunk 0@@"
+
+
+def test_splice_replaces_returned_chunks_and_keeps_the_rest():
+    _, view = make_view([2, 3])
+    spliced = view.splice("# @@chunk 3@@ (lines 16-17)\ndef render(screen):\n    screen.fill((255, 255, 255))")
+    assert spliced == PYTHON.replace("(0, 0, 0)", "(255, 255, 255)")
+
+
+def test_splice_keeps_blank_lines_between_chunks():
+    _, view = make_view([2, 3])
+    spliced = view.splice("# @@chunk 2@@\ndef spawn_enemy(world):\n    pass\n")
+    assert "def spawn_enemy(world):\n    pass\n\ndef render(screen):" in spliced
+
+
+def test_splice_appends_new_code():
+    _, view = make_view([3])
+    spliced = view.splice("# @@chunk new@@\ndef jump():\n    pass")
+    assert spliced == PYTHON + "\n\ndef jump():\n    pass"
+
+
+def test_splice_without_markers_fails():
+    _, view = make_view([3])
+    assert view.splice("def render(screen):\n    pass") is None
+
+
+def test_splice_with_code_before_the_first_marker_fails():
+    _, view = make_view([3])
+    assert view.splice("import os\n# @@chunk 3@@\ndef render(screen):\n    pass") is None
+    # Blank lines before the first marker are fine
+    assert view.splice("\n\n# @@chunk 3@@\ndef render(screen):\n    pass") is not None
+
+
+def test_splice_with_a_marker_for_a_chunk_that_was_not_shown_fails():
+    _, view = make_view([3])
+    assert view.splice("# @@chunk 1@@\nclass Player:\n    pass") is None
+    assert view.splice("# @@chunk 3@@\ndef render(screen):\n    pass\n# @@chunk 42@@\nx = 1") is None
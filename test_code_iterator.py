@@ -0,0 +1,149 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from chunking import CodeView, split_into_chunks
+from code_iterator import (
+    CHUNKING_THRESHOLD_LINES, MAX_CONTINUATIONS, compute_diff, first_changed_step, first_valid_result, is_unfinished, join_continuation, parse_error_fix_response,
+    parse_modification_response, parse_patch_response, request_completion, select_code_view
+)
+from hedging import Cancelled, cancel_on_chunk
+from metrics import MetricsRecorder
+from response_cache import ResponseCache
+from scheduler import RequestScheduler
+
+CODE = "\n".join(f"def step_{n}(world):\n    world.tick({n})\n" for n in range(CHUNKING_THRESHOLD_LINES // 3 + 1))
+
+
+def make_view():
+    chunks = split_into_chunks(CODE, "Python")
+    return CodeView(CODE, "Python", chunks, [5])
+
+
+def test_small_files_are_sent_whole():
+    assert select_code_view("def step_5(world):\n    pass", "Python", "step_5") is None
+    view = select_code_view(CODE, "Python", "change step_5")
+    assert view is not None and 5 in view.selected
+
+
+def test_modification_response_is_spliced_into_the_code():
+    output = "```python\n# @@chunk 5@@\ndef step_5(world):\n    world.tick(500)\n```"
+    modified_code, _ = parse_modification_response(output, CODE, ["Tick faster"], "Python", make_view(), explain=False)
+    assert modified_code == CODE.replace("world.tick(5)\n", "world.tick(500)\n").strip()
+
+
+def test_unspliceable_chunks_fall_back_to_the_whole_file():
+    for returned in ("import os\n# @@chunk 5@@\ndef step_5(world):\n    pass", "# @@chunk 7@@\ndef step_7(world):\n    pass"):
+        output = f"```python\n{returned}\n```"
+        assert parse_modification_response(output, CODE, ["Change"], "Python", make_view(), explain=False)[0] is None
+        assert parse_error_fix_response(output, CODE, "Python", make_view())[1] is None
+
+
+def test_patch_response_that_does_not_apply_falls_back():
+    output = "<<<<<<< SEARCH\n    world.tick(5)\n=======\n    world.tick(6)\n>>>>>>> REPLACE"
+    assert parse_patch_response(output, CODE, ["Change"], "Python", explain=False)[0] is not None
+    unmatched = "<<<<<<< SEARCH\nclass World:\n=======\nfn\n>>>>>>> REPLACE"
+    assert parse_patch_response(unmatched, CODE, ["Change"], "Python", explain=False)[0] is None
+
+
+def test_first_valid_result_cancels_the_other_calls():
+    stopped = threading.Event()
+
+    def fast(cancel_event):
+        return "valid"
+
+    def slow(cancel_event):
+        on_chunk = cancel_on_chunk(cancel_event)
+        try:
+            for _ in range(200):
+                time.sleep(0.01)
+                on_chunk("token")
+        except Cancelled:
+            stopped.set()
+            raise
+        return "late"
+
+    assert first_valid_result([slow, fast], lambda result: result == "valid") == "valid"
+    assert stopped.wait(1.0)
+
+
+def test_first_valid_result_falls_back_to_the_first_completed_result():
+    def invalid(cancel_event):
+        return "invalid"
+
+    def failing(cancel_event):
+        raise ValueError("failed")
+
+    assert first_valid_result([invalid, failing], lambda result: False) == "invalid"
+    with pytest.raises(ValueError):
+        first_valid_result([failing, failing], lambda result: True)
+
+
+def test_is_unfinished():
+    assert is_unfinished("```python\ndef jump():")
+    assert not is_unfinished("```python\ndef jump():\n    pass\n```\n**Explanation**: cut off here")
+    assert is_unfinished("<<<<<<< SEARCH\na = 1\n=======\n")
+    assert not is_unfinished("<<<<<<< SEARCH\na = 1\n=======\na = 2\n>>>>>>> REPLACE")
+
+
+def test_join_continuation_drops_a_reopened_fence():
+    assert join_continuation("```python\ndef jump():\n", "```python\n    pass\n```") == "```python\ndef jump():\n    pass\n```"
+    assert join_continuation("```python\nx = 1\n```\n", "```python\ny = 2\n```") == "```python\nx = 1\n```\n```python\ny = 2\n```"
+
+
+class Completions:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def create(self, **request):
+        self.requests.append(request)
+        content, finish_reason = self.responses.pop(0)
+        message = SimpleNamespace(content=content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason=finish_reason)], usage=None)
+
+
+def make_client(responses):
+    return SimpleNamespace(chat=SimpleNamespace(completions=Completions(responses)))
+
+
+def test_request_completion_continues_truncated_code_and_caches_the_whole_response():
+    client = make_client([("```python\ndef jump():\n", "length"), ("```python\n    pass\n```", "stop")])
+    cache, recorder = ResponseCache(), MetricsRecorder()
+    scheduler = RequestScheduler(rate_limits={}, default_limits=(10 ** 6, 10 ** 9))
+    messages = [{"role": "user", "content": "Add a jump"}]
+    output = request_completion(client, cache, "key", "m", messages, 100, scheduler=scheduler, recorder=recorder, label="modification")
+    assert output == "```python\ndef jump():\n    pass\n```"
+    continuation = client.chat.completions.requests[1]["messages"]
+    assert continuation[-2] == {"role": "assistant", "content": "```python\ndef jump():\n"}
+    assert cache.get("key") == output
+    record = recorder.records("llm_call")[0]
+    assert (record["calls"], record["cache"], record["finish_reason"]) == (2, "miss", "stop")
+    # Identical requests are served from the cache
+    assert request_completion(client, cache, "key", "m", messages, 100, scheduler=scheduler, recorder=recorder) == output
+    assert recorder.records("llm_call")[1]["cache"] == "hit"
+
+
+def test_request_completion_does_not_cache_a_truncated_response():
+    responses = [("```python\ndef jump():\n", "length")] * (MAX_CONTINUATIONS + 1)
+    cache = ResponseCache()
+    scheduler = RequestScheduler(rate_limits={}, default_limits=(10 ** 6, 10 ** 9))
+    request_completion(make_client(responses), cache, "key", "m", [{"role": "user", "content": "x"}], 100, scheduler=scheduler, recorder=MetricsRecorder())
+    assert cache.get("key") is None
+
+
+def test_first_changed_step():
+    assert first_changed_step(["a", "b"], ["a", "b"]) == 2
+    assert first_changed_step(["a", "b", "c"], ["a", "b"]) == 2
+    assert first_changed_step(["a", "edited"], ["a", "b"]) == 1
+    # A deleted step changes every step after it
+    assert first_changed_step(["b"], ["a", "b"]) == 0
+    assert first_changed_step([], ["a"]) == 0
+
+
+def test_compute_diff():
+    assert compute_diff("a\nb", "a\nb") == ""
+    diff = compute_diff("a\nb", "a\nc", fromfile="a/game.py", tofile="b/game.py")
+    assert diff.splitlines() == ["--- a/game.py", "+++ b/game.py", "@@ -1,2 +1,2 @@", " a", "-b", "+c"]
@@ -0,0 +1,45 @@
+from error_context import build_error_view, parse_error_locations
+
+CODE = "\n".join(f"def step_{n}(world):\n    world.tick({n})\n" for n in range(200))
+
+
+def test_python_traceback_innermost_frame_first():
+    error = (
+        'Traceback (most recent call last):\n'
+        '  File "game.py", line 40, in main\n'
+        '  File "game.py", line 12, in update\n'
+        "NameError: name 'x' is not defined"
+    )
+    assert parse_error_locations(error) == [("game.py", 12), ("game.py", 40)]
+
+
+def test_library_frames_are_skipped():
+    error = '  File "game.py", line 7, in main\n  File "/usr/lib/python3/site-packages/pygame/x.py", line 99, in draw'
+    assert parse_error_locations(error) == [("game.py", 7)]
+
+
+def test_compiler_formats():
+    assert parse_error_locations("main.cpp:12:5: error: 'x' was not declared") == [("main.cpp", 12)]
+    assert parse_error_locations("Game.cs(30,9): error CS1002: ; expected") == [("Game.cs", 30)]
+    assert parse_error_locations("error[E0425]: cannot find value\n --> src/main.rs:8:5") == [("src/main.rs", 8)]
+    assert parse_error_locations("lua: main.lua:21: attempt to index a nil value") == [("main.lua", 21)]
+    assert parse_error_locations("Parse Error at line 3") == [("", 3)]
+
+
+def test_no_locations():
+    assert parse_error_locations("Segmentation fault") == []
+    assert build_error_view(CODE, "Python", "Segmentation fault") is None
+
+
+def test_error_view_shows_the_code_around_the_error():
+    view = build_error_view(CODE, "Python", 'File "game.py", line 301, in step_100', window=5)
+    text = view.text
+    assert "def step_100(world):" in text
+    assert "def step_0(world):" not in text
+    assert view.line_count < 40
+
+
+def test_error_view_respects_the_line_budget():
+    error = "\n".join(f'File "game.py", line {line}, in f' for line in (31, 301, 571))
+    view = build_error_view(CODE, "Python", error, window=2, max_lines=5)
+    assert view.line_count <= 5
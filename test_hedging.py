@@ -0,0 +1,85 @@
+import threading
+import time
+
+import pytest
+
+from hedging import Cancelled, ModelStats, cancel_on_chunk, hedged_call
+
+
+def sleeping_call(delays, results=None, cancelled=None):
+    def call(model, cancel_event):
+        on_chunk = cancel_on_chunk(cancel_event)
+        deadline = time.perf_counter() + delays[model]
+        try:
+            while time.perf_counter() < deadline:
+                time.sleep(0.005)
+                on_chunk("token")
+        except Cancelled:
+            if cancelled is not None:
+                cancelled.add(model)
+            raise
+        result = (results or {}).get(model, f"result from {model}")
+        if isinstance(result, Exception):
+            raise result
+        return result
+    return call
+
+
+def test_fast_primary_wins_without_starting_backups():
+    stats = ModelStats()
+    calls = []
+    call = sleeping_call({"a": 0.0, "b": 0.0})
+    model, result = hedged_call(lambda m, e: calls.append(m) or call(m, e), ["a", "b"], lambda r: True, delay=1.0, stats=stats)
+    assert (model, result) == ("a", "result from a")
+    assert calls == ["a"]
+    assert stats.rows()[0]["wins"] == 1
+
+
+def test_slow_primary_is_hedged_and_cancelled():
+    stats = ModelStats()
+    cancelled = set()
+    model, _ = hedged_call(sleeping_call({"a": 2.0, "b": 0.0}, cancelled=cancelled), ["a", "b"], lambda r: True, delay=0.05, stats=stats)
+    assert model == "b"
+    time.sleep(0.1)
+    assert cancelled == {"a"}
+    rows = {row["model"]: row for row in stats.rows()}
+    assert rows["a"]["cancelled"] == 1 and rows["b"]["wins"] == 1
+
+
+def test_failed_primary_starts_the_next_model_immediately():
+    call = sleeping_call({"a": 0.0, "b": 0.0}, results={"a": ValueError("down")})
+    started = time.perf_counter()
+    model, _ = hedged_call(call, ["a", "b"], lambda r: True, delay=5.0, stats=ModelStats())
+    assert model == "b"
+    assert time.perf_counter() - started < 1.0
+
+
+def test_rejected_results_fall_back_to_the_first_completed():
+    model, result = hedged_call(sleeping_call({"a": 0.0, "b": 0.0}), ["a", "b"], lambda r: False, delay=5.0, stats=ModelStats())
+    assert (model, result) == ("a", "result from a")
+
+
+def test_all_failing_raises_the_first_error():
+    call = sleeping_call({"a": 0.0, "b": 0.0}, results={"a": ValueError("a down"), "b": KeyError("b down")})
+    with pytest.raises(ValueError):
+        hedged_call(call, ["a", "b"], lambda r: True, delay=5.0, stats=ModelStats())
+
+
+def test_cancel_on_chunk():
+    event = threading.Event()
+    on_chunk = cancel_on_chunk(event)
+    on_chunk("token")
+    event.set()
+    with pytest.raises(Cancelled):
+        on_chunk("token")
+
+
+def test_model_stats_rows():
+    stats = ModelStats()
+    for latency in (0.1, 0.2, 0.3, 0.4):
+        stats.record("a", "wins", latency)
+    stats.record("a", "errors", 1.0)
+    row = stats.rows()[0]
+    assert (row["requests"], row["wins"], row["errors"]) == (5, 4, 1)
+    assert row["win_rate"] == pytest.approx(0.8)
+    assert (row["p50_s"], row["p95_s"]) == (0.3, 1.0)
@@ -0,0 +1,50 @@
+import json
+
+from metrics import MetricsRecorder, percentile
+
+
+def test_percentile_nearest_rank():
+    assert percentile([], 50) is None
+    assert percentile([1.0], 95) == 1.0
+    values = [0.1, 0.2, 0.3, 0.4, 0.5]
+    assert (percentile(values, 0), percentile(values, 50), percentile(values, 95), percentile(values, 100)) == (0.1, 0.3, 0.5, 0.5)
+
+
+def test_records_are_bounded_and_filtered_by_kind():
+    recorder = MetricsRecorder(max_records=3)
+    for seconds in (1, 2, 3, 4):
+        recorder.record("parse", seconds=seconds)
+    recorder.record("diff", seconds=5)
+    assert [entry["seconds"] for entry in recorder.records()] == [3, 4, 5]
+    assert [entry["seconds"] for entry in recorder.records("parse")] == [3, 4]
+
+
+def test_timer_records_wall_time_and_extra_fields():
+    recorder = MetricsRecorder()
+    with recorder.timer("validate", language="Lua") as fields:
+        fields["valid"] = True
+    entry = recorder.records()[0]
+    assert (entry["kind"], entry["language"], entry["valid"]) == ("validate", "Lua", True)
+    assert entry["seconds"] >= 0
+
+
+def test_summary_groups_by_kind_label_and_model():
+    recorder = MetricsRecorder()
+    recorder.record("llm_call", label="modification", model="a", seconds=1.0, ttft_s=0.5, prompt_tokens=10, completion_tokens=20, cache="miss")
+    recorder.record("llm_call", label="modification", model="a", seconds=0.0, ttft_s=0.0, cache="hit")
+    recorder.record("llm_call", label="modification", model="b", seconds=2.0, error="RateLimitError")
+    rows = {row["model"]: row for row in recorder.summary()}
+    assert (rows["a"]["count"], rows["a"]["cache_hits"], rows["a"]["prompt_tokens"], rows["a"]["completion_tokens"]) == (2, 1, 10, 20)
+    assert (rows["a"]["p50_s"], rows["a"]["p95_s"]) == (0.0, 1.0)
+    assert (rows["b"]["errors"], rows["b"]["ttft_p50_s"]) == (1, None)
+
+
+def test_jsonl_export_and_file(tmp_path):
+    path = tmp_path / "metrics" / "metrics.jsonl"
+    recorder = MetricsRecorder(path=str(path))
+    recorder.record("rerun", seconds=0.1)
+    recorder.record("diff", seconds=0.2)
+    assert [json.loads(line)["kind"] for line in recorder.to_jsonl().splitlines()] == ["rerun", "diff"]
+    assert path.read_text(encoding="utf-8") == recorder.to_jsonl()
+    recorder.clear()
+    assert recorder.records() == []
@@ -0,0 +1,112 @@
+import pytest
+
+from patching import PatchError, apply_hunks, parse_hunks
+
+CODE = """class Player:
+    def __init__(self):
+        self.x = 0
+        self.y = 0
+
+    def update(self, dt):
+        self.x += 1
+        self.y += 1"""
+
+
+def hunk(search, replace):
+    return f"<<<<<<< SEARCH\n{search}\n=======\n{replace}\n>>>>>>> REPLACE"
+
+
+def test_parse_hunks():
+    output = "Some text\n" + hunk("a = 1", "a = 2") + "\nmore\n" + hunk("", "b = 3") + "\n**Explanation**: ..."
+    assert parse_hunks(output) == [("a = 1", "a = 2"), ("", "b = 3")]
+
+
+def test_parse_hunks_accepts_marker_variants():
+    output = "<<<<<<<SEARCH\na = 1\n=========\na = 2\n>>>>>>>REPLACE"
+    assert parse_hunks(output) == [("a = 1", "a = 2")]
+
+
+def test_exact_match():
+    patched = apply_hunks(CODE, [("        self.x += 1", "        self.x += 2")])
+    assert "self.x += 2" in patched
+    assert "self.x += 1" not in patched
+    assert patched.count("\n") == CODE.count("\n")
+
+
+def test_whitespace_insensitive_match():
+    # The search block lost its indentation and gained trailing spaces
+    patched = apply_hunks(CODE, [("def update(self, dt):  \nself.x += 1", "def update(self, dt):\n    self.x += 5")])
+    assert "    def update(self, dt):\n        self.x += 5\n        self.y += 1" in patched
+
+
+def test_reindents_the_replacement_to_the_matched_code():
+    patched = apply_hunks(CODE, [("self.y = 0", "self.y = 0\nself.health = 100")])
+    assert "        self.y = 0\n        self.health = 100\n" in patched
+
+
+def test_reindent_keeps_relative_indentation():
+    search = "  def update(self, dt):\n    self.x += 1"
+    replace = "  def update(self, dt):\n    if dt:\n      self.x += 1"
+    patched = apply_hunks(CODE, [(search, replace)])
+    assert "    def update(self, dt):\n      if dt:\n        self.x += 1\n" in patched
+
+
+def test_fuzzy_match_above_threshold():
+    # One character differs from the code
+    patched = apply_hunks(CODE, [("def update(self, dt):\n    self.x += 1\n    self.y += 2", "def update(self, dt):\n    pass")])
+    assert patched.endswith("    def update(self, dt):\n        pass")
+
+
+def test_fuzzy_match_below_threshold_fails():
+    with pytest.raises(PatchError, match="Hunk 1 does not match"):
+        apply_hunks(CODE, [("def render(screen):\n    screen.fill(BLACK)", "")])
+
+
+def test_similarity_threshold_is_configurable():
+    search = "def update(self, delta):\n    self.x += 1"
+    with pytest.raises(PatchError):
+        apply_hunks(CODE, [(search, "pass")], min_similarity=0.99)
+    assert "pass" in apply_hunks(CODE, [(search, "pass")], min_similarity=0.85)
+
+
+def test_empty_search_appends():
+    patched = apply_hunks(CODE, [("", "def jump():\n    pass")])
+    assert patched == CODE + "\ndef jump():\n    pass"
+
+
+def test_empty_replace_deletes():
+    patched = apply_hunks(CODE, [("        self.y = 0\n", "")])
+    assert "self.y = 0" not in patched
+
+
+def test_hunks_apply_in_order():
+    patched = apply_hunks(CODE, [("self.x = 0", "self.x = 10"), ("self.x = 10", "self.x = 20")])
+    assert "self.x = 20" in patched
+
+
+def test_ambiguous_search_is_rejected():
+    code = "if a:\n    x += 1\nif b:\n    x += 1"
+    with pytest.raises(PatchError, match="Hunk 1 matches 2 places"):
+        apply_hunks(code, [("    x += 1", "    x += 2")])
+
+
+def test_ambiguous_whitespace_insensitive_search_is_rejected():
+    code = "if a:\n    x += 1\nif b:\n        x += 1"
+    with pytest.raises(PatchError, match="matches 2 places"):
+        apply_hunks(code, [("x += 1", "x += 2")])
+
+
+def test_exact_match_wins_over_whitespace_insensitive_matches():
+    code = "if a:\n    x += 1\nif b:\n        x += 1"
+    assert apply_hunks(code, [("    x += 1", "    x += 2")]) == "if a:\n    x += 2\nif b:\n        x += 1"
+
+
+def test_ambiguous_fuzzy_search_is_rejected():
+    code = "def a():\n    x += 1\n    y += 1\ndef b():\n    x += 1\n    y += 1"
+    with pytest.raises(PatchError, match="matches 2 places"):
+        apply_hunks(code, [("    x += 1\n    y += 2", "    pass")])
+
+
+def test_search_longer_than_code_fails():
+    with pytest.raises(PatchError):
+        apply_hunks("a = 1", [("a = 1\nb = 2", "")])
@@ -0,0 +1,43 @@
+import time
+
+from resources import LANGUAGES, TEMPLATES, ClientPool, fence_pattern
+
+
+def test_pool_reuses_one_client_per_api_key():
+    pool = ClientPool()
+    assert pool.get("gsk_a") is pool.get("gsk_a")
+    assert pool.get("gsk_a") is not pool.get("gsk_b")
+    # Rate limit errors are retried by the request scheduler, not by the SDK
+    assert pool.get("gsk_a").max_retries == 0
+    assert len(pool) == 2
+
+
+def test_evicted_clients_are_dropped_but_not_closed():
+    pool = ClientPool(max_clients=1)
+    first = pool.get("gsk_a")
+    second = pool.get("gsk_b")
+    assert len(pool) == 1
+    # Another thread may still be using the evicted client
+    assert not first._client.is_closed
+    assert pool.get("gsk_a") is not first
+    assert not second._client.is_closed
+
+
+def test_idle_clients_are_dropped():
+    pool = ClientPool(idle_timeout=0)
+    first = pool.get("gsk_a")
+    time.sleep(0.01)
+    pool.get("gsk_b")
+    assert len(pool) == 1
+    assert not first._client.is_closed
+
+
+def test_fence_pattern_escapes_the_language_name():
+    assert fence_pattern("C++").search("```c++\nint x;\n```").group(1) == "int x;\n"
+    assert fence_pattern("C++").search("```cxx\nint x;\n```") is None
+    assert fence_pattern("Kotlin").search("```kotlin\nval x = 1\n```").group(1) == "val x = 1\n"
+
+
+def test_templates_are_formatted_for_every_language():
+    for language in LANGUAGES:
+        assert language in TEMPLATES[language]["Add jump mechanic"]
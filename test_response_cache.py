@@ -0,0 +1,59 @@
+import time
+
+from response_cache import ResponseCache, make_cache_key
+
+
+def test_cache_key_depends_on_every_part_of_the_request():
+    key = make_cache_key("code_modification", "model", "Python", "system", "code", "", ["Add jump"])
+    assert key == make_cache_key("code_modification", "model", "Python", "system", "code", None, ("Add jump",))
+    assert key != make_cache_key("code_modification", "model", "Python", "system", "code", "", ["Add health"])
+    assert key != make_cache_key("code_modification", "model", "Python", "system", "code", "", ["Add jump"], step_offset=1)
+
+
+def test_memory_and_disk_hits(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = ResponseCache(path)
+    assert cache.get("a") is None
+    cache.put("a", "response")
+    assert cache.get("a") == "response"
+    # A new cache on the same file starts with an empty memory tier
+    reopened = ResponseCache(path)
+    assert reopened.get("a") == "response"
+    assert (cache.stats()["hits_memory"], reopened.stats()["hits_disk"]) == (1, 1)
+
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = ResponseCache(max_memory_bytes=10)
+    cache.put("a", "aaaa")
+    cache.put("b", "bbbb")
+    cache.get("a")
+    cache.put("c", "cccc")
+    assert cache.get("b") is None
+    assert cache.get("a") == "aaaa"
+    assert cache.get("c") == "cccc"
+
+
+def test_memory_hits_keep_entries_on_disk(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"), max_disk_bytes=10, touch_batch=100)
+    cache.put("a", "aaaa")
+    time.sleep(0.01)
+    cache.put("b", "bbbb")
+    time.sleep(0.01)
+    # "a" is only read from memory; its access must still count when the disk tier evicts
+    assert cache.get("a") == "aaaa"
+    cache.put("c", "cccc")
+    keys = {row[0] for row in cache._db.execute("SELECT key FROM responses")}
+    assert keys == {"a", "c"}
+
+
+def test_memory_hits_are_written_in_batches(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite3"), touch_batch=2)
+    cache.put("a", "aaaa")
+    cache.put("b", "bbbb")
+    last_access = lambda: cache._db.execute("SELECT last_access FROM responses WHERE key = 'a'").fetchone()[0]
+    stored = last_access()
+    time.sleep(0.01)
+    cache.get("a")
+    assert last_access() == stored
+    cache.get("b")
+    assert last_access() > stored
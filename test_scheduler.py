@@ -0,0 +1,100 @@
+import time
+
+from resources import DEFAULT_RATE_LIMITS, MAX_COMPLETION_TOKENS
+from scheduler import RequestScheduler, account_id, completion_budget, estimate_tokens, retry_delay
+
+
+def test_unknown_models_use_default_limits():
+    assert RequestScheduler(rate_limits={}).limits("unknown-model") == DEFAULT_RATE_LIMITS
+    scheduler = RequestScheduler(rate_limits={"known": (5, 100)}, default_limits=(10 ** 6, 10 ** 9))
+    assert scheduler.limits("known") == (5, 100)
+    assert scheduler.limits("unknown-model") == (10 ** 6, 10 ** 9)
+
+
+def test_request_limit_blocks_until_the_window_moves():
+    scheduler = RequestScheduler(rate_limits={"m": (2, 10 ** 6)}, window=60.0)
+    assert scheduler.try_acquire("m", 10)[0] is not None
+    assert scheduler.try_acquire("m", 10)[0] is not None
+    reservation, delay = scheduler.try_acquire("m", 10)
+    assert reservation is None and 59 < delay <= 60
+    # Other models have their own budgets
+    assert scheduler.try_acquire("other", 10)[0] is not None
+
+
+def test_requests_per_minute_overrides_the_model_limit():
+    scheduler = RequestScheduler(rate_limits={"m": (2, 10 ** 6)}, requests_per_minute=1)
+    assert scheduler.try_acquire("m", 10)[0] is not None
+    assert scheduler.try_acquire("m", 10)[0] is None
+
+
+def test_token_limit_and_settled_usage():
+    scheduler = RequestScheduler(rate_limits={"m": (100, 1000)})
+    reservation, _ = scheduler.try_acquire("m", 800)
+    assert scheduler.try_acquire("m", 300)[0] is None
+    # The request used fewer tokens than reserved
+    scheduler.settle(reservation, 500)
+    assert scheduler.try_acquire("m", 300)[0] is not None
+
+
+def test_oversized_request_goes_through_an_empty_window():
+    scheduler = RequestScheduler(rate_limits={"m": (100, 1000)})
+    assert scheduler.try_acquire("m", 5000)[0] is not None
+    assert scheduler.try_acquire("m", 10)[0] is None
+
+
+def test_expired_requests_leave_the_window():
+    scheduler = RequestScheduler(rate_limits={"m": (1, 10 ** 6)}, window=0.05)
+    scheduler.acquire("m", 10)
+    started = time.monotonic()
+    scheduler.acquire("m", 10)
+    assert time.monotonic() - started >= 0.04
+
+
+class RateLimitResponse:
+    def __init__(self, retry_after):
+        self.headers = {"retry-after": retry_after} if retry_after is not None else {}
+
+
+class RateLimitError(Exception):
+    def __init__(self, retry_after=None):
+        super().__init__("rate limited")
+        self.response = RateLimitResponse(retry_after)
+
+
+def test_retry_delay_uses_retry_after_or_exponential_backoff():
+    assert 7 <= retry_delay(RateLimitError("7"), 0) < 8
+    assert 4 <= retry_delay(RateLimitError(), 2) < 5
+    assert 60 <= retry_delay(RateLimitError(), 10) < 61
+
+
+def test_back_off_blocks_the_model():
+    scheduler = RequestScheduler(rate_limits={})
+    scheduler.back_off("m", RateLimitError("30"), 0)
+    reservation, delay = scheduler.try_acquire("m", 10)
+    assert reservation is None and delay > 29
+    assert scheduler.try_acquire("other", 10)[0] is not None
+
+
+def test_api_keys_on_the_same_model_do_not_block_each_other():
+    scheduler = RequestScheduler(rate_limits={"m": (1, 10 ** 6)})
+    first, second = account_id("gsk_first"), account_id("gsk_second")
+    assert first != second and "gsk_first" not in first
+    assert scheduler.try_acquire("m", 10, first)[0] is not None
+    assert scheduler.try_acquire("m", 10, first)[0] is None
+    assert scheduler.try_acquire("m", 10, second)[0] is not None
+    # A rate limit error only holds back the key that got it
+    scheduler.back_off("other", RateLimitError("30"), 0, first)
+    assert scheduler.try_acquire("other", 10, first)[0] is None
+    assert scheduler.try_acquire("other", 10, second)[0] is not None
+
+
+def test_completion_budget():
+    short = [{"role": "user", "content": "x" * 400}]
+    assert completion_budget(short, "llama-3.3-70b-versatile", 1500) == 1500
+    # Large prompts get room to echo back the code
+    long = [{"role": "user", "content": "x" * 20000}]
+    assert completion_budget(long, "llama-3.3-70b-versatile", 1500) == int(estimate_tokens(long) * 1.2)
+    # ...but never more than fits in the context window or MAX_COMPLETION_TOKENS
+    assert completion_budget(long, "llama-3-8b-8192", 1500) == 8192 - estimate_tokens(long)
+    huge = [{"role": "user", "content": "x" * 400000}]
+    assert completion_budget(huge, "llama-3.3-70b-versatile", 1500) == MAX_COMPLETION_TOKENS
@@ -0,0 +1,95 @@
+import pytest
+
+from snapshot_store import SnapshotStore, apply_delta, encode_delta, snapshot_hash
+
+BASE = "".join(f"line {n}\n" for n in range(50))
+
+
+def test_delta_round_trip():
+    new = BASE.replace("line 10\n", "line ten\nline ten and a half\n").replace("line 40\n", "")
+    delta = encode_delta(BASE, new)
+    assert apply_delta(BASE, delta) == new
+    assert all(isinstance(part, list) or "ten" in part for part in delta)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    return SnapshotStore(str(tmp_path / "sessions.sqlite3") if request.param == "sqlite" else None, keyframe_interval=3)
+
+
+def test_versions_are_stored_once_and_read_back(store):
+    key = store.put(BASE)
+    assert key == snapshot_hash(BASE)
+    assert store.put(BASE) == key
+    assert store.get(key) == BASE
+    assert store.get(None) == ""
+    assert store.stats()["snapshots"] == 1
+
+
+def test_delta_chains_and_keyframes(store):
+    keys, code = [store.put(BASE)], BASE
+    for step in range(5):
+        code += f"step {step}\n"
+        keys.append(store.put(code, parent=keys[-1]))
+    depths = [store._record(key)[1] for key in keys]
+    assert depths == [0, 1, 2, 0, 1, 2]
+    # Read back without the decoded versions cached in memory
+    store._texts.clear()
+    assert store.get(keys[-1]) == code
+
+
+def test_missing_versions_raise_key_error(store):
+    with pytest.raises(KeyError):
+        store.get("0" * 64)
+
+
+def test_diffs_are_computed_once_per_pair(store):
+    first = store.put(BASE)
+    second = store.put(BASE + "jump\n", parent=first)
+    calls = []
+    differ = lambda a, b: calls.append((a, b)) or "diff"
+    assert store.diff(first, second, differ=differ) == "diff"
+    assert store.diff(first, second, differ=differ) == "diff"
+    assert len(calls) == 1
+
+
+def test_sessions_round_trip(tmp_path):
+    path = str(tmp_path / "sessions.sqlite3")
+    store = SnapshotStore(path)
+    key = store.put(BASE)
+    store.save_session("abc", {"original_hash": key, "prompt_history": ["Add jump"]}, [key])
+    # A new store on the same file (e.g. after a restart) restores the session and its code
+    restored = SnapshotStore(path)
+    assert restored.load_session("abc") == {"original_hash": key, "prompt_history": ["Add jump"]}
+    assert restored.get(key) == BASE
+    assert restored.load_session("unknown") is None
+
+
+def test_idle_sessions_and_their_versions_are_evicted(store):
+    shared, only_old = store.put(BASE), store.put(BASE + "old\n", parent=store.put(BASE))
+    store.save_session("old", {}, [shared, only_old])
+    store.save_session("new", {}, [shared])
+    store._sessions["old"] = (*store._sessions["old"][:2], 0.0)
+    if store._db is not None:
+        store._db.execute("UPDATE sessions SET last_access = 0 WHERE id = 'old'")
+        store._db.execute("UPDATE snapshots SET stored_at = 0")
+    else:
+        store._blobs = {key: (*blob[:3], 0.0) for key, blob in store._blobs.items()}
+    assert store.evict_idle() == 1
+    assert store.load_session("old") is None
+    assert store.get(shared) == BASE
+    with pytest.raises(KeyError):
+        store.get(only_old)
+
+
+def test_versions_kept_by_delta_parents_survive_eviction(store):
+    parent = store.put(BASE)
+    child = store.put(BASE + "child\n", parent=parent)
+    store.save_session("s", {}, [child])
+    if store._db is not None:
+        store._db.execute("UPDATE snapshots SET stored_at = 0")
+    else:
+        store._blobs = {key: (*blob[:3], 0.0) for key, blob in store._blobs.items()}
+    assert store.evict_idle() == 0
+    store._texts.clear()
+    assert store.get(child) == BASE + "child\n"
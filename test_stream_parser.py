@@ -0,0 +1,45 @@
+from stream_parser import StreamingResponseParser
+
+RESPONSE = "Here you go:\n```python\ndef jump():\n    pass\n```\n**Explanation**:\nAdds a jump."
+
+
+def feed_in_pieces(parser, text, size):
+    for start in range(0, len(text), size):
+        parser.feed(text[start:start + size])
+
+
+def test_code_and_sections_match_the_whole_response_for_any_chunk_size():
+    for size in (1, 2, 3, 7, len(RESPONSE)):
+        parser = StreamingResponseParser("Python", ["**Explanation**:"])
+        feed_in_pieces(parser, RESPONSE, size)
+        assert parser.code_complete
+        assert parser.code == "def jump():\n    pass"
+        assert parser.section("**Explanation**:") == "Adds a jump."
+
+
+def test_partial_code_hides_a_partial_closing_fence():
+    parser = StreamingResponseParser("Python")
+    parser.feed("```python\nx = 1\n``")
+    assert parser.code_started and not parser.code_complete
+    assert parser.code == "x = 1"
+
+
+def test_fence_uses_the_lowercased_language_name():
+    parser = StreamingResponseParser("C++")
+    parser.feed("```c++\nint x;\n```")
+    assert parser.code == "int x;"
+
+
+def test_section_stops_at_the_end_marker():
+    parser = StreamingResponseParser("Lua", ["**Suggested Fix**:", "**Updated Code**:"])
+    feed_in_pieces(parser, "**Suggested Fix**: Declare x.\n**Updated Code**:\n```lua\nlocal x = 1\n```", 4)
+    assert parser.section("**Suggested Fix**:", "**Updated Code**:") == "Declare x."
+    assert parser.code == "local x = 1"
+
+
+def test_no_code_before_the_fence():
+    parser = StreamingResponseParser("Python", ["**Explanation**:"])
+    parser.feed("Thinking about it")
+    assert not parser.code_started
+    assert parser.code == ""
+    assert parser.section("**Explanation**:") == ""